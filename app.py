@@ -1,11 +1,14 @@
 import os
 import io
+import hashlib
 import zipfile
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_file
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_file, abort
+from flask import get_flashed_messages, get_template_attribute
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import bindparam, case, event, inspect, select
 from sqlalchemy.orm import DeclarativeBase
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -13,6 +16,27 @@ from flask_login import LoginManager, UserMixin, login_user, logout_user, login_
 from werkzeug.utils import secure_filename
 import uuid
 
+from migrations import ensure_column, ensure_index, has_column
+from pagination import paginate_keyset
+from listing_cache import ListingCache
+from page_cache import PageCache
+from fragments import FragmentCache
+from columnar import ColumnarListing
+from clustering import PropertyClusters, point_feature
+from tiles import PropertyTiles, tile_bounds
+from similarity import SimilarityIndex
+from kpi import KpiService
+from versions import ContentVersions, conditional
+from reference_data import ReferenceData
+from identity import IdentityCache
+from uploads import ImageUploads, PROCESSING, READY
+from imaging import build_variants
+from storage import CLOUDINARY_PREFIX, Storage, content_hash
+from listing_filters import ListingFilters
+from facets import FACET_FIELDS, build_facets
+from geo import bbox_around, geohash_encode, haversine_m
+from search import PropertySearch
+
 # إنشاء قاعدة البيانات
 class Base(DeclarativeBase):
     pass
@@ -49,6 +73,12 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
 }
+# نمط ترقيم صفحة العقارات: keyset (بالمؤشر) أو offset (أرقام الصفحات)
+app.config['LISTING_PAGINATION_MODE'] = os.environ.get('LISTING_PAGINATION_MODE', 'keyset')
+# محرك التصفية لصفحة العقارات: sql أو columnar (مصفوفات NumPy في الذاكرة)
+app.config['LISTING_ENGINE'] = os.environ.get('LISTING_ENGINE', 'sql')
+# تخزين الصور المرفوعة: cloudinary أو local (ملفات معنونة بالمحتوى تحت static/uploads)
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'cloudinary')
 db.init_app(app)
 
 # إعداد نظام تسجيل الدخول
@@ -62,6 +92,11 @@ login_manager.login_message_category = 'info'
 # نماذج قاعدة البيانات
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
+    # البحث بالبريد الإلكتروني يستخدم فهرس القيد UNIQUE على email
+    __table_args__ = (
+        db.Index('ix_users_created_at', 'created_at'),
+        db.Index('ix_users_role_created_at', 'role', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(50), unique=True, nullable=False)
@@ -136,6 +171,17 @@ class PropertyType(db.Model):
 
 class Property(db.Model):
     __tablename__ = 'properties'
+    # فهارس استعلامات القوائم: المرشح الثابت (status) ثم مفتاح الترتيب ثم id
+    # حتى تقرأ صفحات المؤشر الصفوف من الفهرس مباشرة دون فرز
+    __table_args__ = (
+        db.Index('ix_properties_status_created_at', 'status', 'created_at', 'id'),
+        db.Index('ix_properties_status_price', 'status', 'price', 'id'),
+        db.Index('ix_properties_status_area', 'status', 'area', 'id'),
+        db.Index('ix_properties_featured_created_at', 'is_featured', 'created_at'),
+        db.Index('ix_properties_created_at', 'created_at'),
+        db.Index('ix_properties_owner_id', 'owner_id'),
+        db.Index('ix_properties_status_geohash', 'status', 'geohash'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(150), nullable=False)
@@ -151,6 +197,14 @@ class Property(db.Model):
     latitude = db.Column(db.Float, nullable=False)
     longitude = db.Column(db.Float, nullable=False)
     
+    # نسخة من مدينة ومنطقة الحي لتصفية المنطقة/المدينة بشرط واحد مفهرس
+    # (تُحدَّث تلقائياً من district_id، انظر sync_property_location)
+    city_id = db.Column(db.Integer, db.ForeignKey('cities.id'), nullable=True, index=True)
+    region_id = db.Column(db.Integer, db.ForeignKey('regions.id'), nullable=True, index=True)
+    
+    # geohash الإحداثيات للبحث الجغرافي بفهرس عادي (انظر sync_property_geohash وgeo.py)
+    geohash = db.Column(db.String(12), nullable=True)
+    
     # التصنيفات
     property_type_id = db.Column(db.Integer, db.ForeignKey('property_types.id'), nullable=False)
     transaction_type = db.Column(db.String(20), nullable=False)  # sale, rent
@@ -162,6 +216,11 @@ class Property(db.Model):
     # الملكية والتوقيت
     owner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # نسخة العقار لطلبات GET الشرطية (تتغير مع أي تعديل عليه أو على صوره)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # نص البحث الموحّد (يُحدَّث تلقائياً من search.py)
+    search_text = db.Column(db.Text, nullable=True)
     
     def __repr__(self):
         return f'<Property {self.title}>'
@@ -170,26 +229,48 @@ class PropertyImage(db.Model):
     __tablename__ = 'property_images'
     
     id = db.Column(db.Integer, primary_key=True)
-    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False, index=True)
     image_path = db.Column(db.String(255), nullable=False)
     cloudinary_public_id = db.Column(db.String(255), nullable=True)  # معرف الصورة في Cloudinary
     is_main = db.Column(db.Boolean, default=False)
+    # processing أثناء الرفع في الخلفية، ثم ready أو failed (انظر uploads.py)
+    status = db.Column(db.String(20), default=READY)
+    # النسخ المصغرة لكل حجم وصيغة (انظر imaging.py)، NULL قبل توليدها
+    variants = db.Column(db.JSON(none_as_null=True), nullable=True)
+    # بصمة sha256 للملف المرفوع: نفس الصورة في عقار آخر لا تُعالج ولا تُرفع مجدداً
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
     
     # العلاقات
     property_rel = db.relationship('Property', backref='images')
     
+    @property
+    def is_ready(self):
+        """الصور السابقة لعمود الحالة (NULL) جاهزة"""
+        return self.status in (None, READY)
+    
     def get_image_url(self):
-        """إرجاع رابط الصورة (محلي أو من Cloudinary)"""
-        if self.cloudinary_public_id:
-            return cloudinary.CloudinaryImage(self.cloudinary_public_id).build_url()
-        else:
-            from flask import url_for
-            return url_for('static', filename=self.image_path)
+        """إرجاع رابط الصورة (محلي أو من Cloudinary، انظر storage.py)"""
+        if self.cloudinary_public_id and self.is_ready:
+            return storage.url(CLOUDINARY_PREFIX + self.cloudinary_public_id)
+        return storage.url(self.image_path)
+    
+    def variant_url(self, size, fmt='jpeg'):
+        """رابط نسخة مصغرة (card أو gallery أو full)، أو رابط الصورة إن لم تُولَّد نسخها"""
+        variant = (self.variants or {}).get(size) if self.is_ready else None
+        if not variant:
+            return self.get_image_url()
+        return storage.url(variant[fmt])
+    
+    def srcset(self, fmt='jpeg'):
+        """قيمة srcset من كل أحجام الصورة بالصيغة المطلوبة"""
+        widths = {}
+        for variant in (self.variants or {}).values():
+            widths.setdefault(variant['width'], variant[fmt])
+        return ', '.join(f"{storage.url(key)} {width}w" for width, key in sorted(widths.items()))
     
     def __repr__(self):
         return f'<PropertyImage {self.id}>'
 
-
     def get_id(self):
         return str(self.id)
     
@@ -205,12 +286,43 @@ class PropertyImage(db.Model):
 
 
 
+class SimilarProperty(db.Model):
+    """أقرب العقارات لكل عقار بالترتيب (يحسبها similarity.py)"""
+    __tablename__ = 'similar_properties'
+    
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    similar_id = db.Column(db.Integer, db.ForeignKey('properties.id', ondelete='CASCADE'),
+                           nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+class DailyStat(db.Model):
+    """أعداد العقارات والحجوزات والمستخدمين الجدد لكل يوم (يحدّثها kpi.py)"""
+    __tablename__ = 'daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    new_properties = db.Column(db.Integer, nullable=False, default=0)
+    new_bookings = db.Column(db.Integer, nullable=False, default=0)
+    new_users = db.Column(db.Integer, nullable=False, default=0)
+
+class ContentVersion(db.Model):
+    """رقم نسخة مجموعة بيانات يزداد مع كل تغيير عليها (يديره versions.py)"""
+    __tablename__ = 'content_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_status_created_at', 'status', 'created_at'),
+        db.Index('ix_bookings_created_at', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     booking_date = db.Column(db.DateTime, nullable=False)
     notes = db.Column(db.Text, nullable=True)
     status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled, completed
@@ -223,45 +335,203 @@ class Booking(db.Model):
     def __repr__(self):
         return f'<Booking {self.id}>'
 
+@event.listens_for(Property, 'before_insert')
+@event.listens_for(Property, 'before_update')
+def sync_property_location(mapper, connection, target):
+    """نسخ مدينة ومنطقة الحي إلى العقار عند الإضافة أو تغيير الحي"""
+    state = inspect(target)
+    changed = any(state.attrs[name].history.has_changes()
+                  for name in ('district_id', 'city_id', 'region_id'))
+    if not changed and target.city_id is not None:
+        return
+    
+    row = connection.execute(
+        select(City.id, City.region_id)
+        .join(District, District.city_id == City.id)
+        .where(District.id == target.district_id)
+    ).first()
+    target.city_id, target.region_id = (row.id, row.region_id) if row else (None, None)
+
+@event.listens_for(Property, 'before_insert')
+@event.listens_for(Property, 'before_update')
+def sync_property_geohash(mapper, connection, target):
+    """حساب geohash من الإحداثيات عند الإضافة أو التعديل"""
+    if target.latitude is not None and target.longitude is not None:
+        target.geohash = geohash_encode(target.latitude, target.longitude)
+
+@event.listens_for(City, 'after_update')
+def sync_city_region(mapper, connection, target):
+    """نقل مدينة إلى منطقة أخرى يحدّث منطقة عقاراتها"""
+    if inspect(target).attrs.region_id.history.has_changes():
+        connection.execute(
+            Property.__table__.update()
+            .where(Property.city_id == target.id)
+            .values(region_id=target.region_id, updated_at=datetime.utcnow())
+        )
+
+@event.listens_for(PropertyImage, 'after_insert')
+@event.listens_for(PropertyImage, 'after_update')
+@event.listens_for(PropertyImage, 'after_delete')
+def touch_image_property(mapper, connection, target):
+    """تغيّر صور العقار يغيّر نسخته (updated_at)"""
+    connection.execute(
+        Property.__table__.update()
+        .where(Property.id == target.property_id)
+        .values(updated_at=datetime.utcnow())
+    )
+
+# استعلامات الصفحات مع تحميل العلاقات مسبقاً (يعتمد على النماذج أعلاه)
+import queries
+
+@event.listens_for(District, 'after_update')
+def sync_district_city(mapper, connection, target):
+    """نقل حي إلى مدينة أخرى يحدّث مدينة ومنطقة عقاراته"""
+    if inspect(target).attrs.city_id.history.has_changes():
+        region_id = connection.execute(
+            select(City.region_id).where(City.id == target.city_id)
+        ).scalar()
+        connection.execute(
+            Property.__table__.update()
+            .where(Property.district_id == target.id)
+            .values(city_id=target.city_id, region_id=region_id, updated_at=datetime.utcnow())
+        )
+
+# محرك البحث النصي وفهرسه
+property_search = PropertySearch()
+property_search.init_app(app, db, Property)
+
+# ذاكرة الصفحات الكاملة للزوار غير المسجلين (تُبطل بأحداث العقارات والصور والمواقع)
+page_cache = PageCache()
+page_cache.init_app(app, Property, PropertyImage,
+                    reference_models=(Region, City, District, PropertyType))
+
+# المحرك العمودي الاختياري لصفحة العقارات (LISTING_ENGINE=columnar)
+columnar_listing = ColumnarListing()
+columnar_listing.init_app(app, db, Property, location_models=(City, District))
+
+# هرم تجميع العقارات على الخريطة (يُحدَّث بأحداث العقارات)
+property_clusters = PropertyClusters()
+property_clusters.init_app(app, db, Property)
+
+# جدول العقارات المشابهة (يُحدَّث تدريجياً بعد الطلبات التي تغيّر العقارات)
+similar_index = SimilarityIndex()
+similar_index.init_app(app, db, Property, SimilarProperty)
+
+# بطاقات العقارات المُصيَّرة مسبقاً لكل (عقار، نسخة، لغة) في القوالب: cached_card()
+fragment_cache = FragmentCache()
+fragment_cache.init_app(app, reference_models=(PropertyType,))
+
+# أرقام نسخ المحتوى لطلبات GET الشرطية: الكتالوج لصفحات القوائم، والمواقع
+# (مع نسخ العقارات نفسها) لصفحة التفاصيل
+content_versions = ContentVersions()
+content_versions.init_app(app, db, ContentVersion, groups={
+    'catalogue': (Property, PropertyImage, Region, City, District, PropertyType),
+    'locations': (Region, City, District, PropertyType),
+})
+
+# ذاكرة نتائج صفحة العقارات (مفاتيحها بنسخة الكتالوج، وتُبطل محلياً بأحداث العقارات والصور والمواقع)
+listing_cache = ListingCache()
+listing_cache.init_app(app, Property, PropertyImage, location_models=(City, District),
+                       versions=content_versions)
+
+# بلاطات GeoJSON للخريطة مخزنة على القرص (تُبطل لكل بلاطة بأحداث العقارات)
+property_tiles = PropertyTiles()
+property_tiles.init_app(app, Property, versions=content_versions)
+
+# المناطق والمدن والأحياء والأنواع في ذاكرة العملية (تتبع نسخة locations)
+reference_data = ReferenceData()
+reference_data.init_app(app, db, Region, City, District, PropertyType,
+                        versions=content_versions)
+
+# مؤشرات لوحة التحكم (لقطة مخزنة لبضع ثوانٍ مع تجميع يومي)
+kpi_service = KpiService()
+kpi_service.init_app(app, db, Property, User, Booking, DailyStat)
+
+# هوية المستخدم لـ current_user من ذاكرة قصيرة بدل جدول المستخدمين في كل طلب
+identity_cache = IdentityCache()
+identity_cache.init_app(app, db, User)
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return identity_cache.load(int(user_id))
 
 # وظائف مساعدة
-def upload_image_to_cloudinary(file):
-    """رفع صورة إلى Cloudinary وإرجاع معرف الصورة"""
-    if not file:
+# ملفات الصور: الحفظ في STORAGE_BACKEND والروابط حسب مفتاح كل ملف
+storage = Storage()
+storage.init_app(app)
+
+def process_property_image(data, timeout=None):
+    """نسخ WebP وJPEG بأحجام البطاقة والمعرض والكاملة محفوظة في التخزين المفعّل"""
+    return build_variants(data, lambda content, ext: storage.save(content, ext, timeout=timeout))
+
+def image_file_keys(image):
+    """مفاتيح كل ملفات الصورة في التخزين (مسارها ونسخها المصغرة)"""
+    keys = {image.image_path}
+    for variant in (image.variants or {}).values():
+        keys.update((variant['webp'], variant['jpeg']))
+    return keys
+
+def delete_unused_image_files(files):
+    """حذف ملفات صور محذوفة ({بصمة: مفاتيح}) لم يعد أي صف يستخدم بصمتها
+
+    الملفات معنونة بالمحتوى فقد تشترك فيها صور عقارات أخرى؛ يُستدعى بعد commit.
+    """
+    if not files:
+        return
+    in_use = set(db.session.scalars(
+        select(PropertyImage.content_hash).where(PropertyImage.content_hash.in_(list(files)))))
+    for digest, keys in files.items():
+        if digest in in_use:
+            continue
+        for key in keys:
+            try:
+                storage.delete(key)
+            except Exception as e:
+                app.logger.warning('تعذر حذف الملف %s: %s', key, e)
+
+# رفع صور العقارات في الخلفية بعد commit (الصور processing حتى ينتهي رفعها)
+image_uploads = ImageUploads()
+image_uploads.init_app(app, db, PropertyImage, process_property_image)
+
+def catalogue_number():
+    """رقم نسخة الكتالوج الحالي (None قبل إنشاء جدول النسخ)"""
+    current = content_versions.current('catalogue')
+    return current[0] if current else None
+
+def catalogue_version(**view_args):
+    """نسخة صفحات القوائم: أي تغيير في العقارات أو صورها أو المواقع يغيّرها"""
+    current = content_versions.current('catalogue')
+    if current is None:
         return None
-    
-    try:
-        # توليد اسم فريد للصورة
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4()}_{filename}"
-        
-        # رفع الصورة إلى Cloudinary
-        result = cloudinary.uploader.upload(
-            file,
-            public_id=f"sayouriaqar/{unique_filename}",
-            overwrite=True,
-            resource_type="image"
-        )
-        
-        # إرجاع معرف الصورة في Cloudinary
-        return result['public_id']
-    
-    except Exception as e:
-        print(f"خطأ في رفع الصورة إلى Cloudinary: {str(e)}")
+    version, updated_at = current
+    return f'catalogue-{version}', updated_at
+
+def property_version(property_id):
+    """نسخة صفحة التفاصيل: العقار وعقاراته المشابهة بترتيبها ونسخة المواقع"""
+    # قبل حساب جدول المشابهة تُختار من الكتالوج كله فتتبع نسخته
+    shared = content_versions.get('locations' if similar_index.ready else 'catalogue')
+    if shared is None:
         return None
+    rows = queries.property_versions(property_id, with_similar=similar_index.ready)
+    if not rows or rows[0].rank != 0:
+        return None  # غير موجود: العرض يعيد 404
+    parts = [f'{row.rank}:{row.id}:{row.updated_at.isoformat() if row.updated_at else ""}'
+             for row in rows]
+    etag = hashlib.md5(f'{shared[0]}|{"|".join(parts)}'.encode()).hexdigest()
+    last_modified = max([row.updated_at for row in rows if row.updated_at] + [shared[1]])
+    return etag, last_modified
 
 # طرق التطبيق Routes
 @app.route('/')
+@conditional(catalogue_version)
+@page_cache.cached('home')
 def index():
     """الصفحة الرئيسية"""
-    latest_properties = Property.query.order_by(Property.created_at.desc()).limit(8).all()
-    featured_properties = Property.query.filter_by(is_featured=True).order_by(Property.created_at.desc()).limit(6).all()
+    latest_properties = queries.latest_properties(8)
+    featured_properties = queries.featured_properties(6)
     property_count = Property.query.count()
-    regions = Region.query.all()
-    property_types = PropertyType.query.all()
+    reference = reference_data.snapshot()
+    page_cache.record(ids=[p.id for p in latest_properties + featured_properties])
     
     # إضافة متغير التاريخ للاستخدام في تذييل الصفحة
     current_date = datetime.now()
@@ -270,108 +540,125 @@ def index():
                           latest_properties=latest_properties,
                           featured_properties=featured_properties,
                           property_count=property_count,
-                          regions=regions,
-                          property_types=property_types,
+                          regions=reference.regions,
+                          property_types=reference.property_types,
                           date=current_date)
 
 @app.route('/properties')
+@conditional(catalogue_version)
+@page_cache.cached('listing')
 def properties():
     """صفحة عرض العقارات"""
-    # تطبيق مرشحات البحث
-    query = Property.query.filter_by(status='available')
+    # توحيد معاملات البحث: أي صيغة أخرى لنفس البحث تُحوَّل إلى رابط واحد
+    listing = ListingFilters.from_args(
+        request.args, keyset=app.config['LISTING_PAGINATION_MODE'] == 'keyset')
+    if listing.query_string() != request.query_string.decode('utf-8', 'replace'):
+        return redirect(listing.url(), code=301)
+    
+    # تطبيق مرشحات البحث (القاموس الموحّد هو أيضاً مفتاح الذاكرة المؤقتة)
+    filters = listing.values
+    query = queries.apply_filters(queries.listing_query(), filters)
+    
+    # البحث النصي يُنفَّذ عند الحاجة فقط (لا يلزم عند وجود الصفحة في الذاكرة المؤقتة)
+    keyword = filters.get('keyword')
+    
+    # التصنيف (الترتيب الافتراضي عند البحث حسب الصلة)
+    sort_by = listing.sort_by
+    sort_order = listing.sort_order
+    sort_columns = {
+        'price': Property.price,
+        'created_at': Property.created_at,
+        'area': Property.area,
+    }
+    sort_column = sort_columns.get(sort_by)
     
-    region_id = request.args.get('region_id', type=int)
-    if region_id and region_id > 0:
-        districts = District.query.join(City).filter(City.region_id == region_id).all()
-        district_ids = [d.id for d in districts]
-        query = query.filter(Property.district_id.in_(district_ids))
-    
-    property_type_id = request.args.get('property_type_id', type=int)
-    if property_type_id and property_type_id > 0:
-        query = query.filter_by(property_type_id=property_type_id)
-    
-    transaction_type = request.args.get('transaction_type')
-    if transaction_type:
-        query = query.filter_by(transaction_type=transaction_type)
-    
-    min_price = request.args.get('min_price', type=float)
-    if min_price:
-        query = query.filter(Property.price >= min_price)
-    
-    max_price = request.args.get('max_price', type=float)
-    if max_price:
-        query = query.filter(Property.price <= max_price)
-    
-    bedrooms = request.args.get('bedrooms', type=int)
-    if bedrooms and bedrooms > 0:
-        query = query.filter(Property.bedrooms >= bedrooms)
-    
-    bathrooms = request.args.get('bathrooms', type=int)
-    if bathrooms and bathrooms > 0:
-        query = query.filter(Property.bathrooms >= bathrooms)
-    
-    min_area = request.args.get('min_area', type=float)
-    if min_area:
-        query = query.filter(Property.area >= min_area)
-    
-    keyword = request.args.get('keyword')
-    if keyword:
-        query = query.filter(Property.title.ilike(f'%{keyword}%') | 
-                             Property.description.ilike(f'%{keyword}%') |
-                             Property.address.ilike(f'%{keyword}%'))
-    
-    # التصنيف والصفحات
-    sort_by = request.args.get('sort_by', 'created_at')
-    sort_order = request.args.get('sort_order', 'desc')
-    
-    if sort_by == 'price':
-        if sort_order == 'asc':
-            query = query.order_by(Property.price.asc())
-        else:
-            query = query.order_by(Property.price.desc())
-    elif sort_by == 'created_at':
-        if sort_order == 'asc':
-            query = query.order_by(Property.created_at.asc())
+    # الصفحات
+    per_page = 9  # عدد العقارات في كل صفحة
+    search_truncated = False
+    if sort_by == 'relevance':
+        # أعلى SEARCH_MAX_RESULTS نتيجة صلةً بين ما يطابق المرشحات، فالترقيم بالإزاحة رخيص هنا
+        search_ids = property_search.ranked_ids(keyword, within=queries.listing_ids(filters))
+        search_truncated = len(search_ids) >= property_search.max_results
+        query = query.filter(Property.id.in_(search_ids))
+        if search_ids:
+            rank = case({pid: pos for pos, pid in enumerate(search_ids)}, value=Property.id)
+            query = query.order_by(rank)
+        properties = query.paginate(page=listing.page, per_page=per_page, error_out=False)
+    elif listing.keyset:
+        # ترقيم بالمؤشر: تكلفة ثابتة لأي صفحة مهما كان عمقها
+        cache_key = listing_cache.make_key(filters, sort_by, sort_order, listing.cursor)
+        cached = listing_cache.get(cache_key)
+        if cached:
+            properties = cached.to_page(queries.properties_by_ids(cached.ids))
         else:
-            query = query.order_by(Property.created_at.desc())
-    elif sort_by == 'area':
+            if columnar_listing.enabled:
+                search_ids = property_search.matching_ids(keyword) if keyword else None
+                # التصفية والترتيب في الذاكرة، وقاعدة البيانات لجلب عناصر الصفحة فقط
+                properties = columnar_listing.paginate(filters, sort_by, sort_order,
+                                                       cursor=listing.cursor,
+                                                       per_page=per_page,
+                                                       search_ids=search_ids)
+                properties.items = queries.properties_by_ids(properties.items)
+            else:
+                if keyword:
+                    query = query.filter(Property.id.in_(property_search.match_query(keyword)))
+                properties = paginate_keyset(query, sort_column, Property.id,
+                                             sort_order=sort_order,
+                                             cursor=listing.cursor,
+                                             per_page=per_page)
+            listing_cache.put(cache_key, filters, properties)
+    else:
+        if keyword:
+            query = query.filter(Property.id.in_(property_search.match_query(keyword)))
         if sort_order == 'asc':
-            query = query.order_by(Property.area.asc())
+            query = query.order_by(sort_column.asc())
         else:
-            query = query.order_by(Property.area.desc())
+            query = query.order_by(sort_column.desc())
+        properties = query.paginate(page=listing.page, per_page=per_page, error_out=False)
     
-    # الصفحات
-    page = request.args.get('page', 1, type=int)
-    per_page = 9  # عدد العقارات في كل صفحة
-    properties = query.paginate(page=page, per_page=per_page, error_out=False)
+    # عدّادات المرشحات: استعلام تجميع واحد، مخزّن بجانب صفحة النتائج
+    facets = listing_cache.get_facets(filters)
+    if facets is None:
+        search_ids = property_search.match_query(keyword) if keyword else None
+        facets = build_facets(queries.facet_groups(filters, search_ids), filters)
+        listing_cache.put_facets(filters, facets, grouped_fields=FACET_FIELDS)
     
     # الحصول على المناطق وأنواع العقارات للفلتر
-    regions = Region.query.all()
-    property_types = PropertyType.query.all()
+    reference = reference_data.snapshot()
+    cities = reference.cities_by_region.get(filters.get('region_id'), ())
+    
+    # الصفحة تعتمد على عقاراتها وعلى كل ما تعدّه العدّادات (المرشحات غير المجمَّعة)
+    page_cache.record(ids=[p.id for p in properties.items],
+                      filters={k: v for k, v in filters.items() if k not in FACET_FIELDS})
     
     # إضافة متغير التاريخ للاستخدام في تذييل الصفحة
     current_date = datetime.now()
     
     return render_template('properties.html', 
                           properties=properties,
-                          regions=regions,
-                          property_types=property_types,
+                          regions=reference.regions,
+                          cities=cities,
+                          property_types=reference.property_types,
                           sort_by=sort_by,
                           sort_order=sort_order,
+                          listing=listing,
+                          facets=facets,
+                          search_truncated=search_truncated,
+                          locations_tree_url=url_for('locations_tree',
+                                                     v=reference_data.location_bundle().etag),
                           date=current_date)
 
 @app.route('/property/<int:property_id>')
+@conditional(property_version)
+@page_cache.cached('detail')
 def property_detail(property_id):
     """صفحة تفاصيل العقار"""
-    property = Property.query.get_or_404(property_id)
+    property = queries.property_with_details(property_id)
     
-    # البحث عن عقارات مشابهة (نفس نوع العقار ونوع المعاملة)
-    similar_properties = Property.query.filter(
-        Property.id != property_id,
-        Property.property_type_id == property.property_type_id,
-        Property.transaction_type == property.transaction_type,
-        Property.status == 'available'
-    ).limit(3).all()
+    # العقارات المشابهة من الجدول المحسوب مسبقاً (أو بالنوع ونوع المعاملة قبل بنائه)
+    similar_properties = queries.similar_properties(property, limit=3,
+                                                    precomputed=similar_index.ready)
+    page_cache.record(ids=[property.id] + [p.id for p in similar_properties])
     
     # إضافة متغير التاريخ للاستخدام في تذييل الصفحة
     current_date = datetime.now()
@@ -455,6 +742,33 @@ def logout():
     flash('تم تسجيل الخروج بنجاح.', 'info')
     return redirect(url_for('index'))
 
+# قالب أجزاء الصفحة الخاصة بالمستخدم (يستخدمه layout.html أيضاً)
+USER_CHROME_TEMPLATE = 'partials/user_chrome.html'
+
+@app.route('/user/chrome')
+def user_chrome():
+    """أجزاء الصفحات المشتركة الخاصة بالمستخدم: روابط التنقل والحساب والرسائل ونموذج الحجز"""
+    def fragment(name, *args):
+        return str(get_template_attribute(USER_CHROME_TEMPLATE, name)(*args))
+    
+    payload = {
+        'authenticated': current_user.is_authenticated,
+        'messages': fragment('flash_messages', get_flashed_messages(with_categories=True)),
+    }
+    # للزائر تبقى النسخة الافتراضية المعروضة في الصفحة
+    if current_user.is_authenticated:
+        payload['nav'] = fragment('user_nav', current_user)
+        payload['account'] = fragment('user_account', current_user)
+        property_id = request.args.get('property_id', type=int)
+        if property_id:
+            payload['booking'] = fragment('booking_form', current_user, property_id,
+                                          url_for('property_detail', property_id=property_id))
+    
+    response = jsonify(payload)
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
 @app.route('/property/<int:property_id>/book', methods=['POST'])
 @login_required
 def book_property(property_id):
@@ -495,14 +809,15 @@ def book_property(property_id):
 @login_required
 def profile():
     """صفحة الملف الشخصي للمستخدم"""
-    user_properties = Property.query.filter_by(owner_id=current_user.id).all()
-    user_bookings = Booking.query.filter_by(user_id=current_user.id).all()
+    user_properties = queries.owner_properties(current_user.id)
+    user_bookings = queries.user_bookings(current_user.id)
     
     # إضافة متغير التاريخ للاستخدام في تذييل الصفحة
     current_date = datetime.now()
     
+    # current_user هوية خفيفة؛ الصفحة تعرض بقية بيانات الحساب
     return render_template('profile.html', 
-                          user=current_user, 
+                          user=db.session.get(User, current_user.id), 
                           properties=user_properties,
                           bookings=user_bookings,
                           date=current_date)
@@ -516,29 +831,25 @@ def admin_dashboard():
         flash('ليس لديك صلاحية الوصول إلى لوحة التحكم.', 'danger')
         return redirect(url_for('index'))
     
-    # إحصائيات عامة
-    total_properties = Property.query.count()
-    active_properties = Property.query.filter_by(status='available').count()
-    total_users = User.query.count()
-    pending_bookings = Booking.query.filter_by(status='pending').count()
+    # إحصائيات عامة (لقطة مشتركة بين المشرفين تُحدَّث كل KPI_CACHE_SECONDS)
+    kpi = kpi_service.snapshot()
     
     # أحدث المستخدمين
-    latest_users = User.query.order_by(User.created_at.desc()).limit(5).all()
+    latest_users = queries.latest_users(5)
     
     # أحدث العقارات
-    latest_properties = Property.query.order_by(Property.created_at.desc()).limit(5).all()
+    latest_properties = queries.latest_properties(5)
     
     # أحدث الحجوزات
-    latest_bookings = Booking.query.order_by(Booking.created_at.desc()).limit(5).all()
+    latest_bookings = queries.latest_bookings(5)
     
     # إضافة متغير التاريخ للاستخدام في تذييل الصفحة
     current_date = datetime.now()
     
     return render_template('admin/dashboard.html',
-                           total_properties=total_properties,
-                           active_properties=active_properties,
-                           total_users=total_users,
-                           pending_bookings=pending_bookings,
+                           **kpi['counters'],
+                           daily_stats=kpi['daily'],
+                           kpi_computed_at=kpi['computed_at'],
                            latest_users=latest_users,
                            latest_properties=latest_properties,
                            latest_bookings=latest_bookings,
@@ -558,6 +869,17 @@ def admin_dashboard():
 
 
 
+@app.route('/admin/cache-stats')
+@login_required
+def admin_cache_stats():
+    """إحصائيات الذاكرة المؤقتة (نسبة الإصابة وغيرها) للمراقبة"""
+    if current_user.role != 'admin':
+        abort(403)
+    
+    return jsonify({'listing': listing_cache.stats(), 'pages': page_cache.stats(),
+                    'cards': fragment_cache.stats(),
+                    'identities': identity_cache.stats()})
+
 # ==============================================
 # قسم إدارة العقارات (للمدير فقط)
 # ==============================================
@@ -573,7 +895,7 @@ def admin_properties():
     status_filter = request.args.get('status', 'all')
     page = request.args.get('page', 1, type=int)
     
-    query = Property.query
+    query = queries.admin_properties_query()
     
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
@@ -599,10 +921,11 @@ def add_property():
     form = PropertyForm()
     
     # تعبئة خيارات القوائم المنسدلة
-    form.region_id.choices = [(r.id, r.name) for r in Region.query.order_by(Region.name).all()]
-    form.city_id.choices = [(c.id, c.name) for c in City.query.order_by(City.name).all()]
-    form.district_id.choices = [(d.id, d.name) for d in District.query.order_by(District.name).all()]
-    form.property_type_id.choices = [(pt.id, pt.name) for pt in PropertyType.query.order_by(PropertyType.name).all()]
+    reference = reference_data.snapshot()
+    form.region_id.choices = reference.choices('regions')
+    form.city_id.choices = reference.choices('cities')
+    form.district_id.choices = reference.choices('districts')
+    form.property_type_id.choices = reference.choices('property_types')
     form.amenities.choices = [(a.id, a.name) for a in Amenity.query.order_by(Amenity.name).all()]
     
     if form.validate_on_submit():
@@ -636,17 +959,8 @@ def add_property():
                 if amenity:
                     new_property.amenities.append(amenity)
             
-            # معالجة الصور
-            for image in form.images.data:
-                if image.filename != '':
-                    public_id = upload_image_to_cloudinary(image)
-                    if public_id:
-                        new_image = PropertyImage(
-                            property_id=new_property.id,
-                            cloudinary_public_id=public_id,
-                            is_main=False
-                        )
-                        db.session.add(new_image)
+            # الصور تُرفع في الخلفية بعد commit
+            image_uploads.add(new_property.id, form.images.data)
             
             db.session.commit()
             flash('تم إضافة العقار بنجاح', 'success')
@@ -669,10 +983,11 @@ def edit_property(property_id):
     form = PropertyForm(obj=property)
     
     # تعبئة خيارات القوائم المنسدلة
-    form.region_id.choices = [(r.id, r.name) for r in Region.query.order_by(Region.name).all()]
-    form.city_id.choices = [(c.id, c.name) for c in City.query.order_by(City.name).all()]
-    form.district_id.choices = [(d.id, d.name) for d in District.query.order_by(District.name).all()]
-    form.property_type_id.choices = [(pt.id, pt.name) for pt in PropertyType.query.order_by(PropertyType.name).all()]
+    reference = reference_data.snapshot()
+    form.region_id.choices = reference.choices('regions')
+    form.city_id.choices = reference.choices('cities')
+    form.district_id.choices = reference.choices('districts')
+    form.property_type_id.choices = reference.choices('property_types')
     form.amenities.choices = [(a.id, a.name) for a in Amenity.query.order_by(Amenity.name).all()]
     
     # تحديد القيم المبدئية للمنطقة والمدينة
@@ -693,17 +1008,8 @@ def edit_property(property_id):
                 if amenity:
                     property.amenities.append(amenity)
             
-            # معالجة الصور الجديدة
-            for image in form.images.data:
-                if image.filename != '':
-                    public_id = upload_image_to_cloudinary(image)
-                    if public_id:
-                        new_image = PropertyImage(
-                            property_id=property.id,
-                            cloudinary_public_id=public_id,
-                            is_main=False
-                        )
-                        db.session.add(new_image)
+            # الصور الجديدة تُرفع في الخلفية بعد commit
+            image_uploads.add(property.id, form.images.data)
             
             db.session.commit()
             flash('تم تحديث العقار بنجاح', 'success')
@@ -725,17 +1031,8 @@ def edit_property(property_id):
         try:
             form.populate_obj(property)
             
-            # معالجة الصور الجديدة
-            for image in form.images.data:
-                if image.filename != '':
-                    public_id = upload_image_to_cloudinary(image)
-                    if public_id:
-                        new_image = PropertyImage(
-                            property_id=property.id,
-                            cloudinary_public_id=public_id,
-                            is_main=False
-                        )
-                        db.session.add(new_image)
+            # الصور الجديدة تُرفع في الخلفية بعد commit
+            image_uploads.add(property.id, form.images.data)
             
             db.session.commit()
             flash('تم تحديث العقار بنجاح', 'success')
@@ -763,12 +1060,17 @@ def delete_property(property_id):
     
     try:
         # حذف الصور من Cloudinary أولاً
+        files = {}
         for image in property.images:
             if image.cloudinary_public_id:
                 cloudinary.uploader.destroy(image.cloudinary_public_id)
+            if image.content_hash:
+                files.setdefault(image.content_hash, set()).update(image_file_keys(image))
+            db.session.delete(image)
         
         db.session.delete(property)
         db.session.commit()
+        delete_unused_image_files(files)
         flash('تم حذف العقار بنجاح', 'success')
     except Exception as e:
         db.session.rollback()
@@ -817,22 +1119,150 @@ def toggle_featured(property_id):
 
 @app.route('/api/cities')
 def get_cities():
-    region_id = request.args.get('region_id')
-    if region_id:
-        cities = City.query.filter_by(region_id=region_id).order_by(City.name).all()
-    else:
-        cities = []
+    region_id = request.args.get('region_id', type=int)
+    cities = reference_data.snapshot().cities_by_region.get(region_id, ())
     return jsonify([{'id': city.id, 'name': city.name} for city in cities])
 
 @app.route('/api/districts')
 def get_districts():
-    city_id = request.args.get('city_id')
-    if city_id:
-        districts = District.query.filter_by(city_id=city_id).order_by(District.name).all()
-    else:
-        districts = []
+    city_id = request.args.get('city_id', type=int)
+    districts = reference_data.snapshot().districts_by_city.get(city_id, ())
     return jsonify([{'id': district.id, 'name': district.name} for district in districts])
 
+@app.route('/api/locations/tree')
+def locations_tree():
+    """شجرة المناطق والمدن والأحياء كاملة لقوائم الاختيار المتسلسلة في main.js"""
+    return reference_data.bundle_response()
+
+# حدود واجهات البحث الجغرافي
+GEO_MAX_RADIUS_M = 50000
+GEO_DEFAULT_LIMIT = 50
+GEO_MAX_LIMIT = 200
+# أقصى عرض وارتفاع لمستطيل /api/properties/bbox (درجة ≈ 111 كم، بقدر دائرة near القصوى)
+GEO_MAX_BBOX_DEGREES = 1.0
+# أقصى عدد من العقارات يُقرأ من قاعدة البيانات لترتيبه بالمسافة
+GEO_MAX_CANDIDATES = 5000
+
+def geo_candidates(filters, south, west, north, east):
+    """العقارات المرشحة داخل المستطيل مع مرشحات القائمة (والكلمة المفتاحية)،
+    بحد GEO_MAX_CANDIDATES؛ يعيد (العقارات، هل قُطعت النتائج)"""
+    query = queries.properties_in_bbox(filters, south, west, north, east)
+    if 'keyword' in filters:
+        query = query.filter(Property.id.in_(property_search.match_query(filters['keyword'])))
+    rows = query.limit(GEO_MAX_CANDIDATES + 1).all()
+    return rows[:GEO_MAX_CANDIDATES], len(rows) > GEO_MAX_CANDIDATES
+
+def geo_payload(properties, latitude, longitude, limit):
+    """ترتيب العقارات بالمسافة عن النقطة وتحويل أقربها إلى JSON"""
+    ranked = sorted(((haversine_m(latitude, longitude, p.latitude, p.longitude), p)
+                     for p in properties), key=lambda item: (item[0], item[1].id))
+    return [{
+        'id': p.id,
+        'title': p.title,
+        'price': p.price,
+        'transaction_type': p.transaction_type,
+        'property_type': p.property_type.name,
+        'latitude': p.latitude,
+        'longitude': p.longitude,
+        'distance_m': round(distance, 1),
+        'url': url_for('property_detail', property_id=p.id),
+    } for distance, p in ranked[:limit]]
+
+def geo_limit():
+    return min(max(request.args.get('limit', GEO_DEFAULT_LIMIT, type=int), 1), GEO_MAX_LIMIT)
+
+def parse_bounds():
+    """قراءة south/west/north/east من الطلب، أو None إذا كانت ناقصة أو غير صحيحة"""
+    bounds = [request.args.get(name, type=float) for name in ('south', 'west', 'north', 'east')]
+    if None in bounds:
+        return None
+    south, west, north, east = bounds
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return None
+    return bounds
+
+@app.route('/api/properties/near')
+def api_properties_near():
+    """العقارات ضمن دائرة حول نقطة، مرتبة بالمسافة (تقبل مرشحات صفحة العقارات)"""
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    radius = request.args.get('radius', 1000, type=float)
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'error': 'المعاملان lat وlng مطلوبان وضمن النطاق'}), 400
+    if not 0 < radius <= GEO_MAX_RADIUS_M:
+        return jsonify({'error': f'radius بالأمتار بين 0 و{GEO_MAX_RADIUS_M}'}), 400
+    
+    filters = ListingFilters.from_args(request.args).values
+    candidates, truncated = geo_candidates(filters, *bbox_around(lat, lng, radius))
+    within = [p for p in candidates if haversine_m(lat, lng, p.latitude, p.longitude) <= radius]
+    return jsonify({'count': len(within), 'truncated': truncated,
+                    'results': geo_payload(within, lat, lng, geo_limit())})
+
+@app.route('/api/properties/bbox')
+def api_properties_bbox():
+    """العقارات داخل مستطيل الخريطة، مرتبة بالمسافة عن مركزه"""
+    bounds = parse_bounds()
+    if bounds is None:
+        return jsonify({'error': 'المعاملات south وwest وnorth وeast مطلوبة وصحيحة'}), 400
+    south, west, north, east = bounds
+    if north - south > GEO_MAX_BBOX_DEGREES or east - west > GEO_MAX_BBOX_DEGREES:
+        return jsonify({'error': f'أبعاد المستطيل حتى {GEO_MAX_BBOX_DEGREES} درجة'}), 400
+    
+    filters = ListingFilters.from_args(request.args).values
+    candidates, truncated = geo_candidates(filters, south, west, north, east)
+    center_lat, center_lng = (south + north) / 2, (west + east) / 2
+    return jsonify({'count': len(candidates), 'truncated': truncated,
+                    'results': geo_payload(candidates, center_lat, center_lng, geo_limit())})
+
+@app.route('/api/properties/clusters')
+def api_property_clusters():
+    """تجمعات العقارات لإطار الخريطة ومستوى التكبير (GeoJSON)
+    
+    حتى CLUSTER_MAX_ZOOM تُقرأ التجمعات من الهرم المحسوب مسبقاً، وبعده يكون
+    الإطار صغيراً فتُعاد العقارات نفسها من فهرس geohash.
+    """
+    bounds = parse_bounds()
+    zoom = request.args.get('zoom', type=int)
+    if bounds is None or zoom is None or zoom < 0:
+        return jsonify({'error': 'المعاملات south وwest وnorth وeast وzoom مطلوبة وصحيحة'}), 400
+    
+    if zoom > property_clusters.max_zoom:
+        rows = queries.properties_in_bbox({}, *bounds).limit(property_clusters.max_cells).all()
+        features = [point_feature(p.id, p.latitude, p.longitude) for p in rows]
+    else:
+        zoom, features = property_clusters.query(*bounds, zoom, version=catalogue_number())
+    return jsonify({'type': 'FeatureCollection', 'zoom': zoom, 'features': features})
+
+# مدة تخزين البلاطات في المتصفح وCDN (ثوانٍ)
+TILE_BROWSER_MAX_AGE = 300
+
+def build_property_tile(zoom, x, y):
+    """معالم البلاطة: تجمعات حتى CLUSTER_MAX_ZOOM ثم العقارات نفسها، مع السعر والنوع للنقاط"""
+    if zoom <= property_clusters.max_zoom:
+        features = property_clusters.tile(zoom, x, y, version=catalogue_number())
+    else:
+        rows = queries.properties_in_bbox({}, *tile_bounds(zoom, x, y)).all()
+        features = [point_feature(p.id, p.latitude, p.longitude) for p in rows]
+    
+    points = [f['properties'] for f in features if not f['properties']['cluster']]
+    details = queries.tile_details([point['id'] for point in points])
+    for point in points:
+        point['price'], point['type_id'] = details.get(point['id'], (None, None))
+    return {'type': 'FeatureCollection', 'features': features}
+
+@app.route('/tiles/properties/<int:z>/<int:x>/<int:y>')
+@app.route('/tiles/properties/<int:z>/<int:x>/<int:y>.geojson')
+def property_tile(z, x, y):
+    """بلاطة GeoJSON للعقارات المتاحة (مخزنة على القرص)"""
+    if not property_tiles.valid(z, x, y):
+        abort(404)
+    payload = property_tiles.get_or_build(z, x, y, build_property_tile)
+    response = app.response_class(payload, mimetype='application/geo+json')
+    response.set_etag(hashlib.md5(payload).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = TILE_BROWSER_MAX_AGE
+    return response.make_conditional(request)
+
 
 
 
@@ -884,7 +1314,7 @@ def admin_bookings():
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', '')
     
-    query = Booking.query
+    query = queries.admin_bookings_query()
     
     if status_filter:
         query = query.filter_by(status=status_filter)
@@ -907,7 +1337,8 @@ def admin_regions():
         flash('ليس لديك صلاحية الوصول إلى هذه الصفحة.', 'danger')
         return redirect(url_for('index'))
     
-    regions = Region.query.all()
+    # الشجرة كاملة مع عدد العقارات من استعلامين بدل تحميل عقارات كل حي
+    regions = queries.location_tree()
     
     # إضافة متغير التاريخ للاستخدام في تذييل الصفحة
     current_date = datetime.now()
@@ -1175,3 +1606,204 @@ cloudinary==1.36.0
     except Exception as e:
         flash(f'حدث خطأ أثناء محاولة تنزيل المشروع: {str(e)}', 'danger')
         return redirect(url_for('index'))
+
+
+# ==============================================
+# أوامر الصيانة (flask <command>)
+# ==============================================
+
+@app.cli.command('search-reindex')
+def search_reindex_command():
+    """إنشاء فهرس البحث النصي وإعادة بناء نصوص البحث لكل العقارات"""
+    if ensure_column(db.engine, Property.__table__.c.search_text):
+        print('تمت إضافة العمود properties.search_text')
+    property_search.create_index()
+    count = property_search.reindex()
+    print(f'تمت فهرسة {count} عقار')
+
+
+@app.cli.command('backfill-locations')
+def backfill_locations_command():
+    """إضافة عمودي المدينة والمنطقة إلى العقارات وتعبئتهما من الأحياء"""
+    for column in (Property.__table__.c.city_id, Property.__table__.c.region_id):
+        if ensure_column(db.engine, column):
+            print(f'تمت إضافة العمود properties.{column.name}')
+    for index in Property.__table__.indexes:
+        if index.name in ('ix_properties_city_id', 'ix_properties_region_id'):
+            ensure_index(db.engine, index)
+    
+    properties_table = Property.__table__
+    city_of_district = (select(District.city_id)
+                        .where(District.id == properties_table.c.district_id)
+                        .scalar_subquery())
+    region_of_city = (select(City.region_id)
+                      .where(City.id == properties_table.c.city_id)
+                      .scalar_subquery())
+    with db.engine.begin() as conn:
+        conn.execute(properties_table.update().values(city_id=city_of_district))
+        result = conn.execute(properties_table.update().values(region_id=region_of_city))
+    print(f'تم تحديث {result.rowcount} عقار')
+
+
+@app.cli.command('backfill-geohash')
+def backfill_geohash_command():
+    """إضافة عمود geohash إلى العقارات وفهرسه وتعبئته من الإحداثيات"""
+    column = Property.__table__.c.geohash
+    if ensure_column(db.engine, column):
+        print('تمت إضافة العمود properties.geohash')
+    
+    properties_table = Property.__table__
+    rows = db.session.execute(select(properties_table.c.id, properties_table.c.latitude,
+                                     properties_table.c.longitude)).all()
+    updates = [{'pid': row.id, 'geohash': geohash_encode(row.latitude, row.longitude)}
+               for row in rows if row.latitude is not None and row.longitude is not None]
+    if updates:
+        with db.engine.begin() as conn:
+            conn.execute(properties_table.update()
+                         .where(properties_table.c.id == bindparam('pid'))
+                         .values(geohash=bindparam('geohash')), updates)
+    for index in Property.__table__.indexes:
+        if index.name == 'ix_properties_status_geohash':
+            ensure_index(db.engine, index)
+    print(f'تم تحديث {len(updates)} عقار')
+
+
+@app.cli.command('similar-rebuild')
+def similar_rebuild_command():
+    """إنشاء جدول العقارات المشابهة (إن لم يوجد) وإعادة حسابه كاملاً"""
+    SimilarProperty.__table__.create(bind=db.engine, checkfirst=True)
+    count = similar_index.rebuild()
+    print(f'تم حساب العقارات المشابهة لـ {count} عقار')
+
+
+@app.cli.command('backfill-updated-at')
+def backfill_updated_at_command():
+    """إضافة عمود updated_at إلى العقارات وتعبئته، وإنشاء جدول أرقام النسخ"""
+    if ensure_column(db.engine, Property.__table__.c.updated_at):
+        print('تمت إضافة العمود properties.updated_at')
+    ContentVersion.__table__.create(bind=db.engine, checkfirst=True)
+    
+    properties_table = Property.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(properties_table.update()
+                              .where(properties_table.c.updated_at.is_(None))
+                              .values(updated_at=properties_table.c.created_at))
+        content_versions.ensure_rows(conn)
+    print(f'تم تحديث {result.rowcount} عقار')
+
+
+@app.cli.command('backfill-image-status')
+def backfill_image_status_command():
+    """إضافة عمود حالة الرفع إلى صور العقارات واعتبار الصور الموجودة جاهزة"""
+    if ensure_column(db.engine, PropertyImage.__table__.c.status):
+        print('تمت إضافة العمود property_images.status')
+    images_table = PropertyImage.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(images_table.update()
+                              .where(images_table.c.status.is_(None))
+                              .values(status=READY))
+        processing = conn.execute(select(db.func.count()).select_from(images_table)
+                                  .where(images_table.c.status == PROCESSING)).scalar()
+    print(f'تم تحديث {result.rowcount} صورة، وما زالت {processing} صورة قيد الرفع')
+
+@app.cli.command('image-derivatives')
+def image_derivatives_command():
+    """إضافة عمودي variants وcontent_hash إلى صور العقارات وتوليد نسخ الصور المحلية التي لا نسخ لها"""
+    for column in (PropertyImage.__table__.c.variants, PropertyImage.__table__.c.content_hash):
+        if ensure_column(db.engine, column):
+            print(f'تمت إضافة العمود property_images.{column.name}')
+    for index in PropertyImage.__table__.indexes:
+        if index.name == 'ix_property_images_content_hash':
+            ensure_index(db.engine, index)
+    images = (PropertyImage.query
+              .filter(PropertyImage.variants.is_(None), PropertyImage.cloudinary_public_id.is_(None),
+                      db.or_(PropertyImage.status.is_(None), PropertyImage.status == READY))
+              .order_by(PropertyImage.id).all())
+    done = missing = failed = 0
+    for image in images:
+        path = os.path.join(app.static_folder, image.image_path)
+        # الصورة الافتراضية مشتركة بين العقارات ولا تحتاج نسخاً لكل صورة
+        if image.image_path == image_uploads.placeholder or not os.path.isfile(path):
+            missing += 1
+            continue
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            image.variants = process_property_image(data)
+            image.content_hash = content_hash(data)
+        except OSError as e:
+            failed += 1
+            print(f'تعذر توليد نسخ الصورة {image.id} ({image.image_path}): {e}')
+            continue
+        image.image_path = image.variants['full']['jpeg']
+        done += 1
+        if done % 50 == 0:
+            db.session.commit()
+    db.session.commit()
+    print(f'تم توليد نسخ {done} صورة، و{missing} صورة بلا ملف محلي، وتعذر {failed}')
+
+@app.cli.command('kpi-rollup')
+def kpi_rollup_command():
+    """إنشاء جدول التجميع اليومي (إن لم يوجد) وإعادة حساب آخر KPI_WINDOW_DAYS يوماً"""
+    DailyStat.__table__.create(bind=db.engine, checkfirst=True)
+    days = kpi_service.refresh_rollup(full=True)
+    print(f'تم تجميع إحصاءات {days} يوماً')
+
+
+# الجداول التي تحمل فهارس الاستعلامات الساخنة
+INDEXED_MODELS = (Property, PropertyImage, Booking, User)
+
+@app.cli.command('create-indexes')
+def create_indexes_command():
+    """إنشاء فهارس النماذج على قاعدة قائمة دون قفل الكتابة (CONCURRENTLY على PostgreSQL)"""
+    for model in INDEXED_MODELS:
+        for index in sorted(model.__table__.indexes, key=lambda i: i.name):
+            if any(not has_column(db.engine, model.__tablename__, c.name) for c in index.columns):
+                print(f'تخطي {index.name}: أعمدة ناقصة (شغّل أمر الترحيل المناسب أولاً)')
+                continue
+            created = ensure_index(db.engine, index)
+            print(f'{"تم إنشاء" if created else "موجود مسبقاً"}: {index.name}')
+
+
+# الحد الأعلى لعدد استعلامات SQL لكل صفحة (لا يزيد مع عدد البطاقات)،
+# ويشمل استعلام نسخة المحتوى لطلبات GET الشرطية
+QUERY_BUDGETS = {
+    '/': 9,
+    '/properties': 8,
+    '/property/{id}': 7,
+    '/profile': 6,
+    '/admin/dashboard': 12,
+    '/admin/properties': 6,
+    '/admin/bookings': 6,
+    '/admin/regions': 4,
+}
+
+@app.cli.command('check-query-counts')
+def check_query_counts_command():
+    """التحقق من أن عدد استعلامات كل صفحة ضمن الحد (لاكتشاف N+1)"""
+    admin = User.query.filter_by(role='admin').first()
+    sample = Property.query.first()
+    client = app.test_client()
+    if admin:
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin.id)
+            session['_fresh'] = True
+    
+    # البيانات المرجعية تُحمَّل مرة لكل عملية، لا لكل طلب
+    reference_data.snapshot()
+    
+    failed = False
+    for route, limit in QUERY_BUDGETS.items():
+        if '{id}' in route:
+            if not sample:
+                continue
+            route = route.format(id=sample.id)
+        try:
+            with queries.assert_max_queries(limit) as counter:
+                response = client.get(route)
+            print(f'{route}: {counter.count}/{limit} ({response.status_code})')
+        except AssertionError as e:
+            failed = True
+            print(f'{route}: تجاوز الحد\n{e}')
+    if failed:
+        raise SystemExit(1)
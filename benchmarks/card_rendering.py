@@ -0,0 +1,47 @@
+"""زمن تصيير شبكة بطاقات العقارات: الماكرو مباشرة مقابل ذاكرة الأجزاء
+
+    python benchmarks/card_rendering.py [أعداد البطاقات مفصولة بفواصل]   # الافتراضي 9,50
+
+تُحمَّل العقارات مرة واحدة (مع الصور والنوع كما في صفحة العقارات) ثم يُقاس
+تصيير شبكة البطاقات فقط: كل بطاقة من الماكرو property_card (ما كانت تفعله
+القوالب في كل طلب)، ثم عبر cached_card بعد تسخين الذاكرة.
+"""
+import sys
+
+from common import load_app, seed, timed
+
+app_module = load_app()
+import queries  # noqa: E402
+
+app = app_module.app
+db = app_module.db
+Property = app_module.Property
+
+GRID = '''{% for property in properties %}<div class="col-lg-6 col-xl-4 mb-4">{{ card(property) }}</div>{% endfor %}'''
+
+
+def main():
+    counts = [int(c) for c in (sys.argv[1] if len(sys.argv) > 1 else '9,50').split(',')]
+    fragment_cache = app_module.fragment_cache
+    grid = app.jinja_env.from_string(GRID)
+
+    with app.app_context():
+        seed(app_module, max(counts) * 2)
+        print(f'قاعدة القياس: {db.engine.url.render_as_string(hide_password=True)}')
+        print(f'{"البطاقات":>10}{"الماكرو ms":>14}{"الذاكرة ms":>14}{"التسريع":>10}')
+        with app.test_request_context('/properties'):
+            for count in counts:
+                properties = (Property.query.options(*queries.card_options())
+                              .order_by(Property.id).limit(count).all())
+                direct = timed(lambda: grid.render(properties=properties,
+                                                   card=fragment_cache.render_card), repeat=20)
+                fragment_cache.cache.clear()
+                expected = grid.render(properties=properties, card=fragment_cache.render_card)
+                assert grid.render(properties=properties, card=fragment_cache.property_card) == expected
+                cached = timed(lambda: grid.render(properties=properties,
+                                                   card=fragment_cache.property_card), repeat=20)
+                print(f'{count:>10}{direct:>14.2f}{cached:>14.2f}{direct / cached:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""أدوات مشتركة لسكربتات القياس: قاعدة بيانات مؤقتة وبيانات اصطناعية
+
+لا تُشغَّل السكربتات على قاعدة الإنتاج أبداً: تُستخدم BENCH_DATABASE_URL إن
+وُجدت، وإلا ملف SQLite مؤقت.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    """استيراد التطبيق بعد توجيهه إلى قاعدة القياس"""
+    url = os.environ.get('BENCH_DATABASE_URL')
+    if not url:
+        path = os.path.join(tempfile.mkdtemp(prefix='aqar-bench-'), 'bench.db')
+        url = f'sqlite:///{path}'
+    os.environ['DATABASE_URL'] = url
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import app as app_module
+    return app_module
+
+
+def seed(app_module, count, batch_size=20000, rng_seed=42):
+    """إنشاء الجداول وملؤها بعدد ``count`` من العقارات الاصطناعية"""
+    db = app_module.db
+    rng = random.Random(rng_seed)
+    db.drop_all()
+    db.create_all()
+
+    owner = app_module.User(username='bench', email='bench@example.com', phone='000000000', role='agent')
+    owner.set_password('bench')
+    db.session.add(owner)
+    regions = [app_module.Region(name=f'منطقة {i}') for i in range(10)]
+    db.session.add_all(regions)
+    db.session.flush()
+    cities = [app_module.City(name=f'مدينة {i}', region_id=regions[i % 10].id) for i in range(40)]
+    db.session.add_all(cities)
+    db.session.flush()
+    districts = [app_module.District(name=f'حي {i}', city_id=cities[i % 40].id) for i in range(200)]
+    db.session.add_all(districts)
+    types = [app_module.PropertyType(name=name) for name in ('شقة', 'فيلا', 'أرض', 'مكتب', 'محل')]
+    db.session.add_all(types)
+    db.session.commit()
+
+    city_region = {c.id: c.region_id for c in cities}
+    district_city = {d.id: d.city_id for d in districts}
+    district_ids = list(district_city)
+    type_ids = [t.id for t in types]
+    start = datetime(2022, 1, 1)
+
+    table = app_module.Property.__table__
+    for offset in range(0, count, batch_size):
+        rows = []
+        for _ in range(min(batch_size, count - offset)):
+            district_id = rng.choice(district_ids)
+            city_id = district_city[district_id]
+            latitude, longitude = 12.5 + rng.random() * 5, 43.0 + rng.random() * 6
+            rows.append({
+                'title': f'عقار {rng.choice(("شقة", "فيلا", "أرض"))} {offset}',
+                'description': 'وصف اصطناعي لأغراض القياس',
+                'price': float(rng.randint(1000, 1000000)),
+                'area': float(rng.randint(40, 2000)),
+                'bedrooms': rng.randint(0, 7),
+                'bathrooms': rng.randint(0, 5),
+                'address': 'عنوان',
+                'district_id': district_id,
+                'city_id': city_id,
+                'region_id': city_region[city_id],
+                'latitude': latitude,
+                'longitude': longitude,
+                # الإدراج المجمّع لا يمر بأحداث ORM التي تحسب geohash عادة
+                'geohash': app_module.geohash_encode(latitude, longitude),
+                'property_type_id': rng.choice(type_ids),
+                'transaction_type': rng.choice(('sale', 'rent')),
+                'is_featured': rng.random() < 0.05,
+                'status': rng.choice(('available', 'available', 'available', 'sold', 'rented')),
+                'owner_id': owner.id,
+                'created_at': start + timedelta(seconds=rng.randint(0, 3 * 365 * 86400)),
+            })
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+    # جداول مرتبطة بحجم متناسب: صورة لكل عقارين، وحجز ومستخدم لكل عشرة عقارات
+    property_ids = range(1, count + 1)
+    db.session.execute(app_module.PropertyImage.__table__.insert(), [
+        {'property_id': pid, 'image_path': 'img/property-placeholder.jpg', 'is_main': True}
+        for pid in property_ids if pid % 2 == 0
+    ] or [{'property_id': 1, 'image_path': 'img/property-placeholder.jpg', 'is_main': True}])
+    db.session.execute(app_module.User.__table__.insert(), [
+        {'username': f'user{i}', 'email': f'user{i}@example.com', 'phone': '000000000',
+         'password_hash': owner.password_hash, 'role': 'customer', 'is_active': True,
+         'created_at': start + timedelta(minutes=i)}
+        for i in range(max(1, count // 10))
+    ])
+    db.session.execute(app_module.Booking.__table__.insert(), [
+        {'property_id': rng.randint(1, count), 'user_id': owner.id,
+         'booking_date': start + timedelta(days=i % 900),
+         'status': rng.choice(('pending', 'confirmed', 'cancelled', 'completed')),
+         'created_at': start + timedelta(minutes=i)}
+        for i in range(max(1, count // 10))
+    ])
+    db.session.commit()
+
+
+def timed(func, repeat=5):
+    """أفضل زمن تنفيذ بالمللي ثانية من عدة محاولات"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
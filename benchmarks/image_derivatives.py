@@ -0,0 +1,51 @@
+"""حجم صورة البطاقة قبل النسخ المصغرة وبعدها، وزمن توليد النسخ
+
+    python benchmarks/image_derivatives.py [مسار صورة JPEG]   # الافتراضي صورة اصطناعية 4000x3000
+
+القوالب كانت تعرض الصورة الأصلية في بطاقة عرضها ~300px؛ الآن يختار المتصفح
+نسخة البطاقة من srcset (imaging.py).
+"""
+import io
+import os
+import sys
+
+from common import ROOT, timed
+
+sys.path.insert(0, ROOT)
+from PIL import Image  # noqa: E402
+
+from imaging import make_derivatives  # noqa: E402
+
+
+def synthetic_photo(width=4000, height=3000):
+    """صورة بتفاصيل وتدرجات قريبة من صورة كاميرا (ضجيج مكبَّر فوق تدرج)"""
+    noise = Image.effect_noise((width // 10, height // 10), 60).convert('RGB')
+    noise = noise.resize((width, height), Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    Image.blend(noise, gradient, 0.5).save(buffer, 'JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as f:
+            data = f.read()
+        source = os.path.basename(sys.argv[1])
+    else:
+        data = synthetic_photo()
+        source = 'صورة اصطناعية'
+    width, height = Image.open(io.BytesIO(data)).size
+    print(f'الأصل ({source}): {width}x{height}، {len(data) / 1024:.0f} KB')
+
+    derivatives = list(make_derivatives(data))
+    print(f'{"النسخة":>10}{"الصيغة":>8}{"الأبعاد":>12}{"KB":>8}{"أصغر بـ":>10}')
+    for d in derivatives:
+        print(f'{d.size:>10}{d.format:>8}{f"{d.width}x{d.height}":>12}'
+              f'{len(d.data) / 1024:>8.0f}{len(data) / len(d.data):>9.0f}x')
+    elapsed = timed(lambda: list(make_derivatives(data)), repeat=3)
+    print(f'زمن توليد كل النسخ: {elapsed:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""مقارنة خطط تنفيذ الاستعلامات الساخنة قبل فهارس النماذج وبعدها
+
+    python benchmarks/index_plans.py [عدد العقارات]
+
+يملأ قاعدة قياس مؤقتة (أو BENCH_DATABASE_URL)، ثم يحذف فهارس النماذج ويطبع
+الخطة والزمن لكل استعلام، ثم يعيد إنشاءها بـ ensure_index ويطبعها مرة أخرى.
+"""
+import sys
+
+from sqlalchemy import text
+
+from common import load_app, seed, timed
+
+app_module = load_app()
+from migrations import ensure_index  # noqa: E402
+
+db = app_module.db
+Property = app_module.Property
+PropertyImage = app_module.PropertyImage
+Booking = app_module.Booking
+User = app_module.User
+
+HOT_QUERIES = {
+    'القائمة: الأحدث': lambda: Property.query.filter_by(status='available')
+        .order_by(Property.created_at.desc(), Property.id.desc()).limit(10),
+    'القائمة: السعر تصاعدياً': lambda: Property.query.filter_by(status='available')
+        .order_by(Property.price.asc(), Property.id.asc()).limit(10),
+    'القائمة: المساحة تنازلياً': lambda: Property.query.filter_by(status='available')
+        .order_by(Property.area.desc(), Property.id.desc()).limit(10),
+    'الرئيسية: العقارات المميزة': lambda: Property.query.filter_by(is_featured=True)
+        .order_by(Property.created_at.desc()).limit(6),
+    'الحجوزات المعلقة': lambda: Booking.query.filter_by(status='pending')
+        .order_by(Booking.created_at.desc()).limit(10),
+    'الخريطة: مستطيل ~5 كم': lambda: app_module.queries.properties_in_bbox(
+        {}, 15.0, 45.0, 15.05, 45.05),
+    'صور عقار': lambda: PropertyImage.query.filter_by(property_id=1234),
+    'مستخدم بالبريد': lambda: User.query.filter_by(email='user42@example.com'),
+}
+
+MANAGED_INDEXES = [index for model in (Property, PropertyImage, Booking, User)
+                   for index in model.__table__.indexes]
+
+
+def explain(query):
+    statement = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    if db.engine.dialect.name == 'postgresql':
+        rows = db.session.execute(text(f'EXPLAIN (ANALYZE, BUFFERS) {statement}')).scalars()
+        return '\n'.join(f'    {row}' for row in rows)
+    rows = db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')).all()
+    return '\n'.join(f'    {row[-1]}' for row in rows)
+
+
+def report(title):
+    print(f'\n===== {title} =====')
+    for name, build in HOT_QUERIES.items():
+        elapsed = timed(lambda: build().all())
+        print(f'\n{name}: {elapsed:.2f} ms')
+        print(explain(build()))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with app_module.app.app_context():
+        print(f'تعبئة {count} عقار في {db.engine.url.render_as_string(hide_password=True)} ...')
+        seed(app_module, count)
+
+        for index in MANAGED_INDEXES:
+            index.drop(bind=db.engine, checkfirst=True)
+        db.session.execute(text('ANALYZE'))
+        report('قبل الفهارس')
+
+        for index in MANAGED_INDEXES:
+            ensure_index(db.engine, index)
+        db.session.execute(text('ANALYZE'))
+        report('بعد الفهارس')
+
+
+if __name__ == '__main__':
+    main()
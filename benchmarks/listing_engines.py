@@ -0,0 +1,89 @@
+"""مقارنة محرك SQL والمحرك العمودي (NumPy) لصفحة العقارات
+
+    python benchmarks/listing_engines.py [أحجام مفصولة بفواصل]   # الافتراضي 10000,100000,1000000
+
+لكل حجم تُملأ قاعدة قياس مؤقتة (أو BENCH_DATABASE_URL) ثم يُقاس زمن حساب صفحة
+واحدة (المعرّفات والعدد والمؤشرات) بالمحركين لعدة مرشحات، من دون جلب العقارات
+التسعة لأنه مشترك بينهما. ذاكرة العدد تُفرَّغ قبل كل محاولة SQL لقياس مجموعة
+مرشحات لم تُطلب من قبل.
+"""
+import sys
+import time
+
+from common import load_app, seed, timed
+
+app_module = load_app()
+import queries  # noqa: E402
+from columnar import ColumnarListing, np  # noqa: E402
+from pagination import count_cache, paginate_keyset  # noqa: E402
+
+app = app_module.app
+db = app_module.db
+Property = app_module.Property
+
+SCENARIOS = {
+    'الأحدث': ({}, 'created_at', 'desc'),
+    'منطقة + غرف، السعر تصاعدياً': ({'region_id': 3, 'bedrooms': 3}, 'price', 'asc'),
+    'إيجار + مساحة، المساحة تنازلياً': ({'transaction_type': 'rent', 'min_area': 500}, 'area', 'desc'),
+    'نطاق سعر + نوع، الأحدث': ({'property_type_id': 2, 'min_price': 200000, 'max_price': 400000},
+                              'created_at', 'desc'),
+}
+DEEP_PAGE = 50
+
+
+def sql_page(filters, sort_by, sort_order, cursor=None):
+    count_cache.clear()
+    query = queries.apply_filters(queries.listing_query(), filters)
+    return paginate_keyset(query, getattr(Property, sort_by), Property.id,
+                           sort_order=sort_order, cursor=cursor)
+
+
+def deep_cursor(page_func, filters, sort_by, sort_order):
+    cursor = None
+    for _ in range(DEEP_PAGE - 1):
+        page = page_func(filters, sort_by, sort_order, cursor=cursor)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+    return cursor
+
+
+def run(count, engine):
+    seed(app_module, count)
+    started = time.perf_counter()
+    engine.load()
+    print(f'\n===== {count:,} عقار (تحميل اللقطة: {(time.perf_counter() - started) * 1000:.0f} ms) =====')
+    print(f'{"السيناريو":<40}{"SQL ms":>10}{"NumPy ms":>10}{"الصفحة 50 SQL":>15}{"الصفحة 50 NumPy":>17}')
+
+    for name, (filters, sort_by, sort_order) in SCENARIOS.items():
+        sql_ms = timed(lambda: sql_page(filters, sort_by, sort_order))
+        numpy_ms = timed(lambda: engine.paginate(filters, sort_by, sort_order))
+
+        sql_cursor = deep_cursor(sql_page, filters, sort_by, sort_order)
+        numpy_cursor = deep_cursor(engine.paginate, filters, sort_by, sort_order)
+        sql_deep = timed(lambda: sql_page(filters, sort_by, sort_order, cursor=sql_cursor))
+        numpy_deep = timed(lambda: engine.paginate(filters, sort_by, sort_order, cursor=numpy_cursor))
+
+        # المحركان يجب أن يعيدا نفس الصفحة
+        expected = [p.id for p in sql_page(filters, sort_by, sort_order, cursor=sql_cursor).items]
+        assert engine.paginate(filters, sort_by, sort_order, cursor=numpy_cursor).items == expected, name
+
+        print(f'{name:<40}{sql_ms:>10.2f}{numpy_ms:>10.2f}{sql_deep:>15.2f}{numpy_deep:>17.2f}')
+
+
+def main():
+    if np is None:
+        sys.exit('هذا القياس يتطلب NumPy: pip install numpy')
+    sizes = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '10000,100000,1000000').split(',')]
+
+    app.config['LISTING_ENGINE'] = 'columnar'
+    with app.app_context():
+        engine = ColumnarListing()
+        engine.init_app(app, db, Property)
+        print(f'قاعدة القياس: {db.engine.url.render_as_string(hide_password=True)}')
+        for count in sizes:
+            run(count, engine)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""تجميع العقارات على الخريطة حسب مستوى التكبير (clustering) في الخادم
+
+لكل مستوى تكبير من 0 إلى ``CLUSTER_MAX_ZOOM`` تُقسَّم الخريطة (بإسقاط Web
+Mercator كما في Leaflet) إلى خلايا بحجم ``CELL_PX`` بكسل (تقسم البلاطة 256 بكسل بالتساوي)، ويُحفظ لكل خلية غير
+فارغة: العدد ومجموع خطوط العرض والطول (للمركز) ومجموع المعرّفات (عندما يكون
+العدد 1 يساوي المجموع معرّف العقار نفسه). إطار عرض بحجم الشاشة يغطي بضع مئات
+من الخلايا على الأكثر مهما كان عدد العقارات، والإضافة والحذف تعدّل خلية واحدة
+في كل مستوى بعد commit دون إعادة البناء.
+"""
+import math
+import threading
+import time
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+CELL_PX = 64
+TILE_PX = 256
+CELLS_PER_TILE = TILE_PX // CELL_PX  # كل خلية تقع في بلاطة واحدة فقط
+MAX_LATITUDE = 85.05112878
+
+_PENDING_KEY = 'property_clusters_pending'
+
+
+def project(latitude, longitude, zoom):
+    """الإحداثيات إلى بكسل عالمي في مستوى التكبير (Web Mercator)"""
+    scale = TILE_PX * 2 ** zoom
+    latitude = max(min(latitude, MAX_LATITUDE), -MAX_LATITUDE)
+    x = (longitude + 180.0) / 360.0 * scale
+    sin_lat = math.sin(math.radians(latitude))
+    y = (0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)) * scale
+    return x, y
+
+
+def cell_of(latitude, longitude, zoom):
+    x, y = project(latitude, longitude, zoom)
+    return int(x // CELL_PX), int(y // CELL_PX)
+
+
+def point_feature(property_id, latitude, longitude):
+    return {'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+            'properties': {'cluster': False, 'id': property_id}}
+
+
+def cluster_feature(count, latitude, longitude, expansion_zoom):
+    return {'type': 'Feature',
+            'geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+            'properties': {'cluster': True, 'count': count, 'expansion_zoom': expansion_zoom}}
+
+
+class PropertyClusters:
+    """هرم خلايا العقارات المتاحة لكل مستويات التكبير"""
+
+    def __init__(self, max_zoom=14, max_cells=600, max_age=300):
+        self.max_zoom = max_zoom
+        self.max_cells = max_cells
+        self.max_age = max_age
+        self.db = None
+        self.model = None
+        self._lock = threading.RLock()
+        self._levels = None
+        self._points = {}
+        self._loaded_at = 0.0
+        self._version = None
+
+    def init_app(self, app, db, property_model):
+        app.config.setdefault('CLUSTER_MAX_ZOOM', self.max_zoom)
+        app.config.setdefault('CLUSTER_MAX_AGE', self.max_age)
+        self.max_zoom = app.config['CLUSTER_MAX_ZOOM']
+        self.max_age = app.config['CLUSTER_MAX_AGE']
+        self.db = db
+        self.model = property_model
+
+        event.listen(property_model, 'after_insert', self._property_changed)
+        event.listen(property_model, 'after_update', self._property_changed)
+        event.listen(property_model, 'after_delete', self._property_deleted)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    # ------------------------------------------------------------------
+    # البناء والتحديث
+
+    def load(self, version=None):
+        """بناء كل المستويات من العقارات المتاحة (``version``: نسخة الكتالوج عند القراءة)"""
+        model = self.model
+        rows = self.db.session.execute(
+            select(model.id, model.latitude, model.longitude)
+            .where(model.status == 'available',
+                   model.latitude.isnot(None), model.longitude.isnot(None))
+        ).all()
+        levels = [{} for _ in range(self.max_zoom + 1)]
+        points = {}
+        for property_id, latitude, longitude in rows:
+            points[property_id] = (latitude, longitude)
+            self._add(levels, property_id, latitude, longitude, 1)
+        with self._lock:
+            self._levels = levels
+            self._points = points
+            self._loaded_at = time.monotonic()
+            self._version = version
+
+    def ensure_loaded(self, version=None):
+        """البناء عند أول استخدام أو بعد انتهاء عمر النسخة أو تغيّر نسخة الكتالوج
+
+        التحديث التدريجي بعد commit يشمل تغييرات هذا العامل فقط؛ ``version`` (رقم
+        ``catalogue`` من content_versions) يكشف تغييرات العمال الآخرين.
+        """
+        if (self._levels is None or time.monotonic() - self._loaded_at > self.max_age
+                or (version is not None and version != self._version)):
+            self.load(version)
+
+    @staticmethod
+    def _add(levels, property_id, latitude, longitude, sign):
+        for zoom, cells in enumerate(levels):
+            key = cell_of(latitude, longitude, zoom)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0, 0.0, 0.0, 0]
+            cell[0] += sign
+            cell[1] += sign * latitude
+            cell[2] += sign * longitude
+            cell[3] += sign * property_id
+            if cell[0] <= 0:
+                del cells[key]
+
+    def update(self, property_id, point):
+        """نقل عقار إلى ``point`` (أو حذفه إن كان None) في كل المستويات"""
+        with self._lock:
+            if self._levels is None:
+                return
+            old = self._points.pop(property_id, None)
+            if old == point:
+                if old is not None:
+                    self._points[property_id] = old
+                return
+            if old is not None:
+                self._add(self._levels, property_id, old[0], old[1], -1)
+            if point is not None:
+                self._points[property_id] = point
+                self._add(self._levels, property_id, point[0], point[1], 1)
+
+    @staticmethod
+    def _point_of(target):
+        if target.status != 'available' or target.latitude is None or target.longitude is None:
+            return None
+        return (target.latitude, target.longitude)
+
+    @staticmethod
+    def _queue(target, change):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, []).append(change)
+
+    def _property_changed(self, mapper, connection, target):
+        self._queue(target, (target.id, self._point_of(target)))
+
+    def _property_deleted(self, mapper, connection, target):
+        self._queue(target, (target.id, None))
+
+    def _apply_pending(self, session):
+        for property_id, point in session.info.pop(_PENDING_KEY, ()):
+            self.update(property_id, point)
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    # ------------------------------------------------------------------
+    # الاستعلام
+
+    def cell_range(self, south, west, north, east, zoom):
+        left, top = cell_of(north, west, zoom)
+        right, bottom = cell_of(south, east, zoom)
+        return range(left, right + 1), range(top, bottom + 1)
+
+    def _features(self, cells, xs, ys, zoom):
+        if len(xs) * len(ys) > len(cells):
+            found = (cell for key, cell in cells.items() if key[0] in xs and key[1] in ys)
+        else:
+            found = (cells[key] for key in ((x, y) for x in xs for y in ys) if key in cells)
+        features = []
+        for count, lat_sum, lng_sum, id_sum in found:
+            if count == 1:
+                features.append(point_feature(id_sum, lat_sum, lng_sum))
+            else:
+                features.append(cluster_feature(count, lat_sum / count, lng_sum / count,
+                                                min(zoom + 1, self.max_zoom + 1)))
+        return features
+
+    def tile(self, zoom, x, y, version=None):
+        """معالم بلاطة الخريطة z/x/y (حتى max_zoom)"""
+        xs = range(x * CELLS_PER_TILE, (x + 1) * CELLS_PER_TILE)
+        ys = range(y * CELLS_PER_TILE, (y + 1) * CELLS_PER_TILE)
+        with self._lock:
+            self.ensure_loaded(version)
+            return self._features(self._levels[zoom], xs, ys, zoom)
+
+    def query(self, south, west, north, east, zoom, version=None):
+        """معالم GeoJSON (تجمعات ونقاط مفردة) داخل إطار العرض
+
+        يُعاد (المستوى المستخدم، المعالم). إذا غطّى الإطار خلايا أكثر من
+        ``max_cells`` يُستخدم مستوى أقل تفصيلاً حتى يبقى عدد المعالم محدوداً.
+        """
+        zoom = max(0, min(zoom, self.max_zoom))
+        xs, ys = self.cell_range(south, west, north, east, zoom)
+        while zoom > 0 and len(xs) * len(ys) > self.max_cells:
+            zoom -= 1
+            xs, ys = self.cell_range(south, west, north, east, zoom)
+
+        with self._lock:
+            self.ensure_loaded(version)
+            return zoom, self._features(self._levels[zoom], xs, ys, zoom)
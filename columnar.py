@@ -0,0 +1,297 @@
+"""محرك عمودي في الذاكرة لتصفية وترتيب صفحة العقارات (بـ NumPy)
+
+يحتفظ كل عامل (worker) بنسخة عمودية من العقارات: مصفوفة لكل عمود مستخدم في
+المرشحات أو الترتيب. تُقيَّم المرشحات بأقنعة منطقية متجهة ويُختار أول
+``per_page + 1`` عنصر بـ argpartition ثم فرز صغير، فلا تلمس قاعدة البيانات إلا
+لجلب العقارات التسعة بالمعرّف. المؤشرات بنفس صيغة pagination.py، فيمكن التبديل
+بين المحركين دون كسر الروابط.
+
+تُحدَّث اللقطة تدريجياً من أحداث العقارات بعد commit، وتُعاد قراءتها كاملة عند
+تغيّر المدن والأحياء أو بعد ``LISTING_COLUMNAR_MAX_AGE`` ثانية (لالتقاط كتابات
+العمّال الآخرين). التفعيل: ``LISTING_ENGINE=columnar``.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from pagination import KeysetPage, decode_cursor, encode_cursor
+
+try:
+    import numpy as np
+except ImportError:  # NumPy من متطلبات المشروع؛ في بيئة بدونه يبقى المسار عبر SQL
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+
+# الأعمدة المحمّلة: الاسم -> نوع المصفوفة
+COLUMNS = {
+    'id': 'int64',
+    'available': 'bool',
+    'price': 'float64',
+    'area': 'float64',
+    'bedrooms': 'int32',
+    'bathrooms': 'int32',
+    'region_id': 'int64',
+    'city_id': 'int64',
+    'district_id': 'int64',
+    'property_type_id': 'int64',
+    'transaction_type': 'int8',
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'created_at': 'int64',  # ميكروثانية منذ 1970
+}
+
+TRANSACTION_CODES = {'sale': 0, 'rent': 1}
+EQUALITY_FILTERS = ('region_id', 'city_id', 'property_type_id')
+MIN_FILTERS = {'min_price': 'price', 'bedrooms': 'bedrooms', 'bathrooms': 'bathrooms', 'min_area': 'area'}
+MAX_FILTERS = {'max_price': 'price'}
+
+# القيمة البديلة لـ NULL في الأعمدة المنقولة كما هي
+MISSING = {
+    'price': 0.0, 'area': 0.0, 'bedrooms': 0, 'bathrooms': 0,
+    'region_id': -1, 'city_id': -1, 'district_id': -1, 'property_type_id': -1,
+    'latitude': 0.0, 'longitude': 0.0,
+}
+
+_PENDING_KEY = 'columnar_listing_pending'
+
+
+def _to_micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1) if value else 0
+
+
+def _from_micros(value):
+    return EPOCH + timedelta(microseconds=int(value))
+
+
+def encode_row(row):
+    """تحويل صف (قاموس أعمدة من قاعدة البيانات) إلى قيم المصفوفات"""
+    values = {name: missing if row[name] is None else row[name] for name, missing in MISSING.items()}
+    values['id'] = row['id']
+    values['available'] = row['status'] == 'available'
+    values['transaction_type'] = TRANSACTION_CODES.get(row['transaction_type'], -1)
+    values['created_at'] = _to_micros(row['created_at'])
+    return values
+
+
+class ColumnarListing:
+    """نسخة عمودية من العقارات مع تصفية وترقيم بالمؤشر في الذاكرة"""
+
+    SOURCE_COLUMNS = ('id', 'status', 'price', 'area', 'bedrooms', 'bathrooms', 'region_id',
+                      'city_id', 'district_id', 'property_type_id', 'transaction_type',
+                      'latitude', 'longitude', 'created_at')
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self.enabled = False
+        self.db = None
+        self.model = None
+        self._lock = threading.RLock()
+        self._arrays = None
+        self._size = 0
+        self._rows = {}
+        self._loaded_at = 0.0
+
+    def init_app(self, app, db, property_model, location_models=()):
+        app.config.setdefault('LISTING_ENGINE', 'sql')
+        app.config.setdefault('LISTING_COLUMNAR_MAX_AGE', self.max_age)
+        self.max_age = app.config['LISTING_COLUMNAR_MAX_AGE']
+        self.db = db
+        self.model = property_model
+
+        if app.config['LISTING_ENGINE'] != 'columnar':
+            return
+        if np is None:
+            app.logger.warning('LISTING_ENGINE=columnar يتطلب NumPy؛ سيُستخدم مسار SQL')
+            return
+        self.enabled = True
+
+        event.listen(property_model, 'after_insert', self._property_changed)
+        event.listen(property_model, 'after_update', self._property_changed)
+        event.listen(property_model, 'after_delete', self._property_deleted)
+        for model in location_models:
+            event.listen(model, 'after_update', self._locations_changed)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    # ------------------------------------------------------------------
+    # تحميل اللقطة وتحديثها
+
+    def load(self):
+        """قراءة كل العقارات من قاعدة البيانات إلى المصفوفات (عموداً عموداً)"""
+        columns = [getattr(self.model, name) for name in self.SOURCE_COLUMNS]
+        rows = self.db.session.execute(select(*columns).order_by(self.model.id)).all()
+        count = len(rows)
+        raw = dict(zip(self.SOURCE_COLUMNS, zip(*rows))) if rows else \
+            {name: () for name in self.SOURCE_COLUMNS}
+
+        arrays = {
+            name: np.fromiter((missing if v is None else v for v in raw[name]),
+                              dtype=COLUMNS[name], count=count)
+            for name, missing in MISSING.items()
+        }
+        arrays['id'] = np.fromiter(raw['id'], dtype='int64', count=count)
+        arrays['available'] = np.fromiter((v == 'available' for v in raw['status']),
+                                          dtype='bool', count=count)
+        arrays['transaction_type'] = np.fromiter(
+            (TRANSACTION_CODES.get(v, -1) for v in raw['transaction_type']), dtype='int8', count=count)
+        arrays['created_at'] = np.fromiter((_to_micros(v) for v in raw['created_at']),
+                                           dtype='int64', count=count)
+
+        with self._lock:
+            self._arrays = arrays
+            self._size = count
+            self._rows = dict(zip(arrays['id'].tolist(), range(count)))
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        """تحميل اللقطة عند أول استخدام أو بعد انتهاء عمرها"""
+        if self._arrays is None or time.monotonic() - self._loaded_at > self.max_age:
+            self.load()
+
+    def upsert(self, row):
+        """إضافة صف أو تحديثه في مكانه (الإضافة بمضاعفة السعة)"""
+        values = encode_row(row)
+        with self._lock:
+            if self._arrays is None:
+                return
+            pos = self._rows.get(values['id'])
+            if pos is None:
+                pos = self._size
+                capacity = len(self._arrays['id'])
+                if pos >= capacity:
+                    grow = max(capacity, 1024)
+                    self._arrays = {name: np.concatenate([array, np.zeros(grow, dtype=array.dtype)])
+                                    for name, array in self._arrays.items()}
+                self._size += 1
+                self._rows[values['id']] = pos
+            for name, value in values.items():
+                self._arrays[name][pos] = value
+
+    def remove(self, property_id):
+        with self._lock:
+            pos = self._rows.get(property_id)
+            if pos is not None and self._arrays is not None:
+                self._arrays['available'][pos] = False
+
+    def invalidate(self):
+        with self._lock:
+            self._arrays = None
+
+    def _snapshot(self, target):
+        return {name: getattr(target, name) for name in self.SOURCE_COLUMNS}
+
+    @staticmethod
+    def _queue(target, change):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, []).append(change)
+
+    def _property_changed(self, mapper, connection, target):
+        self._queue(target, ('upsert', self._snapshot(target)))
+
+    def _property_deleted(self, mapper, connection, target):
+        self._queue(target, ('remove', target.id))
+
+    def _locations_changed(self, mapper, connection, target):
+        self._queue(target, ('reload',))
+
+    def _apply_pending(self, session):
+        for change in session.info.pop(_PENDING_KEY, ()):
+            if change[0] == 'upsert':
+                self.upsert(change[1])
+            elif change[0] == 'remove':
+                self.remove(change[1])
+            else:
+                self.invalidate()
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    # ------------------------------------------------------------------
+    # الاستعلام
+
+    def _mask(self, arrays, filters, search_ids):
+        mask = arrays['available'].copy()
+        for name in EQUALITY_FILTERS:
+            if name in filters:
+                mask &= arrays[name] == filters[name]
+        if 'transaction_type' in filters:
+            mask &= arrays['transaction_type'] == TRANSACTION_CODES.get(filters['transaction_type'], -2)
+        for name, column in MIN_FILTERS.items():
+            if name in filters:
+                mask &= arrays[column] >= filters[name]
+        for name, column in MAX_FILTERS.items():
+            if name in filters:
+                mask &= arrays[column] <= filters[name]
+        if search_ids is not None:
+            mask &= np.isin(arrays['id'], np.asarray(search_ids, dtype='int64'))
+        return mask
+
+    def paginate(self, filters, sort_by, sort_order='desc', cursor=None, per_page=9,
+                 search_ids=None):
+        """صفحة بالمؤشر؛ ``items`` في الصفحة المعادة معرّفات يجلبها المستدعي"""
+        with self._lock:
+            self.ensure_loaded()
+            arrays = {name: array[:self._size] for name, array in self._arrays.items()}
+            rows = np.flatnonzero(self._mask(arrays, filters, search_ids))
+            keys = arrays[sort_by][rows]
+            ids = arrays['id'][rows]
+
+        sort_spec = f'{sort_by}:{sort_order}'
+        descending = sort_order != 'asc'
+        total = len(rows)
+
+        decoded = decode_cursor(cursor, sort_spec, datetime if sort_by == 'created_at' else float)
+        direction = 'next'
+        if decoded:
+            value, last_id, direction = decoded
+            # NULL في المصفوفات هو القيمة البديلة نفسها (صفر للتاريخ)
+            if sort_by == 'created_at':
+                value = _to_micros(value)
+            elif value is None:
+                value = MISSING.get(sort_by, 0)
+            # نفس منطق paginate_keyset: الرجوع للخلف يعكس المقارنة ثم تُقلب النتائج
+            if descending == (direction == 'next'):
+                keep = (keys < value) | ((keys == value) & (ids < last_id))
+            else:
+                keep = (keys > value) | ((keys == value) & (ids > last_id))
+            keys, ids = keys[keep], ids[keep]
+
+        # أول per_page + 1 عنصر باتجاه المسح: argpartition ثم فرز المرشحين فقط
+        scan_desc = descending if direction == 'next' else not descending
+        sign = -1 if scan_desc else 1
+        ranked = keys * sign
+        limit = per_page + 1
+        if len(ranked) > limit:
+            threshold = ranked[np.argpartition(ranked, limit - 1)[limit - 1]]
+            candidates = np.flatnonzero(ranked <= threshold)
+        else:
+            candidates = np.arange(len(ranked))
+        order = candidates[np.lexsort((ids[candidates] * sign, ranked[candidates]))][:limit]
+
+        has_more = len(order) > per_page
+        order = order[:per_page]
+        if direction == 'prev':
+            order = order[::-1]
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = decoded is not None, has_more
+
+        def cursor_for(pos, cursor_direction):
+            value = keys[pos]
+            value = _from_micros(value) if sort_by == 'created_at' else float(value)
+            return encode_cursor(sort_spec, value, int(ids[pos]), cursor_direction)
+
+        prev_cursor = next_cursor = None
+        if len(order):
+            if has_prev:
+                prev_cursor = cursor_for(order[0], 'prev')
+            if has_next:
+                next_cursor = cursor_for(order[-1], 'next')
+
+        return KeysetPage([int(pid) for pid in ids[order]], total, has_prev, has_next,
+                          prev_cursor, next_cursor, per_page)
@@ -0,0 +1,42 @@
+"""عدّادات المرشحات (facets) في الشريط الجانبي لصفحة العقارات
+
+بدلاً من استعلام COUNT لكل خيار، يجمع استعلام واحد العقارات المتاحة حسب
+(المنطقة، نوع العقار، نوع المعاملة، عدد الغرف) بعد تطبيق المرشحات الأخرى،
+ثم تُشتق العدّادات هنا. عدّاد كل مرشح يتجاهل قيمته المختارة ويحترم باقي
+المرشحات، فيبقى بالإمكان الانتقال إلى خيار آخر ومعرفة عدد نتائجه.
+"""
+
+# المرشحات التي لها عدّادات، بترتيب أعمدة التجميع
+FACET_FIELDS = ('region_id', 'property_type_id', 'transaction_type', 'bedrooms')
+
+# خيارات "غرف النوم" في النموذج حدود دنيا (1+ ... 5+)
+BEDROOM_BUCKETS = (1, 2, 3, 4, 5)
+
+
+def _matches(name, value, filters):
+    if name not in filters:
+        return True
+    if name == 'bedrooms':
+        return value >= filters['bedrooms']
+    return value == filters[name]
+
+
+def build_facets(groups, filters):
+    """تحويل صفوف (region_id, property_type_id, transaction_type, bedrooms, count)
+    إلى قاموس: المرشح -> {القيمة: العدد}"""
+    facets = {name: {} for name in FACET_FIELDS}
+    for *values, count in groups:
+        row = dict(zip(FACET_FIELDS, values))
+        row['bedrooms'] = row['bedrooms'] or 0
+        failed = [name for name in FACET_FIELDS if not _matches(name, row[name], filters)]
+        if len(failed) > 1:
+            continue
+        for name in failed or FACET_FIELDS:
+            counts = facets[name]
+            if name == 'bedrooms':
+                for bucket in BEDROOM_BUCKETS:
+                    if row['bedrooms'] >= bucket:
+                        counts[bucket] = counts.get(bucket, 0) + count
+            else:
+                counts[row[name]] = counts.get(row[name], 0) + count
+    return facets
@@ -0,0 +1,77 @@
+"""ذاكرة أجزاء القوالب: HTML بطاقات العقارات جاهزاً
+
+بطاقة العقار تُبنى من الماكرو ``property_card`` في partials/property_card.html،
+وتُخزَّن لكل (الشكل، معرّف العقار، نسخته updated_at، اللغة). تعديل العقار أو صوره
+يغيّر updated_at فتُبنى بطاقة جديدة تلقائياً دون إبطال صريح، والبطاقات القديمة
+تخرج من الذاكرة بسياسة LRU. تغيّر أنواع العقارات (اسم النوع يظهر في البطاقة)
+يفرّغ الذاكرة كلها.
+"""
+from flask import get_template_attribute
+from markupsafe import Markup
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+
+CARD_TEMPLATE = 'partials/property_card.html'
+
+_PENDING_KEY = 'fragment_cache_pending'
+
+
+class FragmentCache:
+    """بطاقات عقارات مُصيَّرة مسبقاً، متاحة في القوالب كـ ``cached_card(property, variant)``"""
+
+    def __init__(self, max_size=4096, ttl=3600):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.enabled = True
+        self.locale = 'ar'
+
+    def init_app(self, app, reference_models=()):
+        app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+        app.config.setdefault('FRAGMENT_CACHE_SIZE', self.cache.max_size)
+        app.config.setdefault('FRAGMENT_CACHE_TTL', self.cache.ttl)
+        app.config.setdefault('SITE_LOCALE', self.locale)
+        self.enabled = app.config['FRAGMENT_CACHE_ENABLED']
+        self.cache.max_size = app.config['FRAGMENT_CACHE_SIZE']
+        self.cache.ttl = app.config['FRAGMENT_CACHE_TTL']
+        self.locale = app.config['SITE_LOCALE']
+
+        app.jinja_env.globals['cached_card'] = self.property_card
+        for model in reference_models:
+            for name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(model, name, self._reference_changed)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    @staticmethod
+    def render_card(prop, variant='full'):
+        """تصيير البطاقة من الماكرو مباشرة (دون الذاكرة)"""
+        return get_template_attribute(CARD_TEMPLATE, 'property_card')(prop, variant)
+
+    def property_card(self, prop, variant='full'):
+        # قبل ترحيل updated_at لا توجد نسخة نعتمد عليها
+        if not self.enabled or prop.updated_at is None:
+            return self.render_card(prop, variant)
+        key = (variant, prop.id, prop.updated_at, self.locale)
+        html = self.cache.get(key)
+        if html is None:
+            html = Markup(str(self.render_card(prop, variant)))
+            self.cache.set(key, html)
+        return html
+
+    def stats(self):
+        return self.cache.stats()
+
+    @staticmethod
+    def _reference_changed(mapper, connection, target):
+        session = inspect(target).session
+        if session is not None:
+            session.info[_PENDING_KEY] = True
+
+    def _apply_pending(self, session):
+        # الأسماء تتغير نادراً: تفريغ الذاكرة أبسط من تتبع البطاقات المتأثرة
+        if session.info.pop(_PENDING_KEY, False):
+            self.cache.clear()
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
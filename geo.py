@@ -0,0 +1,95 @@
+"""أدوات البحث الجغرافي: geohash ونطاقاته والمسافات
+
+كل عقار يحمل geohash لإحداثياته في عمود مفهرس. بما أن العقارات المتجاورة
+تشترك في بادئة geohash، يتحول البحث داخل مستطيل إلى بضعة نطاقات نصية
+``geohash >= a AND geohash < b`` يخدمها فهرس B-tree عادي على أي قاعدة بيانات،
+ثم تُصفّى النتائج بالإحداثيات الدقيقة وتُرتَّب بالمسافة في بايثون.
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 9  # خلية بحوالي 5 أمتار
+EARTH_RADIUS_M = 6371008.8
+
+
+def geohash_encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, interval = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """ارتفاع وعرض خلية geohash بالدرجات"""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def _next_prefix(prefix):
+    """أصغر سلسلة أكبر من كل السلاسل التي تبدأ بالبادئة"""
+    while prefix and prefix[-1] == BASE32[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + BASE32[BASE32.index(prefix[-1]) + 1]
+
+
+def cover_cells(south, west, north, east, max_cells=16):
+    """بادئات geohash لخلايا تغطي المستطيل، بأدق مستوى لا يتجاوز ``max_cells`` خلية"""
+    cells = None
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        height, width = cell_size(precision)
+        rows = range(math.floor((south + 90) / height), math.floor((north + 90) / height) + 1)
+        cols = range(math.floor((west + 180) / width), math.floor((east + 180) / width) + 1)
+        if len(rows) * len(cols) > max_cells:
+            break
+        cells = sorted({
+            geohash_encode(min(-90 + (r + 0.5) * height, 90.0), min(-180 + (c + 0.5) * width, 180.0),
+                           precision)
+            for r in rows for c in cols
+        })
+    return cells or ['']
+
+
+def prefix_ranges(prefixes):
+    """تحويل البادئات إلى نطاقات (بداية، نهاية أو None) مع دمج المتجاورة"""
+    ranges = []
+    for prefix in sorted(prefixes):
+        start, end = prefix, _next_prefix(prefix)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """المسافة على سطح الأرض بالأمتار"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def bbox_around(latitude, longitude, radius_m):
+    """المستطيل (south, west, north, east) المحيط بدائرة نصف قطرها radius_m"""
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lng = min(math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)), 180.0)
+    return (max(latitude - d_lat, -90.0), max(longitude - d_lng, -180.0),
+            min(latitude + d_lat, 90.0), min(longitude + d_lng, 180.0))
@@ -0,0 +1,91 @@
+"""ذاكرة هوية المستخدم لـ Flask-Login في كل عامل
+
+``load_user`` يُستدعى في كل طلب لمستخدم مسجل، وأغلب الصفحات لا تحتاج من
+current_user سوى المعرّف والاسم والدور وحالة الحساب. تُحفظ هذه الحقول كنسخة
+خفيفة غير قابلة للتعديل (``Identity``) لمدة قصيرة، وتُحذف بعد commit أي تعديل أو
+حذف للمستخدم في هذه العملية (تغيير الدور أو تعطيل الحساب مثلاً). العمال الآخرون
+يرون التغيير بعد انتهاء المدة ``IDENTITY_CACHE_TTL`` على الأكثر.
+
+الصفحات التي تحتاج بقية حقول المستخدم (الملف الشخصي) تحمّله من قاعدة البيانات.
+"""
+from collections import namedtuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+
+_PENDING_KEY = 'identity_cache_pending'
+
+
+class Identity(namedtuple('Identity', 'id username role is_active')):
+    """current_user خفيف: نفس واجهة UserMixin دون كائن ORM"""
+
+    __slots__ = ()
+
+    @property
+    def is_authenticated(self):
+        return bool(self.is_active)
+
+    is_anonymous = False
+
+    def get_id(self):
+        return str(self.id)
+
+
+class IdentityCache:
+    """معرّف المستخدم ← Identity لمدة قصيرة، مع إبطال مدفوع بأحداث SQLAlchemy"""
+
+    def __init__(self, max_size=10000, ttl=30):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.enabled = True
+
+    def init_app(self, app, db, user_model):
+        app.config.setdefault('IDENTITY_CACHE_ENABLED', True)
+        app.config.setdefault('IDENTITY_CACHE_SIZE', self.cache.max_size)
+        app.config.setdefault('IDENTITY_CACHE_TTL', self.cache.ttl)
+        self.enabled = app.config['IDENTITY_CACHE_ENABLED']
+        self.cache.max_size = app.config['IDENTITY_CACHE_SIZE']
+        self.cache.ttl = app.config['IDENTITY_CACHE_TTL']
+        self.db = db
+        self.user_model = user_model
+
+        for name in ('after_update', 'after_delete'):
+            event.listen(user_model, name, self._user_changed)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    def load(self, user_id):
+        """هوية المستخدم أو None إذا لم يعد موجوداً"""
+        identity = self.cache.get(user_id) if self.enabled else None
+        if identity is None:
+            model = self.user_model
+            row = self.db.session.execute(
+                select(model.id, model.username, model.role, model.is_active)
+                .where(model.id == user_id)
+            ).first()
+            if row is None:
+                return None
+            identity = Identity(*row)
+            if self.enabled:
+                self.cache.set(user_id, identity)
+        return identity
+
+    def invalidate(self, user_id):
+        self.cache.delete(user_id)
+
+    def stats(self):
+        return self.cache.stats()
+
+    @staticmethod
+    def _user_changed(mapper, connection, target):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+    def _apply_pending(self, session):
+        for user_id in session.info.pop(_PENDING_KEY, ()):
+            self.invalidate(user_id)
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
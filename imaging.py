@@ -0,0 +1,64 @@
+"""نسخ صور العقارات المصغرة بـ Pillow
+
+كل صورة مرفوعة تُحوَّل إلى ثلاثة أحجام (البطاقة والمعرض والكاملة) بصيغتي WebP
+وJPEG، بعد تطبيق اتجاه الكاميرا وحذف بيانات EXIF (الموقع والجهاز). وصف النسخ
+يُحفظ في عمود ``PropertyImage.variants`` وتبني منه القوالب ``srcset``:
+
+    {"card": {"width": 400, "height": 300, "webp": <مفتاح>, "jpeg": <مفتاح>}, ...}
+
+المفاتيح من storage.py (ملف محلي أو Cloudinary).
+"""
+import io
+from collections import namedtuple
+
+from PIL import Image, ImageOps
+
+# (الاسم، أطول ضلع بالبكسل): البطاقات تُعرض بعرض ~300px، والمعرض حتى ~1000px
+SIZES = (('card', 400), ('gallery', 1024), ('full', 1920))
+
+# (الصيغة، الامتداد، خيارات الحفظ)
+FORMATS = (
+    ('webp', 'webp', {'quality': 80, 'method': 4}),
+    ('jpeg', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+
+Derivative = namedtuple('Derivative', 'size width height format ext data')
+
+
+def open_image(data, max_edge=None):
+    """فتح الصورة كـ RGB باتجاهها الصحيح (الشفافية تُدمج على خلفية بيضاء)"""
+    image = Image.open(io.BytesIO(data))
+    if max_edge:
+        # JPEG الكبيرة تُفك بدقة مخفّضة مباشرة بدل فك الصورة كاملة ثم تصغيرها
+        image.draft('RGB', (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB') if image.mode != 'RGB' else image
+
+
+def make_derivatives(data, sizes=SIZES, formats=FORMATS):
+    """كل النسخ المصغرة للصورة (لا تُكبَّر الصورة الأصغر من الحجم المطلوب)"""
+    source = open_image(data, max(edge for _, edge in sizes))
+    for name, edge in sizes:
+        image = source.copy()
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        for fmt, ext, options in formats:
+            buffer = io.BytesIO()
+            # exif فارغ صراحة: لا ينتقل شيء من بيانات الملف الأصلي
+            image.save(buffer, fmt.upper(), exif=b'', **options)
+            yield Derivative(name, image.width, image.height, fmt, ext, buffer.getvalue())
+
+
+def build_variants(data, save):
+    """توليد النسخ وحفظ كل منها بـ ``save(البايتات، الامتداد)`` الذي يعيد مفتاحها؛
+    يعيد قيمة عمود variants"""
+    variants = {}
+    for derivative in make_derivatives(data):
+        variant = variants.setdefault(derivative.size, {'width': derivative.width,
+                                                        'height': derivative.height})
+        variant[derivative.format] = save(derivative.data, derivative.ext)
+    return variants
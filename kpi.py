@@ -0,0 +1,187 @@
+"""مؤشرات لوحة التحكم: عدّادات باستعلام واحد ولقطة مخزنة مؤقتاً
+
+- العدّادات الأربعة (كل العقارات، المتاحة، المستخدمون، الحجوزات المعلقة) في جملة
+  SELECT واحدة من استعلامات فرعية.
+- اللقطة تُحفظ ``KPI_CACHE_SECONDS`` ثانية، ويحدّثها طلب واحد فقط (single-flight)
+  بينما تُعاد النسخة السابقة لبقية الطلبات المتزامنة.
+- الأعداد اليومية لآخر ``KPI_WINDOW_DAYS`` يوماً تُقرأ من جدول daily_stats؛ الأيام
+  المنتهية لا تتغير، فلا يُحسب من الصفوف الخام إلا ما بعد آخر تجميع (اليوم والأمس
+  عادة). اللوحة تقرأ فقط ولا تكتب في الجدول: يحدّثه أمر ``flask kpi-rollup``
+  (يُشغَّل دورياً من cron)، وتأخره لا يغيّر الأرقام بل يوسّع الجزء المحسوب مباشرة.
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, inspect, literal, select, union_all
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+class KpiService:
+    """لقطة مؤشرات لوحة التحكم مع جدول تجميع يومي"""
+
+    def __init__(self, ttl=5, window_days=30, ready_check_interval=60):
+        self.ttl = ttl
+        self.window_days = window_days
+        self.ready_check_interval = ready_check_interval
+        self.db = None
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._ready = False
+        self._ready_checked_at = None
+
+    def init_app(self, app, db, property_model, user_model, booking_model, daily_model):
+        app.config.setdefault('KPI_CACHE_SECONDS', self.ttl)
+        app.config.setdefault('KPI_WINDOW_DAYS', self.window_days)
+        app.config.setdefault('KPI_READY_CHECK_SECONDS', self.ready_check_interval)
+        self.ttl = app.config['KPI_CACHE_SECONDS']
+        self.window_days = app.config['KPI_WINDOW_DAYS']
+        self.ready_check_interval = app.config['KPI_READY_CHECK_SECONDS']
+        self.db = db
+        self.property_model = property_model
+        self.user_model = user_model
+        self.booking_model = booking_model
+        self.daily_table = daily_model.__table__
+
+    @property
+    def ready(self):
+        """هل أُنشئ جدول التجميع اليومي؟ (ينشئه أمر flask kpi-rollup)
+
+        النتيجة السلبية تُعاد فحصها مرة كل ``KPI_READY_CHECK_SECONDS`` فقط.
+        """
+        if not self._ready:
+            now = time.monotonic()
+            if (self._ready_checked_at is None
+                    or now - self._ready_checked_at >= self.ready_check_interval):
+                self._ready = inspect(self.db.engine).has_table(self.daily_table.name)
+                self._ready_checked_at = now
+        return self._ready
+
+    # ------------------------------------------------------------------
+    # الحساب
+
+    def counters(self):
+        """العدّادات الأربعة في جملة واحدة"""
+        Property, User, Booking = self.property_model, self.user_model, self.booking_model
+        row = self.db.session.execute(select(
+            select(func.count(Property.id)).scalar_subquery().label('total_properties'),
+            select(func.count(Property.id)).where(Property.status == 'available')
+            .scalar_subquery().label('active_properties'),
+            select(func.count(User.id)).scalar_subquery().label('total_users'),
+            select(func.count(Booking.id)).where(Booking.status == 'pending')
+            .scalar_subquery().label('pending_bookings'),
+        )).one()
+        return dict(row._mapping)
+
+    def _daily_counts(self, since):
+        """{اسم العمود: {اليوم: العدد}} للجداول الثلاثة في جملة UNION ALL واحدة"""
+        parts = []
+        for column, model in (('new_properties', self.property_model),
+                              ('new_bookings', self.booking_model),
+                              ('new_users', self.user_model)):
+            day = func.date(model.created_at)
+            parts.append(select(literal(column).label('kind'), day.label('day'),
+                                func.count(model.id).label('count'))
+                         .where(model.created_at >= since)
+                         .group_by(day))
+        counts = {}
+        for kind, day, count in self.db.session.execute(union_all(*parts)):
+            if day is not None:
+                counts.setdefault(kind, {})[_as_date(day)] = count
+        return counts
+
+    def _pending_start(self, today, full=False):
+        """أول يوم غير نهائي في daily_stats: من آخر يوم مسجل (أو الأمس) فما بعد،
+        أو بداية النافذة إذا كان الجدول فارغاً أو قديماً أو مع ``full``"""
+        first = today - timedelta(days=self.window_days - 1)
+        latest = self.db.session.execute(select(func.max(self.daily_table.c.day))).scalar()
+        latest = _as_date(latest) if latest else None
+        if full or latest is None or latest < first:
+            return first
+        return min(latest, today - timedelta(days=1))
+
+    def refresh_rollup(self, full=False):
+        """إعادة حساب أيام النافذة غير المكتملة في daily_stats (لأمر kpi-rollup)
+
+        أول مرة (أو مع ``full``) تُحسب النافذة كلها، وبعدها من آخر يوم مسجل
+        (أو الأمس) حتى اليوم فقط.
+        """
+        table = self.daily_table
+        today = datetime.utcnow().date()
+        start = self._pending_start(today, full)
+        since = datetime.combine(start, datetime.min.time())
+        counts = self._daily_counts(since)
+
+        days = [start + timedelta(days=i) for i in range((today - start).days + 1)]
+        self.db.session.execute(table.delete().where(table.c.day >= start))
+        self.db.session.execute(table.insert(), [
+            {'day': day, **{column: counts.get(column, {}).get(day, 0)
+                            for column in ('new_properties', 'new_bookings', 'new_users')}}
+            for day in days])
+        self.db.session.commit()
+        return len(days)
+
+    def daily(self):
+        """صفوف آخر window_days يوماً من الأحدث إلى الأقدم (الأيام الناقصة أصفار)
+
+        قراءة فقط: الأيام النهائية من daily_stats، وما بعد آخر تجميع من الصفوف الخام.
+        """
+        table = self.daily_table
+        today = datetime.utcnow().date()
+        start = self._pending_start(today)
+        rows = self.db.session.execute(
+            select(table.c.day, table.c.new_properties, table.c.new_bookings, table.c.new_users)
+            .where(table.c.day >= today - timedelta(days=self.window_days - 1),
+                   table.c.day < start)
+        ).all()
+        by_day = {_as_date(row.day): row._mapping for row in rows}
+        live = self._daily_counts(datetime.combine(start, datetime.min.time()))
+        series = []
+        for offset in range(self.window_days):
+            day = today - timedelta(days=offset)
+            row = by_day.get(day)
+            entry = {'day': day}
+            for column in ('new_properties', 'new_bookings', 'new_users'):
+                if day >= start:
+                    entry[column] = live.get(column, {}).get(day, 0)
+                else:
+                    entry[column] = row[column] if row else 0
+            series.append(entry)
+        return series
+
+    def _compute(self):
+        snapshot = {'counters': self.counters(), 'daily': [], 'computed_at': datetime.utcnow()}
+        if self.ready:
+            snapshot['daily'] = self.daily()
+        return snapshot
+
+    # ------------------------------------------------------------------
+    # اللقطة المخزنة
+
+    def snapshot(self):
+        """آخر لقطة صالحة، أو لقطة جديدة يحسبها طلب واحد فقط"""
+        cached = self._snapshot
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        # يوجد من يحدّث الآن ولدينا نسخة سابقة: لا ننتظر
+        if not self._refresh_lock.acquire(blocking=cached is None):
+            return cached[1]
+        try:
+            cached = self._snapshot
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            value = self._compute()
+            self._snapshot = (time.monotonic() + self.ttl, value)
+            return value
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self):
+        self._snapshot = None
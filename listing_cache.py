@@ -0,0 +1,218 @@
+"""ذاكرة مؤقتة لنتائج صفحة العقارات
+
+تُخزَّن لكل مجموعة مرشحات (بعد توحيدها) وترتيب ومؤشر صفحة: قائمة معرّفات
+العقارات بالترتيب مع العدد الكلي ومؤشرات التنقل، ثم تُجلب العقارات التسعة
+بالمعرّف فقط. وبجانب الصفحات تُخزَّن عدّادات المرشحات (facets) لكل مجموعة مرشحات.
+
+المفاتيح تتضمن رقم نسخة ``catalogue`` من content_versions، الذي يزداد في معاملة
+أي تغيير على العقارات أو صورها أو المواقع، فلا يقرأ أي عامل صفحة أقدم من آخر
+تغيير حتى لو حدث في عامل آخر. في العامل الذي نفّذ التغيير تُحذف بعد commit
+الصفحات التي كان العقار يطابق مرشحاتها قبل التغيير أو بعده (والصفحات المرشحة
+بالموقع عند تغيّر مدينة أو حي) فلا تبقى في الذاكرة حتى تنتهي مدتها.
+"""
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from pagination import KeysetPage, count_cache
+
+# المرشحات التي تُقارن بالتساوي، ومرشحات الحد الأدنى والأعلى (المرشح -> العمود)
+EQUALITY_FILTERS = ('region_id', 'city_id', 'property_type_id', 'transaction_type')
+MIN_FILTERS = {'min_price': 'price', 'bedrooms': 'bedrooms', 'bathrooms': 'bathrooms', 'min_area': 'area'}
+MAX_FILTERS = {'max_price': 'price'}
+
+# أعمدة العقار التي تؤثر في عضويته أو ترتيبه في صفحات القائمة
+WATCHED_COLUMNS = ('id', 'status', 'region_id', 'city_id', 'property_type_id', 'transaction_type',
+                   'price', 'area', 'bedrooms', 'bathrooms', 'created_at', 'search_text')
+
+_PENDING_KEY = 'listing_cache_pending'
+
+
+def matches_filters(filters, row):
+    """هل يظهر العقار (كقاموس أعمدة) ضمن نتائج المرشحات؟"""
+    if row.get('status') != 'available':
+        return False
+    if 'keyword' in filters:
+        # لا نعيد تقييم البحث النصي هنا؛ نفترض التطابق (إبطال محافظ)
+        return True
+    for name in EQUALITY_FILTERS:
+        if name in filters and row.get(name) != filters[name]:
+            return False
+    for name, column in MIN_FILTERS.items():
+        if name in filters and (row.get(column) or 0) < filters[name]:
+            return False
+    for name, column in MAX_FILTERS.items():
+        if name in filters and (row.get(column) or 0) > filters[name]:
+            return False
+    return True
+
+
+def watched_row(target, previous=False):
+    """قيم WATCHED_COLUMNS للعقار بعد التغيير (أو قبله مع ``previous``)"""
+    state = inspect(target)
+    row = {}
+    for name in WATCHED_COLUMNS:
+        history = state.attrs[name].history
+        if previous and history.deleted:
+            row[name] = history.deleted[0]
+        else:
+            row[name] = getattr(target, name)
+    return row
+
+
+class CachedPage:
+    """صفحة مخزنة: المعرّفات بالترتيب وبيانات التنقل والمرشحات التي أنتجتها"""
+
+    __slots__ = ('filters', 'ids', 'total', 'has_prev', 'has_next',
+                 'prev_cursor', 'next_cursor', 'per_page')
+
+    def __init__(self, filters, page):
+        self.filters = filters
+        self.ids = tuple(item.id for item in page.items)
+        self.total = page.total
+        self.has_prev = page.has_prev
+        self.has_next = page.has_next
+        self.prev_cursor = page.prev_cursor
+        self.next_cursor = page.next_cursor
+        self.per_page = page.per_page
+
+    def to_page(self, items):
+        return KeysetPage(items, self.total, self.has_prev, self.has_next,
+                          self.prev_cursor, self.next_cursor, self.per_page)
+
+
+class CachedFacets:
+    """عدّادات مرشحات مخزنة؛ ``filters`` هي المرشحات غير المجمَّعة التي تحدد
+    العقارات المعدودة، فتتبع نفس منطق الإبطال الخاص بالصفحات"""
+
+    __slots__ = ('filters', 'ids', 'facets')
+
+    def __init__(self, filters, facets):
+        self.filters = filters
+        self.ids = ()
+        self.facets = facets
+
+
+class ListingCache:
+    """ذاكرة نتائج القائمة مع إبطال مدفوع بأحداث SQLAlchemy"""
+
+    def __init__(self, max_size=512, ttl=300):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.enabled = True
+        self.versions = None
+        self.version_name = 'catalogue'
+
+    def init_app(self, app, property_model, image_model, location_models=(),
+                 versions=None, version_name='catalogue'):
+        app.config.setdefault('LISTING_CACHE_ENABLED', True)
+        app.config.setdefault('LISTING_CACHE_SIZE', self.cache.max_size)
+        app.config.setdefault('LISTING_CACHE_TTL', self.cache.ttl)
+        self.enabled = app.config['LISTING_CACHE_ENABLED']
+        self.cache.max_size = app.config['LISTING_CACHE_SIZE']
+        self.cache.ttl = app.config['LISTING_CACHE_TTL']
+        self.versions = versions
+        self.version_name = version_name
+
+        event.listen(property_model, 'after_insert', self._property_inserted)
+        event.listen(property_model, 'after_update', self._property_updated)
+        event.listen(property_model, 'after_delete', self._property_deleted)
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(image_model, name, self._image_changed)
+            for model in location_models:
+                event.listen(model, name, self._location_changed)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    # ------------------------------------------------------------------
+    # القراءة والكتابة
+
+    def _version(self):
+        # قبل إنشاء جدول النسخ يبقى الإبطال المحلي ومدة الصلاحية فقط
+        row = self.versions.current(self.version_name) if self.versions else None
+        return row[0] if row else None
+
+    def make_key(self, filters, sort_by, sort_order, cursor):
+        return (self._version(), tuple(sorted(filters.items())), sort_by, sort_order, cursor or '')
+
+    def _facets_key(self, filters):
+        return ('facets', self._version(), tuple(sorted(filters.items())))
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        return self.cache.get(key)
+
+    def put(self, key, filters, page):
+        if self.enabled:
+            self.cache.set(key, CachedPage(dict(filters), page))
+
+    def get_facets(self, filters):
+        if not self.enabled:
+            return None
+        entry = self.cache.get(self._facets_key(filters))
+        return entry.facets if entry else None
+
+    def put_facets(self, filters, facets, grouped_fields=()):
+        if self.enabled:
+            counted = {k: v for k, v in filters.items() if k not in grouped_fields}
+            self.cache.set(self._facets_key(filters), CachedFacets(counted, facets))
+
+    def stats(self):
+        return self.cache.stats()
+
+    # ------------------------------------------------------------------
+    # الإبطال
+
+    def invalidate_property(self, before, after):
+        """حذف الصفحات التي يظهر فيها العقار قبل التغيير أو بعده"""
+        rows = [row for row in (before, after) if row]
+        property_id = rows[0]['id'] if rows else None
+        count_cache.clear()
+        return self.cache.delete_where(
+            lambda key, page: property_id in page.ids
+            or any(matches_filters(page.filters, row) for row in rows))
+
+    def invalidate_property_id(self, property_id):
+        """حذف الصفحات التي تعرض العقار (تغيّر صوره مثلاً)"""
+        return self.cache.delete_where(lambda key, page: property_id in page.ids)
+
+    def invalidate_locations(self):
+        """تغيّر حي أو مدينة يغيّر مدينة ومنطقة عقاراته: حذف الصفحات المرشحة بالموقع
+        وكل العدّادات (لأنها مجمّعة حسب المنطقة)"""
+        count_cache.clear()
+        return self.cache.delete_where(
+            lambda key, page: isinstance(page, CachedFacets)
+            or 'region_id' in page.filters or 'city_id' in page.filters)
+
+    @staticmethod
+    def _queue(target, change):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, []).append(change)
+
+    def _property_inserted(self, mapper, connection, target):
+        self._queue(target, ('property', None, watched_row(target)))
+
+    def _property_updated(self, mapper, connection, target):
+        self._queue(target, ('property', watched_row(target, previous=True), watched_row(target)))
+
+    def _property_deleted(self, mapper, connection, target):
+        self._queue(target, ('property', watched_row(target), None))
+
+    def _image_changed(self, mapper, connection, target):
+        self._queue(target, ('image', target.property_id))
+
+    def _location_changed(self, mapper, connection, target):
+        self._queue(target, ('location',))
+
+    def _apply_pending(self, session):
+        for change in session.info.pop(_PENDING_KEY, ()):
+            if change[0] == 'property':
+                self.invalidate_property(change[1], change[2])
+            elif change[0] == 'image':
+                self.invalidate_property_id(change[1])
+            else:
+                self.invalidate_locations()
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
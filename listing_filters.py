@@ -0,0 +1,144 @@
+"""توحيد معاملات البحث في صفحة العقارات
+
+البحثان المتطابقان منطقياً (حقل فارغ، ترتيب مختلف للمعاملات، ``page=1``،
+``bedrooms=0``...) يجب أن يكون لهما رابط واحد، وإلا فشلت كل ذاكرة مؤقتة أمامنا.
+``ListingFilters`` يقرأ المعاملات ويتحقق منها ويحذف القيم الافتراضية ثم يعيد
+كتابتها بترتيب ثابت، ويعيد الـ view التوجيه إلى هذا الرابط الموحّد.
+"""
+import math
+from urllib.parse import urlencode
+
+from flask import url_for
+
+SORT_FIELDS = ('created_at', 'price', 'area')
+SORT_ORDERS = ('desc', 'asc')
+KEYWORD_MAX_LENGTH = 100
+# أكبر عدد صحيح تقبله قاعدة البيانات (BIGINT بإشارة)؛ ما فوقه مدخل تالف
+MAX_INT = 2 ** 63 - 1
+
+
+def _text(value):
+    value = ' '.join(value.split())[:KEYWORD_MAX_LENGTH]
+    return value or None
+
+
+def _positive_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if 0 < number <= MAX_INT else None
+
+
+def _positive_number(value):
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return number if math.isfinite(number) and number > 0 else None
+
+
+def _choice(*choices):
+    def parse(value):
+        return value if value in choices else None
+    return parse
+
+
+# المرشحات بترتيب ظهورها في الرابط الموحّد
+FILTER_FIELDS = (
+    ('keyword', _text),
+    ('transaction_type', _choice('sale', 'rent')),
+    ('property_type_id', _positive_int),
+    ('region_id', _positive_int),
+    ('city_id', _positive_int),
+    ('min_price', _positive_number),
+    ('max_price', _positive_number),
+    ('bedrooms', _positive_int),
+    ('bathrooms', _positive_int),
+    ('min_area', _positive_number),
+)
+
+
+def _format(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class ListingFilters:
+    """مرشحات وترتيب وموضع صفحة العقارات بصيغتها الموحّدة"""
+
+    def __init__(self, values=None, sort_by=None, sort_order='desc', cursor=None, page=1,
+                 keyset=True):
+        self.values = dict(values or {})
+        self.keyset = keyset
+
+        allowed_sorts = SORT_FIELDS + (('relevance',) if 'keyword' in self.values else ())
+        self.sort_by = sort_by if sort_by in allowed_sorts else self.default_sort
+        self.sort_order = sort_order if sort_order in SORT_ORDERS else 'desc'
+        if self.sort_by == 'relevance':
+            self.sort_order = 'desc'
+
+        # المؤشر لصفحات keyset، ورقم الصفحة لترتيب الصلة أو وضع offset
+        offset_paging = self.sort_by == 'relevance' or not keyset
+        self.cursor = None if offset_paging else (cursor or None)
+        self.page = page if offset_paging and page and 1 < page <= MAX_INT else 1
+
+    @classmethod
+    def from_args(cls, args, keyset=True):
+        values = {}
+        for name, parse in FILTER_FIELDS:
+            raw = args.get(name, '').strip()
+            value = parse(raw) if raw else None
+            if value is not None:
+                values[name] = value
+        return cls(values,
+                   sort_by=args.get('sort_by'),
+                   sort_order=args.get('sort_order'),
+                   cursor=args.get('cursor'),
+                   page=args.get('page', 1, type=int),
+                   keyset=keyset)
+
+    @property
+    def default_sort(self):
+        return 'relevance' if 'keyword' in self.values else 'created_at'
+
+    def to_args(self):
+        """أزواج (الاسم، القيمة) بالترتيب الموحّد ومن دون القيم الافتراضية"""
+        pairs = [(name, _format(self.values[name])) for name, _ in FILTER_FIELDS
+                 if name in self.values]
+        if self.sort_by != self.default_sort:
+            pairs.append(('sort_by', self.sort_by))
+        if self.sort_order != 'desc':
+            pairs.append(('sort_order', self.sort_order))
+        if self.cursor:
+            pairs.append(('cursor', self.cursor))
+        if self.page > 1:
+            pairs.append(('page', str(self.page)))
+        return pairs
+
+    def query_string(self):
+        return urlencode(self.to_args())
+
+    def replace(self, **changes):
+        """نسخة معدّلة؛ تغيير المرشحات أو الترتيب يعيد المؤشر ورقم الصفحة للبداية"""
+        values = dict(self.values)
+        for name, _ in FILTER_FIELDS:
+            if name in changes:
+                value = changes.pop(name)
+                if value is None:
+                    values.pop(name, None)
+                else:
+                    values[name] = value
+        return ListingFilters(values,
+                              sort_by=changes.get('sort_by', self.sort_by),
+                              sort_order=changes.get('sort_order', self.sort_order),
+                              cursor=changes.get('cursor'),
+                              page=changes.get('page', 1),
+                              keyset=self.keyset)
+
+    def url(self, **changes):
+        """الرابط الموحّد لصفحة العقارات (بعد تطبيق التعديلات إن وُجدت)"""
+        filters = self.replace(**changes) if changes else self
+        query = filters.query_string()
+        return url_for('properties') + (f'?{query}' if query else '')
@@ -0,0 +1,61 @@
+"""شجرة المناطق والمدن والأحياء مع عدد العقارات في كل مستوى
+
+تُبنى من استعلامين: هيكل المواقع (ربط خارجي واحد) وعدد العقارات مجمّعاً حسب
+(الحي، الحالة)، ثم تُجمع الأعداد صعوداً إلى المدن والمناطق هنا بدلاً من تحميل
+عقارات كل حي في القالب لعدّها.
+"""
+
+STATUSES = ('available', 'sold', 'rented')
+
+
+class LocationNode:
+    """منطقة أو مدينة أو حي مع أبنائه وعدد عقاراته حسب الحالة"""
+
+    __slots__ = ('id', 'name', 'children', 'counts')
+
+    def __init__(self, node_id, name):
+        self.id = node_id
+        self.name = name
+        self.children = []
+        self.counts = dict.fromkeys(STATUSES, 0)
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def add_counts(self, counts):
+        for status, count in counts.items():
+            self.counts[status] = self.counts.get(status, 0) + count
+
+
+def build_location_tree(location_rows, count_rows):
+    """بناء الشجرة
+
+    ``location_rows``: صفوف (region_id, region_name, city_id, city_name,
+    district_id, district_name) والمدينة والحي قد يكونان None.
+    ``count_rows``: صفوف (district_id, status, count).
+    """
+    district_counts = {}
+    for district_id, status, count in count_rows:
+        district_counts.setdefault(district_id, {})[status or 'available'] = count
+
+    regions, cities = {}, {}
+    for region_id, region_name, city_id, city_name, district_id, district_name in location_rows:
+        region = regions.get(region_id)
+        if region is None:
+            region = regions[region_id] = LocationNode(region_id, region_name)
+        if city_id is None:
+            continue
+        city = cities.get(city_id)
+        if city is None:
+            city = cities[city_id] = LocationNode(city_id, city_name)
+            region.children.append(city)
+        if district_id is None:
+            continue
+        district = LocationNode(district_id, district_name)
+        counts = district_counts.get(district_id, {})
+        district.add_counts(counts)
+        city.add_counts(counts)
+        region.add_counts(counts)
+        city.children.append(district)
+    return list(regions.values())
@@ -0,0 +1,61 @@
+"""أدوات ترحيل بسيطة لقاعدة بيانات قائمة
+
+لا نستخدم Alembic في المشروع، لذلك تضيف أوامر الصيانة الأعمدة والفهارس
+الجديدة إلى الجداول الموجودة بهذه الدوال، وكلها آمنة عند التكرار.
+"""
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+
+def has_column(engine, table_name, column_name):
+    """هل يحتوي الجدول على العمود المطلوب؟"""
+    return column_name in {c['name'] for c in inspect(engine).get_columns(table_name)}
+
+
+def ensure_column(engine, column):
+    """إضافة عمود من النموذج إلى جدوله إن لم يكن موجوداً، وإرجاع True عند الإضافة"""
+    table_name = column.table.name
+    if has_column(engine, table_name, column.name):
+        return False
+
+    column_type = column.type.compile(dialect=engine.dialect)
+    with engine.begin() as conn:
+        conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}'))
+    return True
+
+
+def _index_state(conn, index_name):
+    """حالة فهرس PostgreSQL: None إن لم يوجد، وإلا قيمة indisvalid"""
+    return conn.execute(text(
+        'SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid '
+        'WHERE c.relname = :name'), {'name': index_name}).scalar()
+
+
+def ensure_index(engine, index):
+    """إنشاء فهرس معرّف في النموذج إن لم يكن موجوداً، وإرجاع True عند الإنشاء
+
+    على PostgreSQL يُنشأ الفهرس بـ CREATE INDEX CONCURRENTLY خارج أي معاملة
+    فلا تتوقف الكتابة على الجدول أثناء البناء. الفهرس الذي فشل بناؤه سابقاً
+    (indisvalid = false) يُحذف ويُعاد بناؤه.
+    """
+    if engine.dialect.name != 'postgresql':
+        if index.name in {i['name'] for i in inspect(engine).get_indexes(index.table.name)}:
+            return False
+        index.create(bind=engine)
+        return True
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        state = _index_state(conn, index.name)
+        if state:
+            return False
+        if state is False:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}'))
+
+        options = index.dialect_options['postgresql']
+        previous = options.get('concurrently', False)
+        options['concurrently'] = True
+        try:
+            conn.execute(CreateIndex(index))
+        finally:
+            options['concurrently'] = previous
+    return True
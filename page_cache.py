@@ -0,0 +1,183 @@
+"""ذاكرة الصفحات الكاملة المشتركة بين كل المستخدمين
+
+الصفحة الرئيسية وصفحة العقارات وصفحة التفاصيل لا تحتوي شيئاً خاصاً بالمستخدم
+(روابط الحساب والرسائل ونموذج الحجز تُحمَّل من /user/chrome)، فتُخزَّن كـ HTML
+مضغوط (gzip) لكل رابط موحّد مع ETag وتُخدم للجميع دون استعلامات أو قوالب. لا
+تُحفظ استجابة غيّرت الجلسة أو أرسلت كوكي.
+
+المفتاح هو الرابط مع ETag النسخة الذي حسبه ``conditional`` (versions.py) قبل
+العرض، فتغيير من عامل آخر (أو تحديث العقارات المشابهة في الخلفية) يغيّر النسخة
+ولا تُخدم بعده صفحة قديمة تحت ETag جديد. وفي العامل الذي نفّذ التغيير تسجل كل
+صفحة المعرّفات التي تعرضها ومرشحاتها (لصفحات القائمة) عبر ``record``، فتُحذف
+الصفحات المتأثرة بعد commit بنفس منطق ذاكرة نتائج القائمة ولا تبقى حتى تنتهي مدتها.
+"""
+import gzip
+import hashlib
+from functools import wraps
+
+from flask import current_app, g, request, session
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from listing_cache import matches_filters, watched_row
+
+_PENDING_KEY = 'page_cache_pending'
+
+
+class CachedHTML:
+    """صفحة مخزنة: نوعها والعقارات والمرشحات التي تعتمد عليها والمحتوى المضغوط"""
+
+    __slots__ = ('kind', 'ids', 'filters', 'body', 'etag')
+
+    def __init__(self, kind, ids, filters, body, etag):
+        self.kind = kind
+        self.ids = ids
+        self.filters = filters
+        self.body = body
+        self.etag = etag
+
+
+class PageCache:
+    """ذاكرة HTML للصفحات المشتركة مع إبطال مدفوع بأحداث SQLAlchemy"""
+
+    def __init__(self, max_size=256, ttl=60, compress_level=6):
+        self.cache = LRUCache(max_size=max_size, ttl=ttl)
+        self.compress_level = compress_level
+        self.enabled = True
+
+    def init_app(self, app, property_model, image_model, reference_models=()):
+        app.config.setdefault('PAGE_CACHE_ENABLED', True)
+        app.config.setdefault('PAGE_CACHE_SIZE', self.cache.max_size)
+        app.config.setdefault('PAGE_CACHE_TTL', self.cache.ttl)
+        self.enabled = app.config['PAGE_CACHE_ENABLED']
+        self.cache.max_size = app.config['PAGE_CACHE_SIZE']
+        self.cache.ttl = app.config['PAGE_CACHE_TTL']
+
+        event.listen(property_model, 'after_insert', self._property_inserted)
+        event.listen(property_model, 'after_update', self._property_updated)
+        event.listen(property_model, 'after_delete', self._property_deleted)
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            event.listen(image_model, name, self._image_changed)
+            # المناطق والمدن والأحياء والأنواع تظهر في مرشحات كل الصفحات
+            for model in reference_models:
+                event.listen(model, name, self._reference_changed)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    # ------------------------------------------------------------------
+    # الخدمة
+
+    def bypass(self):
+        """هل يجب تجاوز الذاكرة لهذا الطلب؟"""
+        return not self.enabled or request.method not in ('GET', 'HEAD')
+
+    @staticmethod
+    def record(ids=(), filters=None):
+        """تسجيل ما تعتمد عليه الصفحة الجارية (يُستدعى من داخل العرض)"""
+        g.page_cache_ids = frozenset(ids)
+        g.page_cache_filters = filters
+
+    def cached(self, kind):
+        """مزخرف عرض: خدمة الصفحة من الذاكرة (قالبها يضبط shared_page ولا يستخدم current_user)"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.bypass():
+                    return view(*args, **kwargs)
+                key = (g.get('content_etag'), request.full_path.rstrip('?'))
+                entry = self.cache.get(key)
+                state = 'HIT'
+                if entry is None:
+                    response = current_app.make_response(view(*args, **kwargs))
+                    entry = self._store(key, kind, response)
+                    if entry is None:
+                        return response
+                    state = 'MISS'
+                return self._respond(entry, state)
+            return wrapper
+        return decorator
+
+    def _store(self, key, kind, response):
+        # الكوكي وتغييرات الجلسة تخص هذا الطلب وحده
+        if (response.status_code != 200 or response.mimetype != 'text/html'
+                or 'Set-Cookie' in response.headers or session.modified):
+            return None
+        html = response.get_data()
+        entry = CachedHTML(kind, g.get('page_cache_ids', frozenset()),
+                           g.get('page_cache_filters'),
+                           gzip.compress(html, self.compress_level),
+                           hashlib.md5(html).hexdigest())
+        self.cache.set(key, entry)
+        return entry
+
+    @staticmethod
+    def _respond(entry, state):
+        if request.accept_encodings['gzip']:
+            response = current_app.response_class(entry.body, mimetype='text/html')
+            response.headers['Content-Encoding'] = 'gzip'
+            response.set_etag(entry.etag + '-gzip')
+        else:
+            response = current_app.response_class(gzip.decompress(entry.body), mimetype='text/html')
+            response.set_etag(entry.etag)
+        # نفس الصفحة للجميع فتصلح للذاكرات المشتركة، مع إعادة التحقق بـ ETag
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        response.headers['X-Page-Cache'] = state
+        return response.make_conditional(request)
+
+    def stats(self):
+        return self.cache.stats()
+
+    # ------------------------------------------------------------------
+    # الإبطال
+
+    def invalidate_property(self, before, after):
+        """حذف الرئيسية والصفحات التي تعرض العقار أو يطابق مرشحاتها قبل التغيير أو بعده"""
+        rows = [row for row in (before, after) if row]
+        property_id = rows[0]['id'] if rows else None
+        return self.cache.delete_where(
+            lambda key, entry: entry.kind == 'home' or property_id in entry.ids
+            or (entry.filters is not None
+                and any(matches_filters(entry.filters, row) for row in rows)))
+
+    def invalidate_property_id(self, property_id):
+        """حذف الصفحات التي تعرض العقار (تغيّر صوره مثلاً)"""
+        return self.cache.delete_where(lambda key, entry: property_id in entry.ids)
+
+    def clear(self):
+        self.cache.clear()
+
+    @staticmethod
+    def _queue(target, change):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, []).append(change)
+
+    def _property_inserted(self, mapper, connection, target):
+        self._queue(target, ('property', None, watched_row(target)))
+
+    def _property_updated(self, mapper, connection, target):
+        self._queue(target, ('property', watched_row(target, previous=True), watched_row(target)))
+
+    def _property_deleted(self, mapper, connection, target):
+        self._queue(target, ('property', watched_row(target), None))
+
+    def _image_changed(self, mapper, connection, target):
+        self._queue(target, ('image', target.property_id))
+
+    def _reference_changed(self, mapper, connection, target):
+        self._queue(target, ('reference',))
+
+    def _apply_pending(self, session):
+        for change in session.info.pop(_PENDING_KEY, ()):
+            if change[0] == 'property':
+                self.invalidate_property(change[1], change[2])
+            elif change[0] == 'image':
+                self.invalidate_property_id(change[1])
+            else:
+                self.clear()
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
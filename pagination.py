@@ -0,0 +1,180 @@
+"""ترقيم الصفحات بالمؤشر (Keyset / Seek pagination)
+
+بدلاً من OFFSET الذي يمسح كل الصفوف السابقة، نحفظ في مؤشر مُعتم قيمة مفتاح
+الترتيب ومعرّف آخر عنصر في الصفحة، ونطلب الصفحة التالية بشرط
+``(sort_key, id) < (value, last_id)``، فتكون تكلفة الصفحة 500 كتكلفة الصفحة الأولى.
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import tuple_
+
+
+class CountCache:
+    """ذاكرة مؤقتة صغيرة لعدد النتائج بدل تنفيذ COUNT(*) في كل صفحة"""
+
+    def __init__(self, ttl=60, max_size=512):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                return entry[1]
+
+        value = compute()
+
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                # حذف المدخلات المنتهية أولاً، ثم الأقدم إن لزم
+                expired = [k for k, (exp, _) in self._entries.items() if exp <= now]
+                for k in expired:
+                    del self._entries[k]
+                if len(self._entries) >= self.max_size:
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+count_cache = CountCache()
+
+
+def encode_cursor(sort_spec, value, row_id, direction='next'):
+    """ترميز قيمة المفتاح ومعرّف الصف في مؤشر نصي آمن للروابط"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({'s': sort_spec, 'v': value, 'i': row_id, 'd': direction},
+                         separators=(',', ':'), ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _coerce_value(value, value_type):
+    """إعادة قيمة المؤشر إلى نوع عمود الترتيب (التواريخ تُخزَّن كنص ISO)؛
+    ValueError أو TypeError إذا لم تكن من نوعه"""
+    if value is None or value_type is None:
+        return value
+    if value_type is datetime:
+        if not isinstance(value, str):
+            raise TypeError(value)
+        return datetime.fromisoformat(value)
+    if value_type in (int, float, Decimal):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(value)
+        if value_type is int and value != int(value):
+            raise ValueError(value)
+        return value_type(value)
+    if not isinstance(value, value_type):
+        raise TypeError(value)
+    return value
+
+
+def column_type(column):
+    """نوع Python لعمود الترتيب، أو None إذا لم يعرّفه نوع العمود"""
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def decode_cursor(cursor, sort_spec, value_type=None):
+    """فك المؤشر، وإرجاع None إذا كان تالفاً أو يخص ترتيباً آخر
+
+    ``value_type`` نوع عمود الترتيب: القيمة التي لا تتحول إليه تجعل المؤشر تالفاً
+    (يُعامل الطلب كأنه بلا مؤشر) بدل أن تصل إلى الاستعلام.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+        if data.get('s') != sort_spec or data.get('d') not in ('next', 'prev'):
+            return None
+        return _coerce_value(data['v'], value_type), int(data['i']), data['d']
+    except (ValueError, KeyError, TypeError, AttributeError, OverflowError):
+        return None
+
+
+class KeysetPage:
+    """صفحة نتائج بالمؤشر، بواجهة قريبة من Pagination في Flask-SQLAlchemy"""
+
+    def __init__(self, items, total, has_prev, has_next, prev_cursor, next_cursor, per_page):
+        self.items = items
+        self.total = total
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def pages(self):
+        if not self.total:
+            return 0
+        return (self.total + self.per_page - 1) // self.per_page
+
+
+def paginate_keyset(query, sort_column, id_column, sort_order='desc', cursor=None,
+                    per_page=9, sort_spec=None):
+    """تنفيذ الاستعلام بترقيم المؤشر
+
+    ``query`` هو الاستعلام بعد تطبيق المرشحات ومن دون ترتيب. يُعاد ``KeysetPage``
+    يحتوي على العناصر ومؤشرَي الصفحة السابقة والتالية وعدد تقريبي مخزن مؤقتاً.
+    """
+    sort_spec = sort_spec or f'{sort_column.key}:{sort_order}'
+    descending = sort_order != 'asc'
+
+    # العدد الكلي من الذاكرة المؤقتة (يُحسب مرة كل بضع ثوانٍ لكل مجموعة مرشحات)
+    compiled = query.statement.compile()
+    count_key = (str(compiled), tuple(sorted((k, repr(v)) for k, v in compiled.params.items())))
+    total = count_cache.get_or_compute(count_key, lambda: query.order_by(None).count())
+
+    decoded = decode_cursor(cursor, sort_spec, column_type(sort_column))
+    direction = 'next'
+    if decoded:
+        value, last_id, direction = decoded
+        key = tuple_(sort_column, id_column)
+        bound = (value, last_id)
+        # الرجوع للخلف يعني عكس اتجاه المقارنة والترتيب ثم قلب النتائج
+        forward = direction == 'next'
+        if descending == forward:
+            query = query.filter(key < bound)
+        else:
+            query = query.filter(key > bound)
+
+    scan_desc = descending if direction == 'next' else not descending
+    if scan_desc:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if direction == 'prev':
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = decoded is not None, has_more
+
+    prev_cursor = next_cursor = None
+    if rows:
+        first, last = rows[0], rows[-1]
+        if has_prev:
+            prev_cursor = encode_cursor(sort_spec, getattr(first, sort_column.key), first.id, 'prev')
+        if has_next:
+            next_cursor = encode_cursor(sort_spec, getattr(last, sort_column.key), last.id, 'next')
+
+    return KeysetPage(rows, total, has_prev, has_next, prev_cursor, next_cursor, per_page)
@@ -0,0 +1,255 @@
+"""استعلامات الصفحات مع تحميل العلاقات مسبقاً (eager loading)
+
+كل قالب يعرض بطاقات عقارات يلمس ``images`` و``property_type``، وصفحة التفاصيل
+تلمس ``owner``، وصفحات الحجوزات تلمس ``booking.property`` و``booking.user``.
+التحميل الكسول يعني استعلاماً إضافياً لكل صف، لذلك تمر كل استعلامات الصفحات
+من هنا مع خيارات التحميل المناسبة:
+
+- ``joinedload`` لعلاقات many-to-one (نوع العقار، المالك، المستخدم) ضمن نفس الاستعلام.
+- ``selectinload`` لعلاقات one-to-many (الصور) باستعلام واحد إضافي لكل الصفحة.
+
+يعتمد هذا الملف على النماذج في app.py، ويُستورد هناك بعد تعريفها.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import and_, event, func, literal, or_, select, union_all
+from sqlalchemy.orm import joinedload, selectinload
+
+from app import db, Booking, City, District, Property, Region, SimilarProperty, User
+from facets import FACET_FIELDS
+from geo import cover_cells, prefix_ranges
+from location_stats import build_location_tree
+
+
+def card_options():
+    """ما تحتاجه بطاقة العقار: الصور ونوع العقار"""
+    return (selectinload(Property.images), joinedload(Property.property_type))
+
+
+def listing_query():
+    """أساس استعلام صفحة العقارات (المتاحة فقط)"""
+    return Property.query.filter_by(status='available').options(*card_options())
+
+
+def apply_filters(query, filters, skip=()):
+    """تطبيق مرشحات صفحة العقارات الموحّدة (عدا الكلمة المفتاحية) على الاستعلام"""
+    filters = {k: v for k, v in filters.items() if k not in skip}
+    if 'region_id' in filters:
+        query = query.filter(Property.region_id == filters['region_id'])
+    if 'city_id' in filters:
+        query = query.filter(Property.city_id == filters['city_id'])
+    if 'property_type_id' in filters:
+        query = query.filter(Property.property_type_id == filters['property_type_id'])
+    if 'transaction_type' in filters:
+        query = query.filter(Property.transaction_type == filters['transaction_type'])
+    if 'min_price' in filters:
+        query = query.filter(Property.price >= filters['min_price'])
+    if 'max_price' in filters:
+        query = query.filter(Property.price <= filters['max_price'])
+    if 'bedrooms' in filters:
+        query = query.filter(Property.bedrooms >= filters['bedrooms'])
+    if 'bathrooms' in filters:
+        query = query.filter(Property.bathrooms >= filters['bathrooms'])
+    if 'min_area' in filters:
+        query = query.filter(Property.area >= filters['min_area'])
+    return query
+
+
+def listing_ids(filters):
+    """استعلام معرّفات عقارات صفحة القائمة بعد المرشحات (يُدمج في استعلام البحث النصي)"""
+    query = select(Property.id).where(Property.status == 'available').correlate(None)
+    return apply_filters(query, filters)
+
+
+def facet_groups(filters, search_ids=None):
+    """صفوف التجميع لعدّادات المرشحات باستعلام واحد (انظر facets.build_facets)
+
+    ``search_ids`` قائمة معرّفات أو استعلامها (PropertySearch.match_query).
+    """
+    columns = [getattr(Property, name) for name in FACET_FIELDS]
+    query = (db.session.query(*columns, func.count(Property.id))
+             .filter(Property.status == 'available'))
+    query = apply_filters(query, filters, skip=FACET_FIELDS)
+    if search_ids is not None:
+        query = query.filter(Property.id.in_(search_ids))
+    return query.group_by(*columns).all()
+
+
+def properties_in_bbox(filters, south, west, north, east):
+    """استعلام العقارات المتاحة داخل المستطيل مع مرشحات القائمة
+
+    نطاقات geohash تستخدم الفهرس لتضييق المرشحين، ثم يحذف شرط الإحداثيات
+    ما يقع في أطراف الخلايا خارج المستطيل.
+    """
+    cells = []
+    for start, end in prefix_ranges(cover_cells(south, west, north, east)):
+        cells.append(and_(Property.geohash >= start, Property.geohash < end) if end
+                     else Property.geohash >= start)
+    query = (Property.query.filter_by(status='available')
+             .options(joinedload(Property.property_type))
+             .filter(or_(*cells),
+                     Property.latitude.between(south, north),
+                     Property.longitude.between(west, east)))
+    return apply_filters(query, filters)
+
+
+def tile_details(ids):
+    """السعر ونوع العقار لكل معرّف (حمولة بلاطات الخريطة) باستعلام واحد"""
+    if not ids:
+        return {}
+    rows = (db.session.query(Property.id, Property.price, Property.property_type_id)
+            .filter(Property.id.in_(ids)).all())
+    return {row.id: (row.price, row.property_type_id) for row in rows}
+
+
+def properties_by_ids(ids):
+    """جلب العقارات بمعرّفاتها مع الحفاظ على ترتيب القائمة"""
+    if not ids:
+        return []
+    rows = Property.query.options(*card_options()).filter(Property.id.in_(ids)).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[pid] for pid in ids if pid in by_id]
+
+
+def latest_properties(limit):
+    return (Property.query.options(*card_options())
+            .order_by(Property.created_at.desc()).limit(limit).all())
+
+
+def featured_properties(limit):
+    return (Property.query.filter_by(is_featured=True).options(*card_options())
+            .order_by(Property.created_at.desc()).limit(limit).all())
+
+
+def owner_properties(owner_id):
+    return (Property.query.filter_by(owner_id=owner_id).options(*card_options())
+            .order_by(Property.created_at.desc()).all())
+
+
+def property_with_details(property_id):
+    """العقار مع صوره ونوعه ومالكه، أو 404"""
+    return (Property.query
+            .options(selectinload(Property.images),
+                     joinedload(Property.property_type),
+                     joinedload(Property.owner))
+            .filter(Property.id == property_id)
+            .first_or_404())
+
+
+def similar_properties(prop, limit=3, precomputed=True):
+    """العقارات المشابهة بترتيبها في similar_properties (بحث واحد بالمفتاح الأساسي)
+
+    قبل بناء الجدول: عقارات من نفس النوع ونوع المعاملة.
+    """
+    if precomputed:
+        return (Property.query.options(selectinload(Property.images))
+                .join(SimilarProperty, SimilarProperty.similar_id == Property.id)
+                .filter(SimilarProperty.property_id == prop.id,
+                        Property.status == 'available')
+                .order_by(SimilarProperty.rank)
+                .limit(limit).all())
+    return (Property.query.options(selectinload(Property.images))
+            .filter(Property.id != prop.id,
+                    Property.property_type_id == prop.property_type_id,
+                    Property.transaction_type == prop.transaction_type,
+                    Property.status == 'available')
+            .limit(limit).all())
+
+
+def property_versions(property_id, with_similar=True):
+    """صفوف (rank, id, updated_at) للعقار (rank = 0) ولعقاراته المشابهة بترتيبها،
+    باستعلام واحد لحساب ETag صفحة التفاصيل"""
+    listed = select(literal(0).label('rank'), literal(property_id).label('id'))
+    if with_similar:
+        listed = union_all(listed, select(SimilarProperty.rank, SimilarProperty.similar_id)
+                           .where(SimilarProperty.property_id == property_id))
+    listed = listed.subquery()
+    return db.session.execute(
+        select(listed.c.rank, Property.id, Property.updated_at)
+        .join(Property, Property.id == listed.c.id)
+        .order_by(listed.c.rank)
+    ).all()
+
+
+def location_tree():
+    """المناطق بمدنها وأحيائها وعدد العقارات حسب الحالة (انظر location_stats)"""
+    locations = (db.session.query(Region.id, Region.name, City.id, City.name,
+                                  District.id, District.name)
+                 .outerjoin(City, City.region_id == Region.id)
+                 .outerjoin(District, District.city_id == City.id)
+                 .order_by(Region.id, City.name, District.name)
+                 .all())
+    counts = (db.session.query(Property.district_id, Property.status, func.count(Property.id))
+              .group_by(Property.district_id, Property.status)
+              .all())
+    return build_location_tree(locations, counts)
+
+
+def booking_options():
+    """ما تحتاجه صفوف الحجوزات: العقار والمستخدم"""
+    return (joinedload(Booking.property), joinedload(Booking.user))
+
+
+def user_bookings(user_id):
+    return (Booking.query.filter_by(user_id=user_id).options(joinedload(Booking.property))
+            .order_by(Booking.created_at.desc()).all())
+
+
+def admin_properties_query():
+    return Property.query.options(joinedload(Property.property_type))
+
+
+def admin_bookings_query():
+    return Booking.query.options(*booking_options())
+
+
+def latest_bookings(limit):
+    return (Booking.query.options(*booking_options())
+            .order_by(Booking.created_at.desc()).limit(limit).all())
+
+
+def latest_users(limit):
+    return User.query.order_by(User.created_at.desc()).limit(limit).all()
+
+
+# ----------------------------------------------------------------------
+# أداة اختبار: عدّ استعلامات SQL في مسار واحد
+
+class QueryCounter:
+    """يسجّل جمل SQL المنفَّذة أثناء كتلة with"""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """عدّ الاستعلامات المنفَّذة على المحرك داخل الكتلة"""
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
+
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """فشل AssertionError إذا تجاوز عدد الاستعلامات الحد
+
+        with assert_max_queries(8):
+            client.get('/properties')
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = '\n'.join(f'  {i + 1}. {sql}' for i, sql in enumerate(counter.statements))
+        raise AssertionError(f'{counter.count} استعلام (الحد {limit}):\n{listing}')
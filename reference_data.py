@@ -0,0 +1,205 @@
+"""البيانات المرجعية في ذاكرة العملية: المناطق والمدن والأحياء وأنواع العقارات
+
+جداول صغيرة نادرة التغيّر تحتاجها النماذج والمرشحات في كل صفحة تقريباً، فتُحمَّل
+مرة واحدة كلقطة غير قابلة للتعديل (tuples وقواميس للقراءة فقط) بدل عدة استعلامات
+لكل طلب. اللقطة مربوطة برقم نسخة ``locations`` من content_versions:
+
+- تعديل المواقع في هذه العملية يُسقط اللقطة بعد commit مباشرة.
+- تعديلها من عامل آخر يُكتشف بمقارنة رقم النسخة، باستعلام صغير مرة كل
+  ``REFERENCE_CHECK_SECONDS`` ثانية على الأكثر.
+
+من نفس اللقطة تُبنى شجرة المواقع (المنطقة ← المدن ← الأحياء) كـ JSON مضغوط مسبقاً
+ببصمة محتواه، تخدمها ``bundle_response`` للقوائم المتسلسلة في المتصفح.
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from flask import current_app, request
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+RegionRow = namedtuple('RegionRow', 'id name')
+CityRow = namedtuple('CityRow', 'id name region_id')
+DistrictRow = namedtuple('DistrictRow', 'id name city_id')
+PropertyTypeRow = namedtuple('PropertyTypeRow', 'id name')
+
+_PENDING_KEY = 'reference_data_pending'
+
+
+def _group(rows, field):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(getattr(row, field), []).append(row)
+    return MappingProxyType({key: tuple(items) for key, items in grouped.items()})
+
+
+def _by_name(rows):
+    return tuple(sorted(rows, key=lambda row: row.name))
+
+
+class ReferenceSnapshot:
+    """لقطة واحدة من الجداول المرجعية (بترتيب المعرّف كما في Model.query.all())"""
+
+    __slots__ = ('version', 'regions', 'cities', 'districts', 'property_types',
+                 'regions_by_id', 'cities_by_id', 'cities_by_region', 'districts_by_city')
+
+    def __init__(self, version, regions, cities, districts, property_types):
+        self.version = version
+        self.regions = regions
+        self.cities = cities
+        self.districts = districts
+        self.property_types = property_types
+        self.regions_by_id = MappingProxyType({r.id: r for r in regions})
+        self.cities_by_id = MappingProxyType({c.id: c for c in cities})
+        # قوائم المدن والأحياء المنسدلة مرتبة بالاسم
+        self.cities_by_region = _group(_by_name(cities), 'region_id')
+        self.districts_by_city = _group(_by_name(districts), 'city_id')
+
+    def choices(self, name):
+        """خيارات (المعرّف، الاسم) مرتبة بالاسم لحقل قائمة منسدلة"""
+        return [(row.id, row.name) for row in _by_name(getattr(self, name))]
+
+
+class LocationBundle:
+    """شجرة المواقع كاملة: ``[[منطقة، اسم، [[مدينة، اسم، [[حي، اسم]...]]...]]...]``"""
+
+    __slots__ = ('body', 'gzip_body', 'etag')
+
+    def __init__(self, snapshot, compress_level=9):
+        tree = [[region.id, region.name,
+                 [[city.id, city.name,
+                   [[d.id, d.name] for d in snapshot.districts_by_city.get(city.id, ())]]
+                  for city in snapshot.cities_by_region.get(region.id, ())]]
+                for region in snapshot.regions]
+        self.body = json.dumps(tree, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, compress_level)
+        self.etag = hashlib.sha256(self.body).hexdigest()[:20]
+
+
+class ReferenceData:
+    """لقطة مرجعية مشتركة بين طلبات العملية تُعاد قراءتها عند تغيّر نسخة المواقع"""
+
+    def __init__(self, check_interval=5):
+        self.check_interval = check_interval
+        self.versions = None
+        self.version_name = 'locations'
+        self.bundle_max_age = 31536000
+        self._snapshot = None
+        self._bundle = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, region_model, city_model, district_model, type_model,
+                 versions=None, version_name='locations'):
+        app.config.setdefault('REFERENCE_CHECK_SECONDS', self.check_interval)
+        app.config.setdefault('LOCATIONS_TREE_MAX_AGE', self.bundle_max_age)
+        self.check_interval = app.config['REFERENCE_CHECK_SECONDS']
+        self.bundle_max_age = app.config['LOCATIONS_TREE_MAX_AGE']
+        self.db = db
+        self.models = (region_model, city_model, district_model, type_model)
+        self.versions = versions
+        self.version_name = version_name
+
+        for model in self.models:
+            for name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(model, name, self._changed)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    # ------------------------------------------------------------------
+    # القراءة
+
+    def snapshot(self):
+        """اللقطة الحالية، مع إعادة التحميل إذا تغيّرت نسخة المواقع"""
+        current = self._snapshot
+        now = time.monotonic()
+        if current is not None and now - self._checked_at < self.check_interval:
+            return current
+        version = self._version()
+        # قبل إنشاء جدول النسخ (version=None) يصير الفحص مهلة صلاحية بسيطة
+        if current is not None and version is not None and version == current.version:
+            self._checked_at = now
+            return current
+        with self._lock:
+            # طلب آخر ربما حمّلها أثناء الانتظار
+            current = self._snapshot
+            if current is not None and now - self._checked_at < self.check_interval:
+                return current
+            if current is None or version is None or version != current.version:
+                current = self._load(version)
+                self._snapshot = current
+            self._checked_at = now
+        return current
+
+    def _version(self):
+        row = self.versions.get(self.version_name) if self.versions else None
+        return row[0] if row else None
+
+    def _load(self, version):
+        # النسخة تُقرأ قبل الجداول: تغيير بينهما يرفعها فيُعاد التحميل في الفحص التالي
+        region_model, city_model, district_model, type_model = self.models
+        session = self.db.session
+
+        def rows(model, row_type):
+            columns = [getattr(model, field) for field in row_type._fields]
+            return tuple(row_type(*row) for row in
+                         session.execute(select(*columns).order_by(model.id)))
+
+        return ReferenceSnapshot(version,
+                                 rows(region_model, RegionRow),
+                                 rows(city_model, CityRow),
+                                 rows(district_model, DistrictRow),
+                                 rows(type_model, PropertyTypeRow))
+
+    def location_bundle(self):
+        """شجرة المواقع للقطة الحالية (تُبنى مرة لكل لقطة)"""
+        snapshot = self.snapshot()
+        cached = self._bundle
+        if cached is None or cached[0] is not snapshot:
+            cached = (snapshot, LocationBundle(snapshot))
+            self._bundle = cached
+        return cached[1]
+
+    def bundle_response(self):
+        """استجابة الشجرة: مضغوطة إن قبلها العميل، وثابتة لسنة إذا طلبها ببصمتها (?v=)"""
+        bundle = self.location_bundle()
+        if request.accept_encodings['gzip']:
+            response = current_app.response_class(bundle.gzip_body, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+            response.set_etag(bundle.etag + '-gzip')
+        else:
+            response = current_app.response_class(bundle.body, mimetype='application/json')
+            response.set_etag(bundle.etag)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        # البصمة في الرابط تتغير مع المحتوى، وبدونها يعيد المتصفح التحقق بـ ETag
+        if request.args.get('v') == bundle.etag:
+            response.cache_control.max_age = self.bundle_max_age
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    def invalidate(self):
+        self._snapshot = None
+
+    # ------------------------------------------------------------------
+    # الإبطال
+
+    @staticmethod
+    def _changed(mapper, connection, target):
+        session = inspect(target).session
+        if session is not None:
+            session.info[_PENDING_KEY] = True
+
+    def _apply_pending(self, session):
+        if session.info.pop(_PENDING_KEY, False):
+            self.invalidate()
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
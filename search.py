@@ -0,0 +1,237 @@
+"""محرك البحث النصي في العقارات مع دعم خصائص اللغة العربية
+
+- ``normalize_arabic`` يوحّد أشكال الهمزات والتاء المربوطة والألف المقصورة
+  ويحذف التشكيل والتطويل وأداة التعريف، فتتطابق "الشقة" و"شقه" و"شَقّة".
+- يُخزَّن النص الموحّد في العمود ``Property.search_text`` ويُحدَّث تلقائياً عند
+  الإضافة والتعديل.
+- الفهرس: tsvector + pg_trgm على PostgreSQL، وجدول FTS5 على SQLite، مع ترتيب
+  النتائج حسب الصلة. إن لم يُنشأ الفهرس بعد نرجع إلى LIKE على النص الموحّد.
+- ``match_query`` استعلام فرعي بكل المطابقات يُدمج مع مرشحات الصفحة وترتيبها
+  وعدّاداتها، و``ranked_ids`` أعلى ``SEARCH_MAX_RESULTS`` نتيجة صلةً بعد تطبيق
+  المرشحات داخل استعلام البحث نفسه.
+"""
+import re
+
+from sqlalchemy import (and_, column, event, exists, false, func, inspect, literal,
+                        literal_column, or_, select, table, text)
+
+_DIACRITICS_RE = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_TOKEN_RE = re.compile(r'\w+')
+
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+# أداة التعريف وما يلتصق بها من حروف الجر والعطف (الأطول أولاً)
+_ARTICLE_PREFIXES = (('وال', 3), ('ولل', 3), ('بال', 3), ('كال', 3), ('فال', 3), ('لل', 3), ('ال', 2))
+
+# جدول FTS5 على SQLite (rowid = معرّف العقار)
+FTS_TABLE = 'property_search'
+
+
+def _strip_article(token):
+    for prefix, min_rest in _ARTICLE_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= min_rest:
+            return token[len(prefix):]
+    return token
+
+
+def tokenize(value):
+    """تقسيم النص إلى كلمات موحّدة"""
+    if not value:
+        return []
+    value = _DIACRITICS_RE.sub('', value).translate(_CHAR_MAP).lower()
+    return [_strip_article(token) for token in _TOKEN_RE.findall(value)]
+
+
+def normalize_arabic(value):
+    """توحيد النص العربي للفهرسة والبحث"""
+    return ' '.join(tokenize(value))
+
+
+def build_search_document(prop):
+    """النص المفهرس لعقار: العنوان والوصف والعنوان التفصيلي"""
+    return normalize_arabic(' '.join(filter(None, [prop.title, prop.address, prop.description])))
+
+
+class PropertySearch:
+    """البحث في العقارات مع الحفاظ على الفهرس متزامناً مع الجدول"""
+
+    def __init__(self, max_results=500):
+        self.max_results = max_results
+        self.db = None
+        self.model = None
+        self._index_ready = None
+        self._has_trigram = None
+
+    def init_app(self, app, db, model):
+        self.db = db
+        self.model = model
+        app.config.setdefault('SEARCH_MAX_RESULTS', self.max_results)
+        self.max_results = app.config['SEARCH_MAX_RESULTS']
+
+        event.listen(model, 'before_insert', self._set_document)
+        event.listen(model, 'before_update', self._set_document)
+        event.listen(model, 'after_insert', self._sync_fts)
+        event.listen(model, 'after_update', self._sync_fts)
+        event.listen(model, 'after_delete', self._delete_fts)
+
+    # ------------------------------------------------------------------
+    # مزامنة الفهرس
+
+    def _set_document(self, mapper, connection, target):
+        target.search_text = build_search_document(target)
+
+    def _fts_available(self, connection):
+        if connection.dialect.name != 'sqlite':
+            return False
+        if self._index_ready is None:
+            self._index_ready = inspect(connection).has_table(FTS_TABLE)
+        return self._index_ready
+
+    @staticmethod
+    def _write_fts(connection, property_id, doc):
+        connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': property_id})
+        connection.execute(text(f'INSERT INTO {FTS_TABLE} (rowid, doc) VALUES (:id, :doc)'),
+                           {'id': property_id, 'doc': doc or ''})
+
+    def _sync_fts(self, mapper, connection, target):
+        if self._fts_available(connection):
+            self._write_fts(connection, target.id, target.search_text)
+
+    def _delete_fts(self, mapper, connection, target):
+        if self._fts_available(connection):
+            connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': target.id})
+
+    def create_index(self):
+        """إنشاء بنية الفهرس حسب نوع قاعدة البيانات"""
+        engine = self.db.engine
+        table = self.model.__tablename__
+        with engine.begin() as conn:
+            if engine.dialect.name == 'postgresql':
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_search_tsv ON {table} "
+                    f"USING gin (to_tsvector('simple', coalesce(search_text, '')))"))
+                try:
+                    with conn.begin_nested():
+                        conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+                        conn.execute(text(
+                            f'CREATE INDEX IF NOT EXISTS ix_{table}_search_trgm ON {table} '
+                            f'USING gin (search_text gin_trgm_ops)'))
+                except Exception:
+                    # pg_trgm غير متاح للمستخدم الحالي؛ يكفي فهرس tsvector
+                    pass
+            elif engine.dialect.name == 'sqlite':
+                conn.execute(text(f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(doc)'))
+        self._index_ready = None
+        self._has_trigram = None
+
+    def reindex(self, batch_size=500):
+        """إعادة بناء النص المفهرس لكل العقارات، وإرجاع عددها"""
+        session = self.db.session
+        model = self.model
+        sqlite = self.db.engine.dialect.name == 'sqlite'
+        if sqlite:
+            session.execute(text(f'DELETE FROM {FTS_TABLE}'))
+
+        count = 0
+        last_id = 0
+        while True:
+            batch = (model.query.filter(model.id > last_id)
+                     .order_by(model.id).limit(batch_size).all())
+            if not batch:
+                break
+            for prop in batch:
+                prop.search_text = build_search_document(prop)
+            session.flush()
+            if sqlite:
+                connection = session.connection()
+                for prop in batch:
+                    self._write_fts(connection, prop.id, prop.search_text)
+            last_id = batch[-1].id
+            count += len(batch)
+            session.commit()
+        return count
+
+    # ------------------------------------------------------------------
+    # الاستعلام
+
+    def match_query(self, keyword):
+        """استعلام معرّفات كل العقارات المطابقة (بلا ترتيب ولا حد) لـ ``Property.id.in_()``"""
+        tokens = tokenize(keyword)
+        if not tokens:
+            return select(self.model.id).where(false())
+        id_column, criteria, _ = self._match(tokens)
+        return select(id_column).where(criteria).correlate(None)
+
+    def matching_ids(self, keyword):
+        """معرّفات كل العقارات المطابقة (للتصفية في الذاكرة)"""
+        return self.db.session.execute(self.match_query(keyword)).scalars().all()
+
+    def ranked_ids(self, keyword, limit=None, within=None):
+        """معرّفات العقارات المطابقة مرتبة حسب الصلة (الأعلى أولاً)
+
+        ``within`` استعلام معرّفات (مرشحات الصفحة) يُطبَّق قبل الحد ``limit``، فلا
+        تضيع مطابقات المرشحات التي تقع خارج أعلى النتائج صلةً في الجدول كله.
+        """
+        tokens = tokenize(keyword)
+        if not tokens:
+            return []
+        id_column, criteria, order = self._match(tokens)
+        query = select(id_column).where(criteria)
+        if within is not None:
+            query = query.where(id_column.in_(within))
+        return self.db.session.execute(
+            query.order_by(*order).limit(limit or self.max_results)).scalars().all()
+
+    def _match(self, tokens):
+        """(عمود المعرّف، شرط المطابقة، ترتيب الصلة) حسب قاعدة البيانات والفهرس"""
+        dialect = self.db.engine.dialect.name
+        if dialect == 'postgresql':
+            return self._postgres_match(tokens)
+        if dialect == 'sqlite' and self._fts_available(self.db.session.connection()):
+            return self._sqlite_match(tokens)
+        return self._like_match(tokens)
+
+    def _postgres_match(self, tokens):
+        model = self.model
+        tsquery = func.to_tsquery(literal_column("'simple'"),
+                                  ' & '.join(f'{token}:*' for token in tokens))
+
+        def tsvector(source):
+            # نفس تعبير فهرس GIN حتى يستخدمه المخطط
+            return literal_column(f"to_tsvector('simple', coalesce({source}.search_text, ''))")
+
+        rows = tsvector(model.__tablename__)
+        matched = rows.op('@@')(tsquery)
+        order = [func.ts_rank(rows, tsquery).desc()]
+        if self._trigram_available():
+            # لا تطابق تام في الجدول كله: التشابه التقريبي يلتقط الأخطاء الإملائية
+            keyword = literal(' '.join(tokens))
+            exact = model.__table__.alias('exact')
+            any_exact = (select(literal(1)).select_from(exact)
+                         .where(tsvector('exact').op('@@')(tsquery)).correlate(None))
+            matched = or_(matched, and_(~exists(any_exact),
+                                        keyword.op('<%')(model.search_text)))
+            order.append(func.word_similarity(keyword, model.search_text).desc())
+        return model.id, matched, order + [model.id.desc()]
+
+    def _trigram_available(self):
+        if self._has_trigram is None:
+            self._has_trigram = bool(self.db.session.execute(text(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).scalar())
+        return self._has_trigram
+
+    def _sqlite_match(self, tokens):
+        fts = table(FTS_TABLE, column('rowid'))
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        return (fts.c.rowid, literal_column(FTS_TABLE).op('MATCH')(match),
+                [func.bm25(literal_column(FTS_TABLE))])
+
+    def _like_match(self, tokens):
+        model = self.model
+        return (model.id, and_(*(model.search_text.like(f'%{token}%') for token in tokens)),
+                [model.id.desc()])
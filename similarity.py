@@ -0,0 +1,301 @@
+"""العقارات المشابهة: أقرب الجيران على مصفوفة خصائص محسوبة مسبقاً
+
+المرشحون لعقار هم العقارات المتاحة من نفس النوع ونفس نوع المعاملة. داخل كل
+مجموعة يُمثَّل العقار بمتجه: لوغاريتم السعر والمساحة وعدد الغرف (مقسومة على
+الانحراف المعياري للمجموعة) والموقع بالكيلومترات، مضروبة في جذور الأوزان، فتكون
+مسافة إقليدس المربعة مجموعاً موزوناً للفروق، ويُضاف عقاب ثابت لاختلاف الحي.
+أقرب ``TOP_N`` عقار لكل عقار تُحفظ في جدول similar_properties، فتقرأ صفحة
+التفاصيل من فهرسه مباشرة.
+
+الحساب متجه بـ NumPy (من متطلبات المشروع، بدفعات محدودة الذاكرة)، مع بديل
+بحلقات بايثون للبيئات التي تنقصها. التحديث التدريجي بعد تغيّر العقارات يجري في
+خيط خلفي واحد لكل عامل، فلا ينتظره الطلب الذي غيّر العقار.
+"""
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+try:
+    import numpy as np
+except ImportError:  # بيئة دون متطلبات المشروع كاملة: حلقات بايثون أبطأ
+    np = None
+
+TOP_N = 6
+WEIGHTS = {'price': 1.0, 'area': 0.6, 'bedrooms': 0.4, 'distance': 1.0, 'district': 0.3}
+DISTANCE_SCALE_KM = 5.0
+CHUNK_CELLS = 4_000_000  # حجم مصفوفة المسافات لكل دفعة (صفوف × مرشحين)
+
+# الأعمدة التي تغيّرها يغيّر الجيران
+FEATURE_COLUMNS = ('status', 'property_type_id', 'transaction_type', 'price', 'area',
+                   'bedrooms', 'district_id', 'latitude', 'longitude')
+
+_PENDING_KEY = 'similarity_pending'
+
+
+def _std(values):
+    if len(values) < 2:
+        return 1.0
+    mean = sum(values) / len(values)
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+    return std or 1.0
+
+
+def feature_matrix(rows):
+    """(المعرّفات، المتجهات، الأحياء) لصفوف مجموعة واحدة
+
+    كل صف: (id, price, area, bedrooms, district_id, latitude, longitude).
+    """
+    ids = [row[0] for row in rows]
+    log_price = [math.log1p(max(row[1] or 0, 0)) for row in rows]
+    log_area = [math.log1p(max(row[2] or 0, 0)) for row in rows]
+    bedrooms = [float(row[3] or 0) for row in rows]
+    mean_lat = sum(row[5] or 0 for row in rows) / len(rows) if rows else 0.0
+    km_per_lng = 111.32 * math.cos(math.radians(mean_lat))
+
+    scales = (math.sqrt(WEIGHTS['price']) / _std(log_price),
+              math.sqrt(WEIGHTS['area']) / _std(log_area),
+              math.sqrt(WEIGHTS['bedrooms']) / _std(bedrooms))
+    geo = math.sqrt(WEIGHTS['distance']) / DISTANCE_SCALE_KM
+    vectors = [(p * scales[0], a * scales[1], b * scales[2],
+                (row[5] or 0) * 110.57 * geo, (row[6] or 0) * km_per_lng * geo)
+               for p, a, b, row in zip(log_price, log_area, bedrooms, rows)]
+    return ids, vectors, [row[4] for row in rows]
+
+
+def nearest(ids, vectors, districts, targets, top_n=TOP_N):
+    """أقرب ``top_n`` لكل موضع في ``targets``: {id: [(similar_id, score), ...]}"""
+    if np is not None:
+        return _nearest_numpy(ids, vectors, districts, targets, top_n)
+    penalty = WEIGHTS['district']
+    result = {}
+    for t in targets:
+        vt, dt = vectors[t], districts[t]
+        scored = []
+        for j, (vj, dj) in enumerate(zip(vectors, districts)):
+            if j != t:
+                distance = sum((a - b) ** 2 for a, b in zip(vt, vj)) + (penalty if dj != dt else 0.0)
+                scored.append((distance, ids[j]))
+        scored.sort()
+        result[ids[t]] = [(pid, 1.0 / (1.0 + d)) for d, pid in scored[:top_n]]
+    return result
+
+
+def _nearest_numpy(ids, vectors, districts, targets, top_n):
+    ids = np.asarray(ids)
+    matrix = np.asarray(vectors, dtype='float64')
+    districts = np.asarray([-1 if d is None else d for d in districts])
+    norms = (matrix ** 2).sum(axis=1)
+    k = min(top_n, len(ids) - 1)
+    result = {}
+    targets = np.asarray(targets, dtype='int64')
+    chunk_size = max(1, CHUNK_CELLS // max(len(ids), 1))
+    for start in range(0, len(targets), chunk_size):
+        chunk = targets[start:start + chunk_size]
+        distances = norms[chunk, None] + norms[None, :] - 2 * matrix[chunk] @ matrix.T
+        distances += WEIGHTS['district'] * (districts[chunk, None] != districts[None, :])
+        distances[np.arange(len(chunk)), chunk] = np.inf
+        if k <= 0:
+            result.update({int(ids[t]): [] for t in chunk})
+            continue
+        nearest_idx = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        for row, t in enumerate(chunk):
+            candidates = nearest_idx[row]
+            order = candidates[np.lexsort((ids[candidates], distances[row, candidates]))]
+            result[int(ids[t])] = [(int(ids[j]), float(1.0 / (1.0 + max(distances[row, j], 0.0))))
+                                   for j in order]
+    return result
+
+
+class SimilarityIndex:
+    """جدول أقرب الجيران مع تحديث تدريجي بعد تغيّر العقارات"""
+
+    def __init__(self, top_n=TOP_N, ready_check_interval=60):
+        self.top_n = top_n
+        self.ready_check_interval = ready_check_interval
+        self.app = None
+        self.db = None
+        self.model = None
+        self.table = None
+        self._ready = False
+        self._ready_checked_at = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._scheduled = False
+
+    def init_app(self, app, db, property_model, similar_model):
+        app.config.setdefault('SIMILAR_READY_CHECK_SECONDS', self.ready_check_interval)
+        self.ready_check_interval = app.config['SIMILAR_READY_CHECK_SECONDS']
+        self.app = app
+        self.db = db
+        self.model = property_model
+        self.table = similar_model.__table__
+
+        event.listen(property_model, 'after_insert', self._property_changed)
+        event.listen(property_model, 'after_update', self._property_updated)
+        event.listen(property_model, 'after_delete', self._property_changed)
+        event.listen(Session, 'after_commit', self._collect_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    @property
+    def ready(self):
+        """هل أُنشئ الجدول؟ (ينشئه أمر flask similar-rebuild)
+
+        النتيجة السلبية تُعاد فحصها مرة كل ``SIMILAR_READY_CHECK_SECONDS`` فقط.
+        """
+        if not self._ready:
+            now = time.monotonic()
+            if (self._ready_checked_at is None
+                    or now - self._ready_checked_at >= self.ready_check_interval):
+                self._ready = inspect(self.db.engine).has_table(self.table.name)
+                self._ready_checked_at = now
+        return self._ready
+
+    # ------------------------------------------------------------------
+    # الحساب
+
+    def _group_rows(self, property_type_id, transaction_type):
+        model = self.model
+        return self.db.session.execute(
+            select(model.id, model.price, model.area, model.bedrooms, model.district_id,
+                   model.latitude, model.longitude)
+            .where(model.status == 'available',
+                   model.property_type_id == property_type_id,
+                   model.transaction_type == transaction_type)
+            .order_by(model.id)
+        ).all()
+
+    def _write(self, neighbours, replace=True):
+        """استبدال صفوف العقارات المعطاة بجيرانها الجدد"""
+        table = self.table
+        property_ids = list(neighbours) if replace else []
+        for start in range(0, len(property_ids), 500):
+            self.db.session.execute(
+                table.delete().where(table.c.property_id.in_(property_ids[start:start + 500])))
+        rows = [{'property_id': pid, 'rank': rank, 'similar_id': similar_id, 'score': score}
+                for pid, similar in neighbours.items()
+                for rank, (similar_id, score) in enumerate(similar, start=1)]
+        if rows:
+            self.db.session.execute(table.insert(), rows)
+
+    def rebuild(self):
+        """إعادة حساب الجدول كاملاً، وإرجاع عدد العقارات"""
+        model = self.model
+        groups = self.db.session.execute(
+            select(model.property_type_id, model.transaction_type)
+            .where(model.status == 'available').distinct()
+        ).all()
+        self.db.session.execute(self.table.delete())
+        total = 0
+        for property_type_id, transaction_type in groups:
+            ids, vectors, districts = feature_matrix(self._group_rows(property_type_id, transaction_type))
+            self._write(nearest(ids, vectors, districts, range(len(ids)), self.top_n), replace=False)
+            total += len(ids)
+        self.db.session.commit()
+        return total
+
+    def refresh(self, property_ids):
+        """تحديث جيران العقارات المتغيرة ومن يتأثر بها فقط
+
+        يُعاد حساب: العقارات نفسها، والعقارات التي كانت تعرضها، وجيرانها الجدد
+        (التشابه متماثل تقريباً فمن دخل قائمتها غالباً تدخل هي قائمته). التطبيع
+        بإحصاءات المجموعة يجعل النتيجة تقريبية، لذلك يُشغَّل الأمر
+        ``flask similar-rebuild`` دورياً لإعادة البناء الكامل.
+        """
+        model, table = self.model, self.table
+        property_ids = set(property_ids)
+        referencing = set(self.db.session.execute(
+            select(table.c.property_id).where(table.c.similar_id.in_(property_ids))).scalars())
+
+        targets = property_ids | referencing
+        groups = self.db.session.execute(
+            select(model.id, model.property_type_id, model.transaction_type, model.status)
+            .where(model.id.in_(targets))
+        ).all()
+        neighbours = {pid: [] for pid in targets}  # المحذوفة وغير المتاحة تُفرَّغ قوائمها
+        by_group = {}
+        for pid, property_type_id, transaction_type, status in groups:
+            if status == 'available':
+                by_group.setdefault((property_type_id, transaction_type), set()).add(pid)
+
+        for (property_type_id, transaction_type), members in by_group.items():
+            ids, vectors, districts = feature_matrix(self._group_rows(property_type_id, transaction_type))
+            position = {pid: i for i, pid in enumerate(ids)}
+            first = nearest(ids, vectors, districts,
+                            [position[pid] for pid in members if pid in position], self.top_n)
+            neighbours.update(first)
+            # الجيران الجدد للعقارات المتغيرة
+            followers = {sid for pid in property_ids & set(first) for sid, _ in first[pid]} - set(first)
+            neighbours.update(nearest(ids, vectors, districts,
+                                      [position[pid] for pid in followers], self.top_n))
+
+        self._write(neighbours)
+        self.db.session.commit()
+        return len(neighbours)
+
+    # ------------------------------------------------------------------
+    # الأحداث: تُجمع المعرّفات بعد commit وتُحدَّث في خيط خلفي
+
+    @staticmethod
+    def _queue(target):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, set()).add(target.id)
+
+    def _property_changed(self, mapper, connection, target):
+        self._queue(target)
+
+    def _property_updated(self, mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in FEATURE_COLUMNS):
+            self._queue(target)
+
+    def _collect_pending(self, session):
+        pending = session.info.pop(_PENDING_KEY, None)
+        if pending:
+            with self._lock:
+                self._dirty |= pending
+                # التحديث الجاري يلتقط المعرّفات الجديدة في دورته التالية
+                if self._scheduled:
+                    return
+                self._scheduled = True
+                # الخيوط لا تنتقل مع fork: كل عامل gunicorn ينشئ خيطه عند أول تغيير
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=1,
+                                                        thread_name_prefix='similarity')
+                    self._pid = os.getpid()
+                executor = self._executor
+            executor.submit(self._refresh_dirty)
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+    def _refresh_dirty(self):
+        """تحديث كل ما تراكم من عقارات متغيرة حتى لا يبقى شيء"""
+        with self.app.app_context():
+            while True:
+                with self._lock:
+                    dirty, self._dirty = self._dirty, set()
+                    if not dirty:
+                        self._scheduled = False
+                        return
+                if not self.ready:  # قبل similar-rebuild لا يوجد ما يُحدَّث
+                    continue
+                try:
+                    self.refresh(dirty)
+                except Exception:
+                    self.db.session.rollback()
+                    self.app.logger.exception('تعذر تحديث العقارات المشابهة لـ %s', sorted(dirty))
+
+    def wait(self):
+        """انتظار انتهاء التحديث الخلفي الجاري (لأوامر الصيانة وقياس الأداء)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -1,40 +1,112 @@
-document.addEventListener('DOMContentLoaded', function () {
-    // تحديث قائمة المدن عند اختيار منطقة
-    document.getElementById('region_id').addEventListener('change', function () {
-        const regionId = this.value;
-        const citySelect = document.getElementById('city_id');
-
-        if (regionId) {
-            fetch(`/api/cities?region_id=${regionId}`)
-                .then(response => response.json())
-                .then(data => {
-                    citySelect.innerHTML = '<option value="">اختر المدينة...</option>';
-                    data.forEach(city => {
-                        citySelect.innerHTML += `<option value="${city.id}">${city.name}</option>`;
-                    });
-                });
-        } else {
-            citySelect.innerHTML = '<option value="">اختر المدينة...</option>';
-            document.getElementById('district_id').innerHTML = '<option value="">اختر الحي...</option>';
-        }
-    });
-
-    // تحديث قائمة الأحياء عند اختيار مدينة
-    document.getElementById('city_id').addEventListener('change', function () {
-        const cityId = this.value;
-        const districtSelect = document.getElementById('district_id');
-
-        if (cityId) {
-            fetch(`/api/districts?city_id=${cityId}`)
-                .then(response => response.json())
-                .then(data => {
-                    districtSelect.innerHTML = '<option value="">اختر الحي...</option>';
-                    data.forEach(district => {
-                        districtSelect.innerHTML += `<option value="${district.id}">${district.name}</option>`;
-                    });
-                });
-        } else {
-            districtSelect.innerHTML = '<option value="">اختر الحي...</option>';
-        }
-    });
-});
\ No newline at end of file
+document.addEventListener('DOMContentLoaded', function () {
+    const regionSelect = document.getElementById('region_id');
+    const citySelect = document.getElementById('city_id');
+    const districtSelect = document.getElementById('district_id');
+
+    // شجرة المواقع كاملة من /api/locations/tree تُحفظ في localStorage ببصمتها
+    // (?v= في الرابط)، فلا يحتاج تغيير المنطقة أو المدينة أي طلب
+    const LOCATION_TREE_KEY = 'locationTree';
+    let locationIndex = null;
+
+    function indexLocationTree(tree) {
+        const index = { cities: {}, districts: {} };
+        tree.forEach(([regionId, , cities]) => {
+            index.cities[regionId] = cities.map(([cityId, cityName, districts]) => {
+                index.districts[cityId] = districts;
+                return [cityId, cityName];
+            });
+        });
+        return index;
+    }
+
+    function loadLocationTree(url) {
+        const hash = new URL(url, window.location.href).searchParams.get('v');
+        try {
+            const stored = JSON.parse(localStorage.getItem(LOCATION_TREE_KEY));
+            if (hash && stored && stored.hash === hash) {
+                return Promise.resolve(indexLocationTree(stored.tree));
+            }
+        } catch (e) {
+            // تخزين غير متاح أو تالف: نجلب الشجرة من جديد
+        }
+        return fetch(url)
+            .then(response => response.json())
+            .then(tree => {
+                if (hash) {
+                    try {
+                        localStorage.setItem(LOCATION_TREE_KEY, JSON.stringify({ hash, tree }));
+                    } catch (e) {
+                        // المساحة ممتلئة: تعمل القوائم دون حفظ
+                    }
+                }
+                return indexLocationTree(tree);
+            });
+    }
+
+    function fillSelect(select, placeholder, items) {
+        select.innerHTML = '';
+        select.add(new Option(placeholder, ''));
+        (items || []).forEach(([id, name]) => select.add(new Option(name, id)));
+    }
+
+    function withLocations(callback) {
+        if (!locationIndex) {
+            const url = (regionSelect && regionSelect.dataset.locationsTree) || '/api/locations/tree';
+            locationIndex = loadLocationTree(url);
+        }
+        locationIndex.then(callback);
+    }
+
+    // تحديث قائمة المدن عند اختيار منطقة
+    if (regionSelect && citySelect) {
+        withLocations(() => {});
+        regionSelect.addEventListener('change', function () {
+            const regionId = this.value;
+
+            if (regionId) {
+                withLocations(index => fillSelect(citySelect, 'اختر المدينة...', index.cities[regionId]));
+            } else {
+                fillSelect(citySelect, 'اختر المدينة...', []);
+            }
+            if (districtSelect) {
+                fillSelect(districtSelect, 'اختر الحي...', []);
+            }
+        });
+    }
+
+    // تحديث قائمة الأحياء عند اختيار مدينة
+    if (citySelect && districtSelect) {
+        citySelect.addEventListener('change', function () {
+            const cityId = this.value;
+
+            if (cityId) {
+                withLocations(index => fillSelect(districtSelect, 'اختر الحي...', index.districts[cityId]));
+            } else {
+                fillSelect(districtSelect, 'اختر الحي...', []);
+            }
+        });
+    }
+
+    // الصفحات المشتركة بين كل المستخدمين: تحميل الأجزاء الخاصة بالمستخدم بعد الصفحة
+    const chromeSlots = document.querySelectorAll('[data-user-chrome]');
+    if (chromeSlots.length) {
+        const bookingSlot = document.querySelector('[data-user-chrome="booking"]');
+        const params = bookingSlot ? `?property_id=${bookingSlot.dataset.propertyId}` : '';
+        fetch(`/user/chrome${params}`, { credentials: 'same-origin' })
+            .then(response => response.json())
+            .then(data => {
+                chromeSlots.forEach(slot => {
+                    const html = data[slot.dataset.userChrome];
+                    if (html === undefined) {
+                        return;
+                    }
+                    // عناصر <template> تُستبدل كاملة (روابط التنقل داخل القائمة)
+                    if (slot.tagName === 'TEMPLATE') {
+                        slot.outerHTML = html;
+                    } else {
+                        slot.innerHTML = html;
+                    }
+                });
+            });
+    }
+});
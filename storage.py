@@ -0,0 +1,123 @@
+"""تخزين ملفات الصور: نظام ملفات محلي معنون بالمحتوى أو Cloudinary
+
+كل ملف يُحفظ بمفتاح يُخزَّن في قاعدة البيانات (مسارات ``variants`` و``image_path``
+في صور العقارات)، ويُحوَّل المفتاح إلى رابط عند العرض:
+
+- ``uploads/objects/ab/cd/<sha256>.webp``: مسار تحت مجلد static (كل المسارات
+  المحلية القديمة مثل img/property-placeholder.jpg مفاتيح صالحة أيضاً).
+- ``cloudinary:<public_id>``: ملف في Cloudinary.
+
+اسم الملف هو بصمة محتواه، فالملف نفسه يُحفظ مرة واحدة مهما تكرر رفعه، والمجلدات
+مقسمة على أول أربعة أحرف من البصمة حتى لا يتضخم مجلد واحد. لذلك قد يشترك أكثر
+من صف في ملف واحد، ولا يُحذف الملف إلا بعد حذف آخر صف يستخدمه. الواجهة المفعّلة
+للحفظ تحددها ``STORAGE_BACKEND`` (local أو cloudinary)؛ العرض يعمل للمفاتيح
+المحفوظة بأي منهما.
+"""
+import hashlib
+import io
+import os
+import tempfile
+
+import cloudinary
+import cloudinary.uploader
+from flask import url_for
+
+CLOUDINARY_PREFIX = 'cloudinary:'
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class LocalStorage:
+    """ملفات تحت مجلد static باسم بصمة المحتوى"""
+
+    name = 'local'
+
+    def __init__(self, root, base='uploads/objects'):
+        self.root = root
+        self.base = base
+
+    def key_for(self, digest, ext):
+        return f'{self.base}/{digest[:2]}/{digest[2:4]}/{digest}.{ext}'
+
+    def save(self, data, ext, timeout=None):
+        key = self.key_for(content_hash(data), ext)
+        path = os.path.join(self.root, key)
+        if not os.path.exists(path):  # نفس المحتوى محفوظ سابقاً
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # كتابة ملف مؤقت ثم نقله: لا يرى أحد ملفاً نصف مكتوب
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        return key
+
+    def url(self, key):
+        return url_for('static', filename=key)
+
+    def owns(self, key):
+        """هل المفتاح ملف معنون بالمحتوى؟ (لا الملفات الثابتة مثل الصورة البديلة)"""
+        return key.startswith(self.base + '/')
+
+    def delete(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+
+class CloudinaryStorage:
+    """ملفات في Cloudinary بمعرّف هو بصمة المحتوى (بلا إعادة كتابة)"""
+
+    name = 'cloudinary'
+
+    def __init__(self, folder='sayouriaqar'):
+        self.folder = folder
+
+    def save(self, data, ext, timeout=None):
+        public_id = f'{self.folder}/{content_hash(data)}'
+        cloudinary.uploader.upload(io.BytesIO(data), public_id=public_id, format=ext,
+                                   overwrite=False, resource_type='image', timeout=timeout)
+        return CLOUDINARY_PREFIX + public_id
+
+    def url(self, public_id):
+        return cloudinary.CloudinaryImage(public_id).build_url()
+
+    def delete(self, public_id):
+        cloudinary.uploader.destroy(public_id, resource_type='image')
+
+
+class Storage:
+    """الحفظ في الواجهة المفعّلة، والروابط حسب بادئة المفتاح"""
+
+    def __init__(self):
+        self.local = None
+        self.cloudinary = CloudinaryStorage()
+        self.backend = None
+
+    def init_app(self, app):
+        app.config.setdefault('STORAGE_BACKEND', 'cloudinary')
+        app.config.setdefault('STORAGE_LOCAL_BASE', 'uploads/objects')
+        self.local = LocalStorage(app.static_folder, app.config['STORAGE_LOCAL_BASE'])
+        backends = {backend.name: backend for backend in (self.local, self.cloudinary)}
+        if app.config['STORAGE_BACKEND'] not in backends:
+            raise ValueError(f"STORAGE_BACKEND غير معروف: {app.config['STORAGE_BACKEND']}")
+        self.backend = backends[app.config['STORAGE_BACKEND']]
+
+    def save(self, data, ext, timeout=None):
+        """حفظ المحتوى وإرجاع مفتاحه (الحفظ المتكرر لنفس المحتوى يعيد نفس المفتاح)"""
+        return self.backend.save(data, ext, timeout=timeout)
+
+    def url(self, key):
+        if key.startswith(CLOUDINARY_PREFIX):
+            return self.cloudinary.url(key[len(CLOUDINARY_PREFIX):])
+        return self.local.url(key)
+
+    def delete(self, key):
+        """حذف ملف بمفتاحه؛ المسارات المحلية خارج مجلد الملفات المعنونة تُترك كما هي"""
+        if key.startswith(CLOUDINARY_PREFIX):
+            self.cloudinary.delete(key[len(CLOUDINARY_PREFIX):])
+        elif self.local.owns(key):
+            self.local.delete(key)
@@ -0,0 +1,60 @@
+"""تطبيق اختبار على قاعدة SQLite مؤقتة مملوءة ببيانات اصطناعية
+
+تُستخدم أدوات القياس نفسها (benchmarks/common.py): ``load_app`` يوجّه التطبيق إلى
+ملف مؤقت قبل استيراده فلا تُلمس قاعدة التطوير أو الإنتاج، و``seed`` يملأ الجداول.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from common import load_app, seed  # noqa: E402
+
+PROPERTY_COUNT = 300
+
+# قبل جمع الاختبارات (test_query_counts يقرأ QUERY_BUDGETS من التطبيق)، وإلا
+# استُورد التطبيق على DATABASE_URL من البيئة وأعاد seed إنشاء جداولها
+os.environ.pop('BENCH_DATABASE_URL', None)
+_app_module = load_app()
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    module = _app_module
+    module.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with module.app.app_context():
+        seed(module, PROPERTY_COUNT)
+        admin = module.User(username='admin', email='admin@example.com',
+                            phone='000000000', role='admin')
+        admin.set_password('admin')
+        module.db.session.add(admin)
+        module.db.session.commit()
+        with module.db.engine.begin() as conn:
+            module.content_versions.ensure_rows(conn)
+        module.property_search.create_index()
+        module.property_search.reindex()
+    return module
+
+
+@pytest.fixture
+def app(app_module):
+    return app_module.app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app_module, app):
+    client = app.test_client()
+    with app.app_context():
+        admin = app_module.User.query.filter_by(role='admin').first()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
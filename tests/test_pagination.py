@@ -0,0 +1,88 @@
+"""ترقيم المؤشر: ترميز المؤشرات وفكها، والتنقل عبر كل الصفحات بمحركي SQL والأعمدة"""
+from datetime import datetime
+
+import pytest
+
+from pagination import decode_cursor, encode_cursor, paginate_keyset
+
+
+def test_cursor_round_trip_keeps_value_type():
+    created = datetime(2024, 3, 1, 12, 30, 15, 250)
+    cursor = encode_cursor('created_at:desc', created, 42, 'prev')
+    assert decode_cursor(cursor, 'created_at:desc', datetime) == (created, 42, 'prev')
+    assert decode_cursor(encode_cursor('price:asc', 1500.5, 7), 'price:asc', float) == (1500.5, 7, 'next')
+    assert decode_cursor(encode_cursor('price:asc', None, 7), 'price:asc', float) == (None, 7, 'next')
+
+
+@pytest.mark.parametrize('sort_spec, value, value_type', [
+    ('created_at:desc', 'not-a-date', datetime),
+    ('created_at:desc', 5, datetime),
+    ('price:asc', 'abc', float),
+    ('price:asc', True, float),
+    ('price:asc', [1], float),
+])
+def test_cursor_with_wrong_value_type_is_ignored(sort_spec, value, value_type):
+    assert decode_cursor(encode_cursor(sort_spec, value, 3), sort_spec, value_type) is None
+
+
+def test_cursor_for_other_sort_or_garbage_is_ignored():
+    cursor = encode_cursor('price:asc', 10.0, 1)
+    assert decode_cursor(cursor, 'price:desc', float) is None
+    assert decode_cursor('%%%not-base64', 'price:asc', float) is None
+
+
+def walk(first_page, next_page):
+    """معرّفات كل الصفحات باتباع مؤشر الصفحة التالية"""
+    ids, page = [], first_page
+    while True:
+        ids.extend(page.items)
+        if not page.has_next:
+            return ids
+        page = next_page(page.next_cursor)
+
+
+@pytest.mark.parametrize('sort_by, sort_order', [('price', 'asc'), ('created_at', 'desc')])
+def test_keyset_walk_matches_ordered_query(app_module, app, sort_by, sort_order):
+    Property = app_module.Property
+    column = getattr(Property, sort_by)
+    filters = {'transaction_type': 'rent'}
+    with app.app_context():
+        query = app_module.queries.apply_filters(
+            Property.query.filter_by(status='available'), filters)
+        order = column.asc() if sort_order == 'asc' else column.desc()
+        id_order = Property.id.asc() if sort_order == 'asc' else Property.id.desc()
+        expected = [p.id for p in query.order_by(order, id_order)]
+
+        def sql_page(cursor=None):
+            page = paginate_keyset(query, column, Property.id, sort_order=sort_order,
+                                   cursor=cursor, per_page=9)
+            page.items = [p.id for p in page.items]
+            return page
+
+        assert walk(sql_page(), sql_page) == expected
+
+        engine = app_module.columnar_listing
+        pytest.importorskip('numpy')
+        engine.enabled = True
+        try:
+            def columnar_page(cursor=None):
+                return engine.paginate(filters, sort_by, sort_order, cursor=cursor, per_page=9)
+            assert walk(columnar_page(), columnar_page) == expected
+        finally:
+            engine.enabled = app.config['LISTING_ENGINE'] == 'columnar'
+
+
+@pytest.mark.parametrize('query', [
+    'region_id=99999999999999999999',
+    'city_id=9223372036854775808',
+    'bedrooms=-2',
+    'page=99999999999999999999',
+])
+def test_out_of_range_integers_are_ignored(app_module, client, query):
+    app_module.app.config['LISTING_PAGINATION_MODE'] = 'offset'
+    try:
+        response = client.get(f'/properties?{query}', follow_redirects=True)
+    finally:
+        app_module.app.config['LISTING_PAGINATION_MODE'] = 'keyset'
+    assert response.status_code == 200
+    assert response.request.path == '/properties' and not response.request.query_string
@@ -0,0 +1,66 @@
+"""عدد استعلامات كل صفحة ضمن حدها في QUERY_BUDGETS، وإبطال الذاكرات بعد التعديل"""
+import pytest
+from sqlalchemy import text
+
+from queries import assert_max_queries
+
+
+def budget_routes():
+    import app as app_module
+    return list(app_module.QUERY_BUDGETS.items())
+
+
+@pytest.fixture
+def warm(app_module, app):
+    # البيانات المرجعية تُحمَّل مرة لكل عملية، لا لكل طلب
+    with app.app_context():
+        app_module.reference_data.snapshot()
+        yield app_module.Property.query.first().id
+
+
+@pytest.mark.parametrize('route, limit', budget_routes(), ids=lambda value: str(value))
+def test_route_query_budget(app_module, admin_client, warm, route, limit):
+    app_module.page_cache.clear()
+    route = route.format(id=warm)
+    with assert_max_queries(limit) as counter:
+        response = admin_client.get(route)
+    assert response.status_code == 200, route
+    assert counter.count > 0
+
+
+def test_listing_reflects_commit_in_same_worker(app_module, app, client):
+    url = '/properties?sort_by=price&sort_order=asc'
+    assert client.get(url, follow_redirects=True).status_code == 200
+    assert client.get(url, follow_redirects=True).headers.get('X-Page-Cache') == 'HIT'
+
+    with app.app_context():
+        cheapest = (app_module.Property.query.filter_by(status='available')
+                    .order_by(app_module.Property.price, app_module.Property.id).first())
+        cheapest.title = 'عقار معدّل للاختبار'
+        app_module.db.session.commit()
+
+    response = client.get(url, follow_redirects=True)
+    assert response.headers.get('X-Page-Cache') == 'MISS'
+    assert 'عقار معدّل للاختبار' in response.get_data(as_text=True)
+
+
+def test_page_cache_follows_change_from_another_worker(app_module, app, client):
+    with app.app_context():
+        property_id = app_module.Property.query.filter_by(status='available').first().id
+    url = f'/property/{property_id}'
+    first = client.get(url)
+    assert client.get(url).headers.get('X-Page-Cache') == 'HIT'
+
+    # عامل آخر: تعديل مباشر لا يمر بأحداث هذه العملية، مع رفع النسخ المشتركة
+    with app.app_context():
+        app_module.db.session.execute(text(
+            "UPDATE properties SET title = 'عنوان من عامل آخر', updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = :id"), {'id': property_id})
+        app_module.db.session.execute(text(
+            'UPDATE content_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP'))
+        app_module.db.session.commit()
+
+    response = client.get(url)
+    assert response.headers.get('X-Page-Cache') == 'MISS'
+    assert response.headers['ETag'] != first.headers['ETag']
+    assert 'عنوان من عامل آخر' in response.get_data(as_text=True)
@@ -0,0 +1,54 @@
+"""توحيد النص العربي والبحث النصي مع مرشحات القائمة وعدّاداتها"""
+import pytest
+from sqlalchemy import func
+
+from facets import build_facets
+from search import normalize_arabic, tokenize
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('الشقة', 'شقه'),
+    ('شَقّة', 'شقه'),
+    ('أرض إسكان آمنة', 'ارض اسكان امنه'),
+    ('مستشفى', 'مستشفي'),
+    ('بالرياض وللبيع', 'رياض بيع'),
+    ('شقــة', 'شقه'),
+    ('غرف ٣', 'غرف 3'),
+])
+def test_normalize_arabic(value, expected):
+    assert normalize_arabic(value) == expected
+
+
+def test_short_words_keep_their_article_like_prefix():
+    # "ال" لا تُحذف إذا بقي بعدها أقل من حرفين
+    assert tokenize('الم') == ['الم']
+
+
+def test_keyword_search_applies_filters_before_the_result_cap(app_module, app):
+    Property = app_module.Property
+    search = app_module.property_search
+    with app.app_context():
+        region_id = Property.query.filter_by(status='available').first().region_id
+        filters = {'region_id': region_id}
+        matches = search.matching_ids('شقة')
+        expected = (Property.query.filter(Property.id.in_(matches), Property.status == 'available',
+                                          Property.region_id == region_id).count())
+        cap = search.max_results
+        search.max_results = 3
+        try:
+            ranked = search.ranked_ids('شقة', within=app_module.queries.listing_ids(filters))
+        finally:
+            search.max_results = cap
+        assert len(ranked) == min(3, expected)
+        assert {p.region_id for p in Property.query.filter(Property.id.in_(ranked))} == {region_id}
+
+
+def test_facet_counts_match_keyword_listing(app_module, app):
+    Property = app_module.Property
+    with app.app_context():
+        match = app_module.property_search.match_query('فيلا')
+        facets = build_facets(app_module.queries.facet_groups({}, match), {})
+        by_type = dict(app_module.db.session.query(Property.property_type_id, func.count(Property.id))
+                       .filter(Property.status == 'available', Property.id.in_(match))
+                       .group_by(Property.property_type_id).all())
+    assert facets['property_type_id'] == by_type
@@ -0,0 +1,30 @@
+"""حذف ملفات الصور المعنونة بالمحتوى عند حذف العقار"""
+import os
+
+from storage import LocalStorage
+
+
+def test_shared_image_files_survive_until_last_owner_is_deleted(app_module, app, admin_client,
+                                                               monkeypatch, tmp_path):
+    Property, PropertyImage, db = app_module.Property, app_module.PropertyImage, app_module.db
+    local = LocalStorage(str(tmp_path))
+    monkeypatch.setattr(app_module.storage, 'local', local)
+    full, card = local.save(b'full-image', 'jpg'), local.save(b'card-image', 'webp')
+    variants = {'full': {'width': 1200, 'height': 800, 'webp': card, 'jpeg': full}}
+
+    with app.app_context():
+        # العقار الذي له حجوزات لا يُحذف
+        owners = Property.query.filter(~Property.bookings.any()).order_by(Property.id).limit(2).all()
+        for owner in owners:
+            db.session.add(PropertyImage(property_id=owner.id, image_path=full, variants=variants,
+                                         content_hash='f' * 64))
+        db.session.commit()
+        first_id, second_id = (owner.id for owner in owners)
+
+    assert admin_client.post(f'/admin/properties/{first_id}/delete').status_code == 302
+    with app.app_context():
+        assert db.session.get(Property, first_id) is None
+    assert os.path.exists(tmp_path / full) and os.path.exists(tmp_path / card)
+
+    admin_client.post(f'/admin/properties/{second_id}/delete')
+    assert not os.path.exists(tmp_path / full) and not os.path.exists(tmp_path / card)
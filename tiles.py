@@ -0,0 +1,152 @@
+"""بلاطات GeoJSON للعقارات المتاحة مخزنة على القرص
+
+كل بلاطة ``z/x/y`` تُبنى مرة واحدة وتُحفظ في ``TILE_CACHE_DIR/z/x/y.json`` ثم
+تُخدم بـ ETag وCache-Control عام فتصلح للتخزين في المتصفح وCDN. عند تغيّر عقار (موقعه أو
+حالته أو سعره أو نوعه) تُحذف بعد commit فقط البلاطات التي تحتوي موقعه القديم أو
+الجديد، بلاطة واحدة في كل مستوى تكبير؛ المجلد مشترك فيرى كل العمال الحذف.
+
+البلاطة لا تُحفظ إلا إذا بقي رقم نسخة ``catalogue`` (content_versions، يزداد في
+معاملة أي تغيير) كما هو من قبل بنائها إلى لحظة حفظها، فبناء بدأ في عامل آخر قبل
+التغيير لا يعيد البلاطة القديمة بعد حذفها. تبقى نافذة صغيرة بين آخر قراءة للنسخة
+والحفظ، وتغطيها مدة الصلاحية ``TILE_CACHE_TTL``.
+"""
+import json
+import math
+import os
+import tempfile
+import time
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from clustering import TILE_PX, project
+
+# الأعمدة التي تظهر في البلاطات أو تحدد وجود العقار فيها
+TILE_COLUMNS = ('latitude', 'longitude', 'status', 'price', 'property_type_id')
+
+_PENDING_KEY = 'property_tiles_pending'
+
+
+def tile_of(latitude, longitude, zoom):
+    x, y = project(latitude, longitude, zoom)
+    return int(x // TILE_PX), int(y // TILE_PX)
+
+
+def tile_bounds(zoom, x, y):
+    """(south, west, north, east) للبلاطة"""
+    def latitude(row):
+        n = math.pi - 2 * math.pi * row / 2 ** zoom
+        return math.degrees(math.atan(math.sinh(n)))
+    scale = 2 ** zoom
+    return latitude(y + 1), x / scale * 360 - 180, latitude(y), (x + 1) / scale * 360 - 180
+
+
+class PropertyTiles:
+    """ذاكرة بلاطات على القرص مع إبطال لكل بلاطة"""
+
+    def __init__(self, max_zoom=18, ttl=3600):
+        self.max_zoom = max_zoom
+        self.ttl = ttl
+        self.directory = None
+        self.versions = None
+        self.version_name = 'catalogue'
+
+    def init_app(self, app, property_model, versions=None, version_name='catalogue'):
+        app.config.setdefault('TILE_CACHE_DIR', os.path.join(app.instance_path, 'tiles'))
+        app.config.setdefault('TILE_MAX_ZOOM', self.max_zoom)
+        app.config.setdefault('TILE_CACHE_TTL', self.ttl)
+        self.directory = app.config['TILE_CACHE_DIR']
+        self.max_zoom = app.config['TILE_MAX_ZOOM']
+        self.ttl = app.config['TILE_CACHE_TTL']
+        self.versions = versions
+        self.version_name = version_name
+
+        event.listen(property_model, 'after_insert', self._property_inserted)
+        event.listen(property_model, 'after_update', self._property_updated)
+        event.listen(property_model, 'after_delete', self._property_deleted)
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    def path(self, zoom, x, y):
+        return os.path.join(self.directory, str(zoom), str(x), f'{y}.json')
+
+    def valid(self, zoom, x, y):
+        return 0 <= zoom <= self.max_zoom and 0 <= x < 2 ** zoom and 0 <= y < 2 ** zoom
+
+    # ------------------------------------------------------------------
+    # القراءة والبناء
+
+    def get_or_build(self, zoom, x, y, build):
+        """محتوى البلاطة (bytes)، بعد بنائها بـ ``build(z, x, y)`` إن لم تكن مخزنة"""
+        path = self.path(zoom, x, y)
+        try:
+            if time.time() - os.path.getmtime(path) < self.ttl:
+                with open(path, 'rb') as f:
+                    return f.read()
+        except OSError:
+            pass
+
+        # النسخة من قاعدة البيانات لا من ذاكرة العملية: تتغير بتغيير أي عامل
+        before = self._version()
+        payload = json.dumps(build(zoom, x, y), separators=(',', ':'),
+                             ensure_ascii=False).encode('utf-8')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(handle, 'wb') as f:
+            f.write(payload)
+        # تغيّر الكتالوج أثناء البناء (أو لا توجد نسخة بعد): لا نحفظ نسخة ربما قديمة
+        if before is not None and before == self._version():
+            os.replace(temp_path, path)
+        else:
+            os.unlink(temp_path)
+        return payload
+
+    def _version(self):
+        row = self.versions.get(self.version_name) if self.versions else None
+        return row[0] if row else None
+
+    # ------------------------------------------------------------------
+    # الإبطال
+
+    def invalidate_point(self, latitude, longitude):
+        """حذف بلاطات كل المستويات التي تحتوي النقطة"""
+        for zoom in range(self.max_zoom + 1):
+            try:
+                os.unlink(self.path(zoom, *tile_of(latitude, longitude, zoom)))
+            except OSError:
+                pass
+
+    @staticmethod
+    def _point(target, previous=False):
+        state = inspect(target)
+        values = {}
+        for name in ('latitude', 'longitude'):
+            history = state.attrs[name].history
+            values[name] = history.deleted[0] if previous and history.deleted else getattr(target, name)
+        if values['latitude'] is None or values['longitude'] is None:
+            return None
+        return values['latitude'], values['longitude']
+
+    @staticmethod
+    def _queue(target, points):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, set()).update(p for p in points if p)
+
+    def _property_inserted(self, mapper, connection, target):
+        self._queue(target, [self._point(target)])
+
+    def _property_updated(self, mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in TILE_COLUMNS):
+            self._queue(target, [self._point(target, previous=True), self._point(target)])
+
+    def _property_deleted(self, mapper, connection, target):
+        self._queue(target, [self._point(target)])
+
+    def _apply_pending(self, session):
+        for latitude, longitude in session.info.pop(_PENDING_KEY, ()):
+            self.invalidate_point(latitude, longitude)
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
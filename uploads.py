@@ -0,0 +1,156 @@
+"""رفع صور العقارات في الخلفية
+
+إضافة العقار أو تعديله لا تنتظر رفع الصور: تُنشأ صفوف PropertyImage بحالة
+``processing`` (مسارها صورة العقار الافتراضية) وتُنسخ الملفات إلى الذاكرة، ثم
+بعد commit تُرسل إلى مجموعة خيوط محدودة (``IMAGE_UPLOAD_WORKERS``) تولّد نسخها
+المصغرة وتحفظها في التخزين بالتوازي، بمهلة لكل طلب رفع (``IMAGE_UPLOAD_TIMEOUT``).
+الصورة التي سبق رفعها بنفس المحتوى (بصمة ``content_hash``) تأخذ نسخ الصورة
+السابقة دون معالجة أو رفع. عند الانتهاء تصير الصورة ``ready`` أو ``failed`` عبر
+ORM، فتُبطل أحداث الصور ذاكرات الصفحات وتتغير نسخة العقار كالمعتاد. التراجع عن
+المعاملة يلغي الرفع.
+
+الملفات في ذاكرة العامل فقط: إعادة تشغيله أثناء الرفع تترك الصور في حالة
+processing حتى يحذفها المسؤول أو يعيد رفعها.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+PROCESSING = 'processing'
+READY = 'ready'
+FAILED = 'failed'
+
+_PENDING_KEY = 'image_uploads_pending'
+
+
+class UploadedFile(io.BytesIO):
+    """نسخة في الذاكرة من ملف الطلب (ملف الطلب يُغلق بانتهائه)"""
+
+    def __init__(self, data, filename, content_type=None):
+        super().__init__(data)
+        self.filename = filename
+        self.content_type = content_type
+
+
+class ImageUploads:
+    """صفوف صور بحالة processing ورفع ملفاتها في مجموعة خيوط بعد commit"""
+
+    def __init__(self, workers=4, timeout=60):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, db, image_model, processor,
+                 placeholder='img/property-placeholder.jpg'):
+        """``processor(data, timeout=)`` يولد النسخ ويحفظها ويعيد قيمة عمود variants"""
+        app.config.setdefault('IMAGE_UPLOAD_WORKERS', self.workers)
+        app.config.setdefault('IMAGE_UPLOAD_TIMEOUT', self.timeout)
+        self.workers = app.config['IMAGE_UPLOAD_WORKERS']
+        self.timeout = app.config['IMAGE_UPLOAD_TIMEOUT']
+        self.app = app
+        self.db = db
+        self.image_model = image_model
+        self.processor = processor
+        self.placeholder = placeholder
+
+        event.listen(Session, 'after_commit', self._apply_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    def add(self, property_id, files):
+        """إنشاء صورة processing لكل ملف غير فارغ، ورفعها بعد commit الجلسة"""
+        session = self.db.session
+        jobs = []
+        for file in files or ():
+            if not file or not file.filename:
+                continue
+            image = self.image_model(property_id=property_id, image_path=self.placeholder,
+                                     status=PROCESSING, is_main=False)
+            session.add(image)
+            jobs.append((image, UploadedFile(file.read(), file.filename, file.mimetype)))
+        if jobs:
+            session.flush()
+            session.info.setdefault(_PENDING_KEY, []).extend(
+                (image.id, data) for image, data in jobs)
+        return [image for image, _ in jobs]
+
+    def wait(self):
+        """انتظار انتهاء كل الرفع الجاري (لأوامر الصيانة وقياس الأداء)"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _pool(self):
+        # الخيوط لا تنتقل مع fork: كل عامل gunicorn ينشئ مجموعته عند أول رفع
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='image-upload')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _upload(self, image_id, data):
+        with self.app.app_context():
+            try:
+                self._process(image_id, data)
+            except Exception:
+                # لا أحد ينتظر نتيجة الخيط: الخطأ يُسجَّل هنا وإلا ضاع في الـ future
+                self.db.session.rollback()
+                logger.exception('تعذر رفع الصورة %s', image_id)
+                self._mark_failed(image_id)
+
+    def _process(self, image_id, data):
+        session = self.db.session
+        model = self.image_model
+        content = data.getvalue()
+        digest = hashlib.sha256(content).hexdigest()
+        # الصورة نفسها في عقار آخر (صور يعيد الوكلاء استخدامها): لا معالجة ولا رفع
+        variants = session.execute(
+            select(model.variants)
+            .where(model.content_hash == digest, model.variants.isnot(None))
+            .limit(1)
+        ).scalar()
+        if variants is None:
+            variants = self.processor(content, timeout=self.timeout)
+
+        image = session.get(model, image_id)
+        if image is None:  # حُذفت الصورة أو عقارها أثناء الرفع
+            return
+        image.content_hash = digest
+        # المسار القديم يشير إلى النسخة الكاملة للقوالب التي تستخدمه مباشرة
+        image.variants = variants
+        image.image_path = variants['full']['jpeg']
+        image.status = READY
+        session.commit()
+
+    def _mark_failed(self, image_id):
+        """محاولة أخيرة لوضع الصورة في حالة failed بدل بقائها processing"""
+        session = self.db.session
+        try:
+            image = session.get(self.image_model, image_id)
+            if image is not None and image.status == PROCESSING:
+                image.status = FAILED
+                session.commit()
+        except Exception:
+            session.rollback()
+            logger.exception('تعذر تسجيل فشل الصورة %s', image_id)
+
+    def _apply_pending(self, session):
+        jobs = session.info.pop(_PENDING_KEY, None)
+        if jobs:
+            pool = self._pool()
+            for image_id, data in jobs:
+                pool.submit(self._upload, image_id, data)
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
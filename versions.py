@@ -0,0 +1,153 @@
+"""أرقام نسخ المحتوى وطلبات GET الشرطية (ETag وLast-Modified)
+
+كل مجموعة بيانات (مثلاً catalogue: العقارات وصورها والمواقع والأنواع) لها صف في
+جدول content_versions يزداد رقمه في نفس معاملة أي تغيير على نماذجها، فيرى كل
+العمال النسخة نفسها. العروض المزخرفة بـ ``conditional`` تحسب ETag من النسخة
+باستعلام صغير، وتعيد 304 دون تنفيذ العرض أو القالب إذا لم يتغير شيء.
+"""
+import time
+from datetime import datetime, timezone
+from functools import partial, wraps
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+_PENDING_KEY = 'content_versions_pending'
+
+
+class ContentVersions:
+    """عدّادات نسخ في قاعدة البيانات تُزاد بعد flush أي تغيير على النماذج المراقبة"""
+
+    def __init__(self, ready_check_interval=60):
+        self.ready_check_interval = ready_check_interval
+        self.db = None
+        self.table = None
+        self._ready = False
+        self._ready_checked_at = None
+
+    def init_app(self, app, db, version_model, groups):
+        """``groups``: {اسم النسخة: النماذج التي يغيّرها تعديلها}"""
+        app.config.setdefault('CONTENT_VERSIONS_READY_CHECK_SECONDS', self.ready_check_interval)
+        self.ready_check_interval = app.config['CONTENT_VERSIONS_READY_CHECK_SECONDS']
+        self.db = db
+        self.table = version_model.__table__
+        self.names = tuple(groups)
+
+        by_model = {}
+        for name, models in groups.items():
+            for model in models:
+                by_model.setdefault(model, set()).add(name)
+        for model, names in by_model.items():
+            for event_name in ('after_insert', 'after_update', 'after_delete'):
+                event.listen(model, event_name, partial(self._changed, frozenset(names)))
+        event.listen(Session, 'after_flush', self._bump)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+
+    @property
+    def ready(self):
+        """هل أُنشئ الجدول؟ (ينشئه أمر flask backfill-updated-at)
+
+        النتيجة السلبية تُعاد فحصها مرة كل ``CONTENT_VERSIONS_READY_CHECK_SECONDS`` فقط.
+        """
+        if not self._ready:
+            now = time.monotonic()
+            if (self._ready_checked_at is None
+                    or now - self._ready_checked_at >= self.ready_check_interval):
+                self._ready = inspect(self.db.engine).has_table(self.table.name)
+                self._ready_checked_at = now
+        return self._ready
+
+    def get(self, name):
+        """(الرقم، وقت آخر تغيير) للنسخة، أو None قبل إنشاء الجدول"""
+        if not self.ready:
+            return None
+        row = self.db.session.execute(
+            select(self.table.c.version, self.table.c.updated_at)
+            .where(self.table.c.name == name)
+        ).first()
+        return (row.version, row.updated_at) if row else None
+
+    def current(self, name):
+        """مثل ``get`` لكن باستعلام واحد لكل طلب مهما تعدد من يقرأ النسخة فيه
+        (ETag الصفحة ومفاتيح ذاكراتها)"""
+        if not has_request_context():
+            return self.get(name)
+        seen = g.setdefault('content_versions', {})
+        if name not in seen:
+            seen[name] = self.get(name)
+        return seen[name]
+
+    def ensure_rows(self, connection):
+        """إضافة صف لكل نسخة غير موجودة"""
+        existing = set(connection.execute(select(self.table.c.name)).scalars())
+        missing = [{'name': name, 'version': 1, 'updated_at': datetime.utcnow()}
+                   for name in self.names if name not in existing]
+        if missing:
+            connection.execute(self.table.insert(), missing)
+        return len(missing)
+
+    @staticmethod
+    def _changed(names, mapper, connection, target):
+        session = inspect(target).session
+        if session is not None:
+            session.info.setdefault(_PENDING_KEY, set()).update(names)
+
+    def _bump(self, session, flush_context):
+        names = session.info.pop(_PENDING_KEY, None)
+        if names and self.ready:
+            session.connection().execute(
+                self.table.update()
+                .where(self.table.c.name.in_(sorted(names)))
+                .values(version=self.table.c.version + 1, updated_at=datetime.utcnow()))
+
+    def _discard_pending(self, session):
+        session.info.pop(_PENDING_KEY, None)
+
+
+def _http_time(value):
+    """وقت UTC بلا منطقة زمنية (كما في قاعدة البيانات) بدقة الثانية كما في HTTP"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def not_modified(etag, last_modified=None):
+    """هل نسخة العميل (If-None-Match أو If-Modified-Since) ما زالت صالحة؟"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and last_modified:
+        return _http_time(last_modified) <= request.if_modified_since
+    return False
+
+
+def conditional(version):
+    """مزخرف عرض: ``version(**view_args)`` تعيد (etag، آخر تعديل) أو None
+
+    إذا طابقت نسخة العميل تُعاد 304 دون استدعاء العرض، وإلا تُضاف الترويستان
+    إلى استجابة 200. ETag ضعيف لأن الصفحة نفسها قد تُرسل مضغوطة أو لا. يُحفظ
+    الـ ETag في ``g.content_etag`` لتضمّه ذاكرة الصفحات إلى مفتاحها.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            current = version(*args, **kwargs)
+            if current is None:
+                return view(*args, **kwargs)
+            etag, last_modified = current
+            g.content_etag = etag
+            if not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = _http_time(last_modified)
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator